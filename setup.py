@@ -34,7 +34,7 @@ if 'READTHEDOCS' not in os.environ or \
         os.environ['READTHEDOCS'] != 'True':
     install_requires.extend([
         'cython>=0.25, <1',
-        'numpy>=1.15, <2',
+        'numpy>=1.17, <2',
     ])
 else:
     pass
@@ -81,6 +81,19 @@ else:
                   include_dirs=[np.get_include()],
                   define_macros=macros))
 
+    # only if XLMHG_BUILD_TRACE=1: build a second version of the extension
+    # with line tracing enabled (for profiling; the "linetrace" directive is
+    # set in the .pyx file, selected at runtime using
+    # `xlmhg.use_traced_extension()`)
+    if os.environ.get('XLMHG_BUILD_TRACE', '0') == '1':
+        ext_modules.append(
+            Extension(root + '.' + 'mhg_cython_trace',
+                      [root + '/mhg_cython_trace.pyx'],
+                      include_dirs=[np.get_include()],
+                      depends=[root + '/mhg_cython.pyx'],
+                      define_macros=[('CYTHON_TRACE', '1'),
+                                     ('CYTHON_TRACE_NOGIL', '1')]))
+
     cmdclass['build_ext'] = build_ext
 
 
@@ -173,7 +186,7 @@ setup(
 
     # data
     package_data={
-        'xlmhg': ['xlmhg/mhg_cython.pyx',
+        'xlmhg': ['xlmhg/mhg_cython.pyx', 'xlmhg/mhg_cython_trace.pyx',
                   'tests/*',
                   'README.rst', 'LICENSE', 'CHANGELOG.rst'],
     },
@@ -183,6 +196,6 @@ setup(
 
     # executable scripts
     entry_points={
-        # 'console_scripts': []
+        'console_scripts': ['xlmhg = xlmhg.cli:main'],
     },
 )
@@ -111,3 +111,34 @@ def test_bound():
           %(tests, configs.size))
     print('In %d / %d cases, the O(N)-bound was smaller than the O(1)-bound.'
           %(smaller, tests))
+
+
+def test_stat_bounds():
+    """Compares the fused kernel to the separate kernels."""
+    N = 40
+    tol = 1e-12
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        K = rng.randint(1, 15)
+        indices = np.uint16(np.sort(rng.choice(N, K, replace=False)))
+        X = rng.randint(0, 5)
+        L = rng.randint(1, N+1)
+        for pval_thresh in [None, 1e-4, 0.01, 0.05, 0.5]:
+            stat, cutoff, O1_bound, ON_bound, significant = \
+                mhg_cython.get_xlmhg_stat_bounds(indices, N, K, X, L,
+                                                 pval_thresh, tol)
+            assert (stat, cutoff) == \
+                mhg_cython.get_xlmhg_stat(indices, N, K, X, L, tol)
+            assert O1_bound == test.get_xlmhg_O1_bound(stat, K, X, L)
+            if pval_thresh is None:
+                assert significant is None
+                continue
+            if significant is False:
+                assert stat > pval_thresh
+            elif significant is True:
+                bound = O1_bound if np.isnan(ON_bound) else ON_bound
+                assert bound <= pval_thresh or \
+                    mhg.is_equal(bound, pval_thresh, tol)
+            if not np.isnan(ON_bound):
+                assert ON_bound == mhg_cython.get_xlmhg_ON_bound(
+                    N, K, X, L, stat, tol)
@@ -0,0 +1,60 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the Cython implementation of hypergeometric p-values."""
+
+import numpy as np
+import pytest
+from scipy.stats import hypergeom
+
+from xlmhg import get_hypergeometric_pvals
+from xlmhg.mhg import is_equal
+
+
+def test_all_configs():
+    """Compares p-values for all configurations to SciPy."""
+    N = 50
+    k, K, n = np.meshgrid(np.arange(-1, N+2), np.arange(N+1),
+                          np.arange(N+1), indexing='ij')
+    pvals = get_hypergeometric_pvals(k, N, K, n)
+    assert pvals.shape == k.shape
+    expected = hypergeom.sf(k-1, N, K, n)
+    for p, e in zip(pvals.ravel(), expected.ravel()):
+        assert is_equal(p, e, tol=1e-12) or abs(p - e) < 1e-15
+
+
+def test_log():
+    """Tests log-transformed p-values that are too small for doubles."""
+    N = 20000
+    K = 500
+    logp = get_hypergeometric_pvals(K, N, K, K, log=True)
+    assert is_equal(logp, hypergeom.logsf(K-1, N, K, K), tol=1e-12)
+    assert get_hypergeometric_pvals(K, N, K, K) == 0.0
+
+    logp = get_hypergeometric_pvals([0, K+1], N, K, K, log=True)
+    assert logp[0] == 0.0
+    assert logp[1] == -np.inf
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        get_hypergeometric_pvals(1, 10, 11, 5)
+    with pytest.raises(ValueError):
+        get_hypergeometric_pvals(1, 10, 5, 11)
+    with pytest.raises(ValueError):
+        get_hypergeometric_pvals(1.5, 10, 5, 5)
+
+
+@pytest.mark.filterwarnings('error::DeprecationWarning')
+def test_read_only():
+    N = 50
+    r = np.arange(N+1, dtype=np.int32)
+    k, K, n = np.meshgrid(r, r, r, indexing='ij')
+    expected = get_hypergeometric_pvals(k, N, K, n)
+    for arr in [k, K, n]:
+        arr.setflags(write=False)
+    assert np.all(get_hypergeometric_pvals(k, N, K, n) == expected)
+    # arrays of the same shape
+    assert np.all(get_hypergeometric_pvals(k, np.full_like(k, N), K, n)
+                  == expected)
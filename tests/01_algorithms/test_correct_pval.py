@@ -50,3 +50,32 @@ def test_cross():
 
     print('Calculated %d bounds, based on %d configurations.'
           %(tests, configs.size))
+
+
+def test_double():
+    """Compares p-values calculated using PVAL2 in double and long double
+    precision."""
+    np.random.seed(0)
+    N = 500
+    table = np.empty((N+1, 1), dtype=np.longdouble)
+    for K in [1, 5, 20, 50, 100]:
+        for _ in range(10):
+            indices = np.uint16(np.sort(np.random.choice(N, K, replace=False)))
+            X = np.random.randint(1, K+1)
+            L = np.random.randint(1, N+1)
+            stat, _ = mhg_cython.get_xlmhg_stat(indices, N, K, X, L)
+            pval = mhg_cython.get_xlmhg_pval2(N, K, X, L, stat, table)
+            pval_double = mhg_cython.get_xlmhg_pval2_double(N, K, X, L, stat)
+            assert mhg.is_equal(pval, pval_double, tol=1e-12)
+
+
+def test_double_underflow():
+    """Tests if PVAL2 in double precision reports p-values that are too
+    small as NaN."""
+    N = 2000
+    K = 200
+    indices = np.arange(K, dtype=np.uint16)
+    stat, _ = mhg_cython.get_xlmhg_stat(indices, N, K, 1, N)
+    table = np.empty((K+1, 1), dtype=np.longdouble)
+    assert mhg_cython.get_xlmhg_pval2(N, K, 1, N, stat, table) > 0
+    assert np.isnan(mhg_cython.get_xlmhg_pval2_double(N, K, 1, N, stat))
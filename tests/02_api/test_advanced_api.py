@@ -8,6 +8,7 @@ import numpy as np
 import pytest
 
 from xlmhg import mHGResult, xlmhg_test, get_xlmhg_test_result
+from xlmhg.workload import get_synthetic_workload
 
 
 def test_alg1(my_N, my_ind):
@@ -72,7 +73,7 @@ def test_limit_pval(my_incredible_pval_v):
     res = get_xlmhg_test_result(N, ind)
     assert res.stat == 1.5112233509292993e-216
     assert res.cutoff == 200
-    assert res.pval == res.stat
+    assert res.pval == pytest.approx(res.stat, rel=1e-12)
 
     res = get_xlmhg_test_result(N, ind, use_alg1=True)
     # PVAL2 algorithm should report an invalid p-value
@@ -84,9 +85,26 @@ def test_limit_pval(my_incredible_pval_v):
 
 
 def test_non_contiguous(my_N, my_ind):
-    """Test if non-contiguous arrays result in a ValueError."""
-    with pytest.raises(ValueError):
-        result = get_xlmhg_test_result(my_N, my_ind[::-1])
+    """Test if non-contiguous arrays are read in place."""
+    ind = my_ind[::2]
+    assert not ind.flags.c_contiguous
+    result = get_xlmhg_test_result(my_N, ind)
+    expected = get_xlmhg_test_result(my_N, np.ascontiguousarray(ind))
+    assert result.stat == expected.stat
+    assert result.cutoff == expected.cutoff
+    assert result.pval == expected.pval
+    assert np.array_equal(result.indices, ind)
+    assert result.indices.flags.c_contiguous
+
+
+def test_int32(my_N, my_ind):
+    """Test if indices arrays with other integer types are accepted."""
+    result = get_xlmhg_test_result(my_N, np.int32(my_ind))
+    expected = get_xlmhg_test_result(my_N, my_ind)
+    assert result.stat == expected.stat
+    assert result.cutoff == expected.cutoff
+    assert result.pval == expected.pval
+    assert result.indices.dtype == np.uint16
 
 
 def test_table_too_small(my_N, my_ind):
@@ -94,7 +112,15 @@ def test_table_too_small(my_N, my_ind):
     K = my_ind.size
     with pytest.raises(ValueError):
         table = np.empty(((my_N-K), (my_N-K)), np.longdouble)
+        result = get_xlmhg_test_result(my_N, my_ind, table=table,
+                                       use_alg1=True)
+    with pytest.raises(ValueError):
+        table = np.empty((K, 1), np.longdouble)
         result = get_xlmhg_test_result(my_N, my_ind, table=table)
+    # PVAL2 only uses the first column
+    table = np.empty((K+1, 1), np.longdouble)
+    result = get_xlmhg_test_result(my_N, my_ind, table=table)
+    assert result.pval == get_xlmhg_test_result(my_N, my_ind).pval
 
 
 def test_params(my_N, my_ind, my_v):
@@ -109,3 +135,45 @@ def test_params(my_N, my_ind, my_v):
     assert isinstance(result, mHGResult)
 
 
+def test_tier(my_N, my_ind):
+    """Test if the result reports how the p-value was determined."""
+    res = get_xlmhg_test_result(my_N, my_ind)
+    assert res.tier == 'pval2'
+    assert res.dp_cells > 0
+    assert res.time > 0
+
+    res = get_xlmhg_test_result(my_N, my_ind, use_alg1=True)
+    assert res.tier == 'pval1'
+    assert res.dp_cells > 0
+
+    res = get_xlmhg_test_result(my_N, my_ind, pval_thresh=0.01,
+                                exact_pval='if_necessary')
+    assert res.tier == 'stat'
+    assert res.dp_cells == 0
+
+    res = get_xlmhg_test_result(my_N, my_ind, pval_thresh=0.07,
+                                exact_pval='if_necessary')
+    assert res.tier == 'O1_bound'
+
+    res = get_xlmhg_test_result(my_N, my_ind, pval_thresh=0.045,
+                                exact_pval='if_necessary')
+    assert res.tier == 'ON_bound'
+
+    res = get_xlmhg_test_result(my_N, my_ind, X=10)
+    assert res.tier == 'trivial'
+
+
+def test_approx():
+    """Test if the approximate p-value is close to the exact p-value."""
+    workload = get_synthetic_workload(N=2000, num_sets=100,
+                                      frac_enriched=0.5, seed=3)
+    for ind in workload.indices:
+        exact = get_xlmhg_test_result(workload.N, ind, X=1, L=1500)
+        res = get_xlmhg_test_result(workload.N, ind, X=1, L=1500,
+                                    exact_pval='approx')
+        assert res.stat == exact.stat
+        assert res.tier in ['approx', 'trivial']
+        assert res.dp_cells == 0
+        assert abs(res.pval - exact.pval) <= res.pval_error * (1 + 1e-12)
+        if res.tier == 'approx':
+            assert exact.pval / 5 <= res.pval <= 5 * exact.pval
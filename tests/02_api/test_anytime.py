@@ -0,0 +1,62 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the anytime API (`iter_xlmhg_pval_brackets`)."""
+
+import time
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, iter_xlmhg_pval_brackets
+
+
+@pytest.fixture
+def my_large_ind():
+    rng = np.random.RandomState(0)
+    N = 6000
+    ind = np.r_[rng.choice(300, 60, replace=False),
+                300 + rng.choice(N - 300, 540, replace=False)]
+    return N, np.uint16(np.sort(ind))
+
+
+def test_brackets(my_N, my_ind):
+    brackets = list(iter_xlmhg_pval_brackets(my_N, my_ind))
+    labels = [b.label for b in brackets]
+    assert labels[:3] == ['stat', 'O1_bound', 'ON_bound']
+    assert labels[-1] == 'exact'
+    expected = get_xlmhg_test_result(my_N, my_ind)
+    assert brackets[-1].lower == brackets[-1].upper == expected.pval
+    assert brackets[0].lower == expected.stat
+    for b in brackets:
+        assert b.lower <= expected.pval <= b.upper
+
+
+def test_partial(my_large_ind):
+    N, ind = my_large_ind
+    expected = get_xlmhg_test_result(N, ind).pval
+    brackets = list(iter_xlmhg_pval_brackets(N, ind, interval=1e-4))
+    assert brackets[-1].label == 'exact'
+    assert brackets[-1].lower == pytest.approx(expected, rel=1e-12)
+    assert any(b.label == 'pval2_partial' for b in brackets)
+    prev = brackets[0]
+    for b in brackets:
+        assert b.lower <= expected * (1 + 1e-12)
+        assert b.upper >= expected * (1 - 1e-12)
+        assert b.lower >= prev.lower and b.upper <= prev.upper
+        prev = b
+
+
+def test_deadline(my_large_ind):
+    N, ind = my_large_ind
+    t0 = time.monotonic()
+    brackets = list(iter_xlmhg_pval_brackets(N, ind, deadline=t0 + 0.002,
+                                             interval=1.0))
+    assert time.monotonic() - t0 < 0.5
+    assert brackets[-1].label != 'exact'
+
+
+def test_trivial(my_N, my_ind):
+    brackets = list(iter_xlmhg_pval_brackets(my_N, my_ind, X=10))
+    assert brackets == [('exact', 1.0, 1.0)]
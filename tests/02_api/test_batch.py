@@ -0,0 +1,160 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the batch API (`xlmhg.batch`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, get_xlmhg_O1_bound, get_xlmhg_batch_stats, \
+    get_xlmhg_rejections, get_xlmhg_top_k, get_xlmhg_batch_results, \
+    get_xlmhg_lazy_results
+from xlmhg.workload import get_synthetic_workload
+
+
+def get_exact_rejections(pvals, alpha, method):
+    m = pvals.size
+    if method == 'bonferroni':
+        return pvals <= alpha / m
+    sorted_pvals = np.sort(pvals)
+    passed = np.nonzero(sorted_pvals <= alpha * np.arange(1, m+1) / m)[0]
+    if passed.size == 0:
+        return np.zeros(m, dtype=np.bool_)
+    return pvals <= alpha * (passed[-1] + 1) / m
+
+
+@pytest.fixture
+def my_workload():
+    return get_synthetic_workload(N=1000, num_sets=200, frac_enriched=0.2,
+                                  enriched_frac=0.15, max_size=100, seed=2)
+
+
+def test_batch_stats(my_workload):
+    N = my_workload.N
+    stats = get_xlmhg_batch_stats(N, my_workload.indices, X=2, L=500)
+    for i, ind in enumerate(my_workload.indices):
+        result = get_xlmhg_test_result(N, ind, X=2, L=500)
+        assert stats.K[i] == ind.size
+        assert stats.stat[i] == result.stat
+        assert stats.cutoff[i] == result.cutoff
+        assert stats.O1_bound[i] == get_xlmhg_O1_bound(
+            result.stat, ind.size, 2, 500)
+
+
+@pytest.mark.parametrize('method', ['fdr_bh', 'bonferroni'])
+@pytest.mark.parametrize('alpha', [0.01, 0.05, 0.2])
+def test_rejections(my_workload, method, alpha):
+    N = my_workload.N
+    indices = my_workload.indices
+    pvals = np.float64([get_xlmhg_test_result(N, ind, X=1, L=200).pval
+                        for ind in indices])
+    expected = get_exact_rejections(pvals, alpha, method)
+    res = get_xlmhg_rejections(N, indices, alpha=alpha, method=method,
+                               X=1, L=200)
+    assert np.all(res.rejected == expected)
+    assert np.all(res.pval_lower <= pvals * (1 + 1e-12))
+    assert np.all(res.pval_upper >= pvals * (1 - 1e-12))
+    # only a fraction of the exact p-values should have been calculated
+    assert res.num_exact < len(indices)
+
+
+def test_empty():
+    res = get_xlmhg_rejections(100, [])
+    assert res.rejected.size == 0
+    assert res.num_exact == 0
+
+
+def test_invalid(my_N, my_ind):
+    with pytest.raises(ValueError):
+        get_xlmhg_rejections(my_N, [my_ind], method='holm')
+    with pytest.raises(ValueError):
+        get_xlmhg_rejections(my_N, [my_ind], alpha=1.5)
+    with pytest.raises(ValueError):
+        get_xlmhg_rejections(my_N, [np.int64(my_ind)])
+
+
+@pytest.mark.parametrize('k', [0, 1, 10, 50, 500])
+def test_top_k(my_workload, k):
+    N = my_workload.N
+    indices = my_workload.indices
+    pvals = np.float64([get_xlmhg_test_result(N, ind, X=1, L=200).pval
+                        for ind in indices])
+    expected = np.lexsort([np.arange(pvals.size), pvals])[:k]
+    res = get_xlmhg_top_k(N, indices, k=k, X=1, L=200)
+    assert np.all(res.index == expected)
+    assert np.all(res.pval == pvals[expected])
+    if k <= 10:
+        assert res.num_exact < len(indices) / 2
+
+
+def test_duplicates(my_workload):
+    N = my_workload.N
+    unique = my_workload.indices[:50]
+    # duplicates that are equal, but are not the same objects
+    indices = unique + [ind.copy() for ind in unique[::2]] + unique[:5]
+    num_tests = len(indices)
+
+    res = get_xlmhg_batch_results(N, indices, X=1, L=200)
+    assert res.num_tested == 50
+    assert len(res.results) == num_tests
+    for ind, result in zip(indices, res.results):
+        expected = get_xlmhg_test_result(N, ind, X=1, L=200)
+        assert np.all(result.indices == ind)
+        assert result.stat == expected.stat
+        assert result.pval == expected.pval
+
+    stats = get_xlmhg_batch_stats(N, indices, X=1, L=200)
+    assert stats.K.size == num_tests
+    assert np.all(stats.stat[50:75] == stats.stat[0:50:2])
+
+    pvals = np.float64([r.pval for r in res.results])
+    rejections = get_xlmhg_rejections(N, indices, alpha=0.2, X=1, L=200)
+    assert np.all(rejections.rejected ==
+                  get_exact_rejections(pvals, 0.2, 'fdr_bh'))
+    assert rejections.num_exact <= 50
+
+    top = get_xlmhg_top_k(N, indices, k=num_tests, X=1, L=200)
+    assert np.all(top.pval == np.sort(pvals))
+    assert top.num_exact <= 50
+
+
+@pytest.mark.parametrize('num_jobs', [1, 4])
+def test_lazy_results(my_workload, num_jobs):
+    N = my_workload.N
+    indices = my_workload.indices + my_workload.indices[:10]
+    pvals = np.float64([get_xlmhg_test_result(N, ind, X=1, L=200).pval
+                        for ind in indices])
+
+    res = get_xlmhg_lazy_results(N, indices, X=1, L=200)
+    assert len(res) == len(indices)
+    assert res.num_exact == 0
+    assert np.all(res.stat <= pvals)
+    assert np.all(res.O1_bound >= pvals * (1 - 1e-12))
+    assert np.all(res.ON_bound >= pvals * (1 - 1e-12))
+
+    # a single p-value (shared by the duplicate test)
+    assert res.get_pval(3) == pvals[3]
+    assert res.num_exact == 1
+    assert res.get_pval(len(indices) - 7) == pvals[3]
+    assert res.num_exact == 1
+
+    # a subset, selected by a boolean mask
+    mask = res.stat < 0.01
+    assert np.all(res.get_pvals(mask, num_jobs=num_jobs) == pvals[mask])
+    num_exact = res.num_exact
+    assert num_exact <= np.sum(mask) + 1
+    assert np.all(res.get_pvals(np.nonzero(mask)[0]) == pvals[mask])
+    assert res.num_exact == num_exact
+
+    assert np.all(res.get_pvals(num_jobs=num_jobs) == pvals)
+    assert res.num_exact < len(indices)
+
+    with pytest.raises(ValueError):
+        res.get_pvals(num_jobs=0)
+
+
+def test_lazy_empty():
+    res = get_xlmhg_lazy_results(100, [])
+    assert len(res) == 0
+    assert res.get_pvals().size == 0
@@ -0,0 +1,56 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for testing both ends of a list
+(`get_xlmhg_bidirectional_result`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, get_xlmhg_bidirectional_result, \
+    mHGPairedResult
+from xlmhg.workload import get_synthetic_workload
+
+
+def check_both_ends(N, indices, **kwargs):
+    res = get_xlmhg_bidirectional_result(N, indices, **kwargs)
+    assert isinstance(res, mHGPairedResult)
+    rev_indices = np.ascontiguousarray(np.uint16(N - 1 - indices[::-1]))
+    top = get_xlmhg_test_result(N, indices, **kwargs)
+    bottom = get_xlmhg_test_result(N, rev_indices, **kwargs)
+    assert np.array_equal(res.bottom.indices, rev_indices)
+    for r, e in [(res.top, top), (res.bottom, bottom)]:
+        assert (r.stat, r.cutoff, r.pval) == (e.stat, e.cutoff, e.pval)
+    return res
+
+
+def test_paper_example(my_N, my_ind):
+    res = check_both_ends(my_N, my_ind)
+    assert res.top.pval == 0.0244453044375645
+    assert res.pval == res.top.pval
+    top, bottom = res
+    assert top is res.top and bottom is res.bottom
+    for X in range(0, 7):
+        for L in [0, 1, 5, 10, my_N]:
+            check_both_ends(my_N, my_ind, X=X, L=L)
+
+
+@pytest.mark.parametrize('exact_pval,pval_thresh', [
+    ('always', None), ('if_necessary', 0.01), ('if_significant', 0.05)])
+def test_workload(exact_pval, pval_thresh):
+    workload = get_synthetic_workload(N=1000, num_sets=30, frac_enriched=0.5,
+                                      seed=5)
+    for ind in workload.indices:
+        check_both_ends(workload.N, ind, X=2, L=500, exact_pval=exact_pval,
+                        pval_thresh=pval_thresh)
+
+
+def test_shared_pval():
+    """Test if the p-value is only calculated once for symmetric lists."""
+    N = 20
+    indices = np.uint16([0, 1, 3, 16, 18, 19])
+    res = check_both_ends(N, indices)
+    assert res.top.stat == res.bottom.stat
+    assert res.top.dp_cells > 0
+    assert res.bottom.dp_cells == 0
@@ -0,0 +1,72 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the vectorized bounds (`bounds.py`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_O1_bound, get_xlmhg_O1_bounds, \
+    get_xlmhg_ON_bounds
+from xlmhg import mhg_cython
+
+
+@pytest.fixture
+def my_bound_args():
+    rng = np.random.RandomState(0)
+    size = 500
+    N = 100
+    K = rng.randint(0, N+1, size)
+    X = rng.randint(0, 10, size)
+    L = rng.randint(0, N+1, size)
+    stat = np.r_[1.0, 10**-rng.uniform(0, 10, size-1)]
+    return N, stat, K, X, L
+
+
+def test_O1_bounds(my_bound_args):
+    N, stat, K, X, L = my_bound_args
+    bounds = get_xlmhg_O1_bounds(stat, K, X, L)
+    assert bounds.shape == stat.shape
+    for i in range(stat.size):
+        assert bounds[i] == get_xlmhg_O1_bound(stat[i], K[i], X[i], L[i])
+
+
+def test_ON_bounds(my_bound_args):
+    N, stat, K, X, L = my_bound_args
+    bounds = get_xlmhg_ON_bounds(N, stat, K, X, L)
+    assert bounds.shape == stat.shape
+    for i in range(stat.size):
+        assert bounds[i] == mhg_cython.get_xlmhg_ON_bound(
+            N, int(K[i]), int(X[i]), int(L[i]), stat[i])
+
+
+def test_broadcasting():
+    stat = np.float64([[0.01], [0.001]])
+    K = np.arange(1, 6)
+    bounds = get_xlmhg_O1_bounds(stat, K, 1, 100)
+    assert bounds.shape == (2, 5)
+    assert bounds[1, 4] == 5 * 0.001
+    bounds = get_xlmhg_ON_bounds(100, stat, K, 1, 100)
+    assert bounds.shape == (2, 5)
+    assert get_xlmhg_O1_bounds(0.01, 5, 1, 100).shape == ()
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        get_xlmhg_ON_bounds(100, 0.01, 101, 1, 100)
+    with pytest.raises(ValueError):
+        get_xlmhg_ON_bounds(100, 1.5, 10, 1, 100)
+    with pytest.raises(ValueError):
+        get_xlmhg_O1_bounds(0.01, 5.5, 1, 100)
+
+
+@pytest.mark.filterwarnings('error::DeprecationWarning')
+def test_read_only(my_bound_args):
+    N, stat, K, X, L = my_bound_args
+    expected_O1 = get_xlmhg_O1_bounds(stat, K, X, L)
+    expected_ON = get_xlmhg_ON_bounds(N, stat, K, X, L)
+    for arr in [stat, K, X, L]:
+        arr.setflags(write=False)
+    assert np.all(get_xlmhg_O1_bounds(stat, K, X, L) == expected_O1)
+    assert np.all(get_xlmhg_ON_bounds(N, stat, K, X, L) == expected_ON)
@@ -0,0 +1,99 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for checkpointed jobs (`xlmhg.checkpoint`)."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from xlmhg import iter_xlmhg_results, write_results, run_checkpointed_job, \
+    merge_shards
+
+
+@pytest.fixture
+def my_files(tmpdir):
+    rng = np.random.RandomState(0)
+    genes = ['g%d' % i for i in range(300)]
+    gmt_path = str(tmpdir.join('sets.gmt'))
+    with open(gmt_path, 'w') as f:
+        for i in range(25):
+            size = rng.randint(1, 40)
+            f.write('set%d\tdescription\t%s\n'
+                    % (i, '\t'.join(rng.choice(genes, size, replace=False))))
+    rankings_path = str(tmpdir.join('rankings.txt'))
+    with open(rankings_path, 'w') as f:
+        for j in range(3):
+            f.write('ranking%d\t%s\n'
+                    % (j, '\t'.join(rng.permutation(genes)[:250])))
+    expected_path = str(tmpdir.join('expected.tsv'))
+    write_results(iter_xlmhg_results(gmt_path, rankings_path, X=2,
+                                      chunk_size=4), expected_path)
+    with open(expected_path) as f:
+        expected = f.read()
+    return gmt_path, rankings_path, expected
+
+
+def test_job(my_files, tmpdir):
+    gmt_path, rankings_path, expected = my_files
+    checkpoint_dir = str(tmpdir.join('checkpoint'))
+    output_path = str(tmpdir.join('results.tsv'))
+    summary = run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir,
+                                   output=output_path, X=2, chunk_size=4)
+    assert summary == (7, 0, 75)
+    with open(output_path) as f:
+        assert f.read() == expected
+    assert not any('.tmp' in name for name in os.listdir(checkpoint_dir))
+
+
+@pytest.mark.parametrize('num_jobs', [1, 2])
+def test_resume(my_files, tmpdir, num_jobs):
+    gmt_path, rankings_path, expected = my_files
+    checkpoint_dir = str(tmpdir.join('checkpoint'))
+    run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir, X=2,
+                         chunk_size=4)
+
+    # simulate an interrupted job: two chunks are missing from the manifest,
+    # and one shard file is corrupt
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest['completed']['2']
+    del manifest['completed']['6']
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    with open(os.path.join(checkpoint_dir, 'shard-000003.tsv'), 'a') as f:
+        f.write('corrupt\n')
+
+    output_path = str(tmpdir.join('results.tsv'))
+    summary = run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir,
+                                   output=output_path, X=2, chunk_size=4,
+                                   num_jobs=num_jobs)
+    assert summary == (7, 4, 75)
+    with open(output_path) as f:
+        assert f.read() == expected
+
+    merged_path = str(tmpdir.join('merged.tsv'))
+    assert merge_shards(checkpoint_dir, merged_path) == 75
+    with open(merged_path) as f:
+        assert f.read() == expected
+
+
+def test_stale(my_files, tmpdir):
+    gmt_path, rankings_path, _ = my_files
+    checkpoint_dir = str(tmpdir.join('checkpoint'))
+    run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir, X=2,
+                         chunk_size=4)
+    with pytest.raises(ValueError):
+        # different parameters
+        run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir, X=3,
+                             chunk_size=4)
+    with open(gmt_path, 'a') as f:
+        f.write('extra\t\tg1\tg2\n')
+    with pytest.raises(ValueError):
+        # different input
+        run_checkpointed_job(gmt_path, rankings_path, checkpoint_dir, X=2,
+                             chunk_size=4)
@@ -0,0 +1,87 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the command-line interface (`xlmhg.cli`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import iter_xlmhg_results, write_results, use_pval_store
+from xlmhg import pvalstore
+from xlmhg.cli import main
+
+
+@pytest.fixture
+def my_files(tmpdir):
+    rng = np.random.RandomState(0)
+    genes = ['g%d' % i for i in range(500)]
+    gmt_path = str(tmpdir.join('sets.gmt'))
+    with open(gmt_path, 'w') as f:
+        for i in range(30):
+            size = rng.randint(1, 50)
+            f.write('set%d\tdescription\t%s\n'
+                    % (i, '\t'.join(rng.choice(genes, size, replace=False))))
+    rankings_path = str(tmpdir.join('rankings.txt'))
+    with open(rankings_path, 'w') as f:
+        for j in range(2):
+            f.write('ranking%d\t%s\n'
+                    % (j, '\t'.join(rng.permutation(genes)[:400])))
+    ranked_list_path = str(tmpdir.join('my_list.rnk'))
+    with open(ranked_list_path, 'w') as f:
+        f.write('# gene\tscore\n')
+        for g in rng.permutation(genes):
+            f.write('%s\t1.0\n' % g)
+    return gmt_path, rankings_path, ranked_list_path
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_rankings(my_files, tmpdir, jobs):
+    gmt_path, rankings_path, _ = my_files
+    output_path = str(tmpdir.join('results.tsv'))
+    assert main(['-g', gmt_path, '-m', rankings_path, '-o', output_path,
+                 '-X', '2', '-L', '200', '-j', jobs, '--chunk-size', '7',
+                 '-q']) == 0
+
+    expected_path = str(tmpdir.join('expected.tsv'))
+    write_results(iter_xlmhg_results(gmt_path, rankings_path, X=2, L=200,
+                                     chunk_size=7), expected_path)
+    with open(output_path) as f1, open(expected_path) as f2:
+        assert f1.read() == f2.read()
+
+
+def test_ranked_list(my_files, tmpdir, capsys):
+    gmt_path, _, ranked_list_path = my_files
+    output_path = str(tmpdir.join('results.tsv'))
+    main(['-g', gmt_path, '-r', ranked_list_path, '-o', output_path,
+          '-p', '0.01', '--exact-pval', 'if_necessary'])
+    with open(output_path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 31
+    assert all(l.split('\t')[:3] == ['my_list', 'set%d' % i, '500']
+               for i, l in enumerate(lines[1:]))
+    assert 'tests/s' in capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        main(['-g', gmt_path, '-r', ranked_list_path, '-j', '0'])
+    with pytest.raises(SystemExit):
+        main(['-g', gmt_path, '-r', ranked_list_path,
+              '--exact-pval', 'if_significant'])
+    assert '--exact-pval if_significant requires -p/--pval-thresh' in \
+        capsys.readouterr().err
+
+
+def test_pval_store(my_files, tmpdir, monkeypatch):
+    gmt_path, rankings_path, _ = my_files
+    monkeypatch.delenv(pvalstore.STORE_ENV_VAR, raising=False)
+    cache_dir = str(tmpdir.join('cache'))
+    output_paths = [str(tmpdir.join('results%d.tsv' % i)) for i in range(2)]
+    try:
+        for output_path in output_paths:
+            assert main(['-g', gmt_path, '-m', rankings_path, '-o',
+                         output_path, '--pval-store', cache_dir, '-q']) == 0
+        assert len(pvalstore.store) > 0
+    finally:
+        use_pval_store(None)
+    with open(output_paths[0]) as f1, open(output_paths[1]) as f2:
+        assert f1.read() == f2.read()
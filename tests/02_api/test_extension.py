@@ -0,0 +1,53 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for selecting the C extension (`extension.py`)."""
+
+import importlib
+
+import pytest
+
+from xlmhg import extension, use_traced_extension, xlmhg_test
+
+
+@pytest.fixture
+def my_traced_extension():
+    # the traced extension is only built on request
+    pytest.importorskip('xlmhg.mhg_cython_trace')
+    traced = extension.is_traced()
+    try:
+        yield use_traced_extension()
+    finally:
+        use_traced_extension(traced)
+
+
+def test_default(monkeypatch):
+    # the selected extension is restored after the test
+    monkeypatch.setattr(extension, 'mhg_cython', extension.mhg_cython)
+    monkeypatch.delenv(extension.TRACE_ENV_VAR, raising=False)
+    importlib.reload(extension)
+    assert not extension.is_traced()
+    assert extension.mhg_cython.__name__ == 'xlmhg.mhg_cython'
+
+
+def test_env_var(monkeypatch):
+    monkeypatch.setattr(extension, 'mhg_cython', extension.mhg_cython)
+    monkeypatch.setenv(extension.TRACE_ENV_VAR, '1')
+    importlib.reload(extension)
+    try:
+        importlib.import_module('xlmhg.mhg_cython_trace')
+    except ImportError:
+        # falls back to the optimized extension
+        assert not extension.is_traced()
+    else:
+        assert extension.is_traced()
+
+
+def test_traced(my_traced_extension, my_v):
+    assert extension.is_traced()
+    assert extension.mhg_cython is my_traced_extension
+    res = xlmhg_test(my_v)
+    assert res[0] == 0.01393188854489164
+    assert res[1] == 6
+    assert res[2] == 0.0244453044375645
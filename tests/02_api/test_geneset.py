@@ -0,0 +1,81 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the gene set index (`GeneSetIndex`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import GeneSetIndex, get_xlmhg_batch_stats
+
+
+@pytest.fixture
+def my_gene_sets():
+    rng = np.random.RandomState(0)
+    universe = ['g%d' % i for i in range(500)]
+    gene_sets = dict(('set%d' % i, list(rng.choice(universe, size)))
+                     for i, size in enumerate([0, 1, 10, 100, 400]))
+    return universe, gene_sets
+
+
+def test_index(my_gene_sets):
+    universe, gene_sets = my_gene_sets
+    index = GeneSetIndex(gene_sets)
+    assert len(index) == len(gene_sets)
+    assert index.names == list(gene_sets.keys())
+    for i, genes in enumerate(gene_sets.values()):
+        members = index.members[index.indptr[i]:index.indptr[i+1]]
+        assert list(index.genes[members]) == sorted(set(genes))
+
+    pos = index.get_gene_indices(['g1', 'missing', index.genes[0]])
+    assert pos[1] == -1 and pos[2] == 0
+
+
+@pytest.mark.parametrize('N', [500, 300, 1])
+def test_ranked_indices(my_gene_sets, N):
+    universe, gene_sets = my_gene_sets
+    index = GeneSetIndex(gene_sets)
+    # the ranking includes genes that are not part of any gene set
+    ranking = list(np.random.RandomState(1).permutation(
+        universe + ['extra%d' % i for i in range(100)])[:N])
+
+    rank = dict((g, i) for i, g in enumerate(ranking))
+    indices = index.get_ranked_indices(ranking)
+    assert len(indices) == len(gene_sets)
+    for ind, genes in zip(indices, gene_sets.values()):
+        expected = np.uint16(sorted(set(rank[g] for g in genes if g in rank)))
+        assert np.array_equal(ind, expected)
+        assert ind.dtype == np.uint16 and ind.flags.c_contiguous
+
+    # the indices can be used directly with the batch functions
+    stats = get_xlmhg_batch_stats(N, indices)
+    assert np.array_equal(stats.K, [ind.size for ind in indices])
+
+
+def test_packed(my_gene_sets):
+    universe, gene_sets = my_gene_sets
+    index = GeneSetIndex(list(gene_sets.values()))
+    membership = np.unpackbits(index.get_packed(), axis=1)
+    for i, genes in enumerate(gene_sets.values()):
+        assert list(index.genes[np.nonzero(membership[i])[0]]) == \
+            sorted(set(genes))
+
+
+def test_invalid(my_gene_sets):
+    universe, gene_sets = my_gene_sets
+    index = GeneSetIndex(gene_sets)
+    with pytest.raises(ValueError):
+        index.get_ranked_csr(['g1', 'g2', 'g1'])
+    with pytest.raises(ValueError):
+        GeneSetIndex([['g1']], names=['a', 'b'])
+
+    # the identifiers must be of the same type as those in the gene sets
+    int_index = GeneSetIndex([[1, 2], [2, 3]])
+    assert list(int_index.get_gene_indices(np.uint16([3, 4]))) == [2, -1]
+    with pytest.raises(ValueError):
+        int_index.get_gene_indices(['1', '2'])
+    with pytest.raises(ValueError):
+        int_index.get_ranked_indices(['1', '2', '3'])
+    with pytest.raises(ValueError):
+        index.get_gene_indices([1, 2])
@@ -0,0 +1,76 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the synthetic workload generator and the load test."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result
+from xlmhg.workload import get_gene_set_sizes, get_synthetic_workload
+from xlmhg.loadtest import DECISION_TIERS, run_load_test
+
+
+def test_gene_set_sizes():
+    sizes = get_gene_set_sizes(1000, min_size=10, max_size=200, seed=0)
+    assert sizes.size == 1000
+    assert sizes.min() >= 10
+    assert sizes.max() <= 200
+    with pytest.raises(ValueError):
+        get_gene_set_sizes(10, min_size=20, max_size=10)
+
+
+def test_workload():
+    workload = get_synthetic_workload(N=2000, num_sets=100, seed=1)
+    assert len(workload.indices) == 100
+    assert workload.is_enriched.size == 100
+    for ind in workload.indices:
+        assert ind.dtype == np.uint16 and ind.flags.c_contiguous
+        assert np.all(np.diff(ind.astype(np.int64)) > 0)
+        assert ind[-1] < workload.N
+
+    # enriched sets should be more significant than the other sets
+    pvals = np.float64([get_xlmhg_test_result(workload.N, ind).pval
+                        for ind in workload.indices])
+    assert np.median(pvals[workload.is_enriched]) < \
+        np.median(pvals[~workload.is_enriched])
+
+    # the workload is reproducible
+    other = get_synthetic_workload(N=2000, num_sets=100, seed=1)
+    assert all(np.array_equal(a, b)
+               for a, b in zip(workload.indices, other.indices))
+
+
+@pytest.mark.parametrize('N', [1, 3, 20])
+def test_workload_short_list(N):
+    # the gene set sizes are limited to the length of the list
+    workload = get_synthetic_workload(N=N, num_sets=50, seed=3)
+    assert len(workload.indices) == 50
+    for ind in workload.indices:
+        assert 1 <= ind.size <= N
+        assert np.all(np.diff(ind.astype(np.int64)) > 0)
+        assert ind[-1] < N
+    with pytest.raises(ValueError):
+        get_synthetic_workload(N=100, min_size=20, max_size=10)
+
+
+def test_load_test():
+    workload = get_synthetic_workload(N=1000, num_sets=40, seed=2)
+    stats = run_load_test(workload, num_workers=2, chunk_size=10)
+    assert stats['tests'] == 40
+    assert stats['tests_per_sec'] > 0
+    assert stats['p99_latency'] >= stats['p50_latency']
+    total = sum(stats['frac_' + tier] for tier in DECISION_TIERS)
+    assert abs(total - 1.0) < 1e-12
+    assert stats['frac_approx'] == 0
+
+
+def test_load_test_approx():
+    workload = get_synthetic_workload(N=1000, num_sets=20, seed=2)
+    stats = run_load_test(workload, exact_pval='approx', chunk_size=10)
+    # approximated p-values are not reported as decided by a bound
+    assert stats['frac_approx'] > 0
+    assert abs(stats['frac_trivial'] + stats['frac_approx'] - 1.0) < 1e-12
+    for tier in ['stat', 'O1_bound', 'ON_bound', 'exact', 'O1_fallback']:
+        assert stats['frac_' + tier] == 0
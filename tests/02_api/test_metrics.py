@@ -0,0 +1,72 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the metrics registry (`metrics.py`)."""
+
+import threading
+
+import pytest
+
+from xlmhg import get_xlmhg_test_result
+from xlmhg import metrics
+from xlmhg.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def my_registry():
+    registry = metrics.registry
+    enabled = registry.enabled
+    registry.reset()
+    registry.enable()
+    yield registry
+    registry.reset()
+    registry.enabled = enabled
+
+
+def test_counters():
+    registry = MetricsRegistry(enabled=True)
+    registry.increment('a')
+    registry.increment('a', 2)
+    registry.observe('h', 0.5, buckets=(0.1, 1.0))
+    registry.observe('h', 5.0, buckets=(0.1, 1.0))
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {'a': 3}
+    assert snapshot['histograms']['h']['counts'] == [0, 1, 1]
+    assert snapshot['histograms']['h']['count'] == 2
+    registry.reset()
+    assert registry.snapshot() == {'counters': {}, 'histograms': {}}
+
+
+def test_thread_safety():
+    registry = MetricsRegistry(enabled=True)
+
+    def work():
+        for _ in range(1000):
+            registry.increment('a')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert registry.snapshot()['counters']['a'] == 4000
+
+
+def test_record_tests(my_registry, my_N, my_ind):
+    get_xlmhg_test_result(my_N, my_ind)
+    get_xlmhg_test_result(my_N, my_ind, pval_thresh=0.01,
+                          exact_pval='if_necessary')
+    snapshot = my_registry.snapshot()
+    counters = snapshot['counters']
+    assert counters['tests'] == 2
+    assert counters['tier.pval2'] == 1
+    assert counters['tier.stat'] == 1
+    assert counters['dp_cells'] > 0
+    assert snapshot['histograms']['test_time']['count'] == 2
+
+
+def test_disabled(my_registry, my_N, my_ind):
+    my_registry.disable()
+    get_xlmhg_test_result(my_N, my_ind)
+    assert my_registry.snapshot()['counters'] == {}
@@ -0,0 +1,88 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for bit-packed gene sets (`xlmhg.packed`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import pack_gene_sets, get_ranked_packed, get_packed_indices, \
+    get_packed_counts, get_xlmhg_packed_stats, get_xlmhg_batch_stats
+
+
+@pytest.fixture
+def my_gene_sets():
+    rng = np.random.RandomState(0)
+    num_genes = 1000
+    gene_sets = [rng.choice(num_genes, size, replace=False)
+                 for size in [0, 1, 5, 50, 200, 999, 1000]]
+    return num_genes, gene_sets
+
+
+def get_indices(gene_sets, ranking):
+    # the ranks of the genes in each gene set (genes that are not ranked are
+    # ignored)
+    rank = np.full(ranking.max() + 1, -1, dtype=np.int64)
+    rank[ranking] = np.arange(ranking.size)
+    indices = []
+    for genes in gene_sets:
+        r = rank[genes[genes < rank.size]]
+        indices.append(np.uint16(np.sort(r[r >= 0])))
+    return indices
+
+
+def test_pack(my_gene_sets):
+    num_genes, gene_sets = my_gene_sets
+    packed = pack_gene_sets(gene_sets, num_genes)
+    assert packed.shape == (len(gene_sets), 125)
+    membership = np.unpackbits(packed, axis=1)
+    for i, genes in enumerate(gene_sets):
+        assert np.array_equal(np.nonzero(membership[i])[0], np.sort(genes))
+
+    with pytest.raises(ValueError):
+        pack_gene_sets([np.arange(5)], 4)
+
+
+@pytest.mark.parametrize('N', [1000, 701, 64, 1])
+def test_ranked(my_gene_sets, N):
+    num_genes, gene_sets = my_gene_sets
+    packed = pack_gene_sets(gene_sets, num_genes)
+    ranking = np.random.RandomState(1).permutation(num_genes)[:N]
+    indices = get_indices(gene_sets, ranking)
+
+    ranked = get_ranked_packed(packed, ranking)
+    assert ranked.shape == (len(gene_sets), (N + 7) // 8)
+    for i, ind in enumerate(indices):
+        assert np.array_equal(get_packed_indices(ranked, i, N), ind)
+    for n in [0, 1, 7, 8, 63, 64, 65, N // 2, N]:
+        if n <= N:
+            counts = get_packed_counts(ranked, n)
+            assert np.array_equal(
+                counts, [np.sum(ind < n) for ind in indices])
+
+
+@pytest.mark.parametrize('X,L', [(None, None), (1, 500), (5, 100)])
+def test_packed_stats(my_gene_sets, X, L):
+    num_genes, gene_sets = my_gene_sets
+    packed = pack_gene_sets(gene_sets, num_genes)
+    ranking = np.random.RandomState(2).permutation(num_genes)[:900]
+    indices = get_indices(gene_sets, ranking)
+
+    stats = get_xlmhg_packed_stats(packed, ranking, X=X, L=L)
+    expected = get_xlmhg_batch_stats(ranking.size, indices, X=X, L=L)
+    for a, b in zip(stats, expected):
+        assert np.array_equal(a, b)
+
+
+def test_invalid(my_gene_sets):
+    num_genes, gene_sets = my_gene_sets
+    packed = pack_gene_sets(gene_sets, num_genes)
+    with pytest.raises(ValueError):
+        # duplicate genes
+        get_xlmhg_packed_stats(packed, np.zeros(10, dtype=np.int64))
+    with pytest.raises(ValueError):
+        # gene index out of range
+        get_xlmhg_packed_stats(packed, np.arange(1001))
+    with pytest.raises(ValueError):
+        get_xlmhg_packed_stats(packed, np.arange(100), L=101)
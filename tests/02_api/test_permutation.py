@@ -0,0 +1,77 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the permutation engine (`xlmhg.permutation`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, get_xlmhg_permutation_pval
+from xlmhg.permutation import get_random_subsets
+
+
+@pytest.mark.parametrize('N,K', [(1000, 5), (100, 60), (50, 50), (50, 0)])
+def test_random_subsets(N, K):
+    rng = np.random.Generator(np.random.PCG64(0))
+    ind = get_random_subsets(rng, N, K, 200)
+    assert ind.shape == (200, K) and ind.dtype == np.uint16
+    assert ind.flags.c_contiguous
+    assert np.all(np.diff(ind.astype(np.int64), axis=1) > 0)
+    if K > 0:
+        assert ind.max() < N
+
+
+def test_random_subsets_chunks(monkeypatch):
+    # the subsets are drawn in several chunks (and are uniformly distributed)
+    monkeypatch.setattr('xlmhg.permutation._MAX_CHUNK_NUMBERS', 30)
+    rng = np.random.Generator(np.random.PCG64(0))
+    ind = get_random_subsets(rng, 10, 5, 10000)
+    assert ind.shape == (10000, 5)
+    assert np.all(np.diff(ind.astype(np.int64), axis=1) > 0)
+    counts = np.bincount(ind.ravel(), minlength=10)
+    assert np.all(np.abs(counts - 5000) < 300)
+
+
+def test_pval(my_N, my_ind):
+    expected = get_xlmhg_test_result(my_N, my_ind, X=1).pval
+    res = get_xlmhg_permutation_pval(my_N, my_ind, X=1, num_perm=20000,
+                                     seed=0)
+    assert res.stat == get_xlmhg_test_result(my_N, my_ind, X=1).stat
+    assert res.num_perm == 20000
+    assert not res.stopped_early
+    assert res.ci_low <= expected <= res.ci_high
+    assert res.pval == (res.num_extreme + 1) / (res.num_perm + 1)
+    assert res.ci_low <= res.pval <= res.ci_high
+
+
+def test_no_extreme_permutations():
+    # the interval is calculated for the reported p-value, which is never 0
+    ind = np.arange(20, dtype=np.uint16)
+    res = get_xlmhg_permutation_pval(1000, ind, num_perm=1000, seed=0)
+    assert res.num_extreme == 0
+    assert res.pval == 1 / 1001.0
+    assert 0.0 < res.ci_low <= res.pval <= res.ci_high
+
+
+def test_threads(my_N, my_ind):
+    res1 = get_xlmhg_permutation_pval(my_N, my_ind, num_perm=5000,
+                                      batch_size=100, seed=1)
+    res2 = get_xlmhg_permutation_pval(my_N, my_ind, num_perm=5000,
+                                      batch_size=100, seed=1, num_threads=4)
+    assert res1 == res2
+
+
+def test_early_stopping(my_N, my_ind):
+    res = get_xlmhg_permutation_pval(my_N, my_ind, num_perm=100000,
+                                     batch_size=500, pval_thresh=0.5, seed=2)
+    assert res.stopped_early
+    assert res.num_perm < 100000
+    assert res.ci_high < 0.5
+
+
+def test_invalid(my_N, my_ind):
+    with pytest.raises(ValueError):
+        get_xlmhg_permutation_pval(my_N, my_ind, batch_size=0)
+    with pytest.raises(ValueError):
+        get_xlmhg_permutation_pval(my_N, my_ind, confidence=1.0)
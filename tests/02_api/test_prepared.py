@@ -0,0 +1,91 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for prepared tests (`prepare_xlmhg_test`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, prepare_xlmhg_test
+from xlmhg.workload import get_synthetic_workload
+
+
+def test_basic(my_N, my_ind):
+    test = prepare_xlmhg_test(my_N)
+    stat, cutoff, pval = test(my_ind)
+    assert stat == 0.01393188854489164
+    assert cutoff == 6
+    assert pval == 0.0244453044375645
+    assert test.run(my_ind) == (stat, cutoff, pval)
+
+
+@pytest.mark.parametrize('exact_pval,pval_thresh', [
+    ('always', None), ('if_necessary', 0.01), ('if_necessary', 0.045),
+    ('if_necessary', 0.07), ('if_significant', 0.045)])
+def test_consistency(my_N, my_ind, exact_pval, pval_thresh):
+    """Test if prepared tests give the same results as the advanced API."""
+    test = prepare_xlmhg_test(my_N, exact_pval=exact_pval,
+                              pval_thresh=pval_thresh)
+    res = get_xlmhg_test_result(my_N, my_ind, exact_pval=exact_pval,
+                                pval_thresh=pval_thresh)
+    assert test(my_ind) == (res.stat, res.cutoff, res.pval)
+
+
+def test_workload():
+    workload = get_synthetic_workload(N=3000, num_sets=100, seed=3)
+    for X, L in [(None, None), (5, 300)]:
+        test = prepare_xlmhg_test(workload.N, X=X, L=L,
+                                  exact_pval='if_necessary', pval_thresh=0.01)
+        for ind in workload.indices:
+            res = get_xlmhg_test_result(workload.N, ind, X=X, L=L,
+                                        exact_pval='if_necessary',
+                                        pval_thresh=0.01)
+            assert test(ind) == (res.stat, res.cutoff, res.pval)
+
+
+def test_limit_pval(my_incredible_pval_v):
+    N = my_incredible_pval_v.size
+    ind = np.uint16(np.nonzero(my_incredible_pval_v)[0])
+    for use_alg1 in [False, True]:
+        res = get_xlmhg_test_result(N, ind, use_alg1=use_alg1)
+        test = prepare_xlmhg_test(N, use_alg1=use_alg1)
+        assert test(ind) == (res.stat, res.cutoff, res.pval)
+
+
+def test_invalid(my_N, my_ind):
+    with pytest.raises(ValueError):
+        prepare_xlmhg_test(my_N, X=my_N+1)
+    with pytest.raises(ValueError):
+        prepare_xlmhg_test(my_N, exact_pval='if_necessary')
+    with pytest.raises(ValueError):
+        # approximate p-values are not supported
+        prepare_xlmhg_test(my_N, exact_pval='approx')
+    test = prepare_xlmhg_test(my_N)
+    with pytest.raises(ValueError):
+        # non-contiguous
+        test(my_ind[::-1])
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(X=-1), dict(L=1000), dict(exact_pval='never'),
+    dict(exact_pval='if_significant'), dict(pval_thresh=1.5), dict(tol=1.0)])
+def test_same_checks(my_N, my_ind, kwargs):
+    # both entry points reject the same arguments with the same errors
+    with pytest.raises(ValueError) as expected:
+        get_xlmhg_test_result(my_N, my_ind, **kwargs)
+    with pytest.raises(ValueError) as error:
+        prepare_xlmhg_test(my_N, **kwargs)
+    assert str(error.value) == str(expected.value)
+
+
+def test_invalid_indices(my_N, my_ind):
+    test = prepare_xlmhg_test(my_N)
+    with pytest.raises(ValueError):
+        # index out of range
+        test(np.append(my_ind, np.uint16(my_N)))
+    with pytest.raises(ValueError):
+        # K > N
+        test(np.arange(my_N + 1, dtype=np.uint16))
+    # the test can still be used
+    assert test(my_ind)[2] == 0.0244453044375645
@@ -0,0 +1,144 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the persistent p-value store (`xlmhg.pvalstore`)."""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, xlmhg_test, get_xlmhg_top_k, \
+    use_pval_store, PvalStore
+from xlmhg import pvalstore
+
+
+@pytest.fixture
+def my_store(tmpdir):
+    store = use_pval_store(str(tmpdir.join('cache')))
+    yield store
+    use_pval_store(None)
+
+
+def _put_pvals(cache_dir, N):
+    store = PvalStore(cache_dir)
+    for K in range(1, 51):
+        store.put(N, K, 0, N, 0.5 / K, 1e-12, 'pval2', 0.6 / K)
+    store.close()
+    return N
+
+
+def test_get_put(tmpdir):
+    store = PvalStore(str(tmpdir))
+    assert os.path.basename(store.path).startswith('pvals-')
+    assert store.get(20, 5, 1, 20, 0.01, 1e-12, 'pval2') is None
+    store.put(20, 5, 1, 20, 0.01, 1e-12, 'pval2', 0.02)
+    assert store.get(20, 5, 1, 20, 0.01, 1e-12, 'pval2') == 0.02
+    assert store.get(20, 5, 1, 20, 0.01, 1e-12, 'pval1') is None
+    assert store.get(20, 5, 2, 20, 0.01, 1e-12, 'pval2') is None
+    assert len(store) == 1
+
+    # the p-values are persistent
+    store.close()
+    store = PvalStore(str(tmpdir))
+    assert store.get(20, 5, 1, 20, 0.01, 1e-12, 'pval2') == 0.02
+    store.clear()
+    assert len(store) == 0
+
+
+def test_concurrent(tmpdir):
+    cache_dir = str(tmpdir)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_put_pvals, cache_dir, N)
+                   for N in range(100, 108)]
+        for f in futures:
+            f.result()
+    store = PvalStore(cache_dir)
+    assert len(store) == 400
+    assert store.get(107, 10, 0, 107, 0.05, 1e-12, 'pval2') == 0.6 / 10
+
+
+def test_evict(tmpdir):
+    store = PvalStore(str(tmpdir), max_size=100000)
+    for i in range(5000):
+        store.put(1000, 10, 0, 1000, i * 1e-6, 1e-12, 'pval2', 0.5)
+    # eviction is triggered automatically
+    assert len(store) < 5000
+    store.evict()
+    assert store._get_size(store._conn) <= 100000
+    # the oldest p-values were removed
+    assert store.get(1000, 10, 0, 1000, 0.0, 1e-12, 'pval2') is None
+    assert store.get(1000, 10, 0, 1000, 4999e-6, 1e-12, 'pval2') == 0.5
+
+
+def test_invalid(tmpdir):
+    with pytest.raises(ValueError):
+        PvalStore(str(tmpdir), max_size=0)
+
+
+def test_unwritable(tmpdir, my_N, my_ind):
+    # the cache directory cannot be created inside a file
+    tmpdir.join('file').write('')
+    cache_dir = str(tmpdir.join('file', 'cache'))
+    store = use_pval_store(cache_dir)
+    try:
+        result = get_xlmhg_test_result(my_N, my_ind, X=1)
+        assert result.dp_cells > 0
+        assert not store.enabled
+        assert store.get(20, 5, 1, 20, 0.01, 1e-12, 'pval2') is None
+    finally:
+        use_pval_store(None)
+
+    # the environment variable does not break the import
+    env = dict(os.environ)
+    env[pvalstore.STORE_ENV_VAR] = cache_dir
+    code = ('import numpy as np, xlmhg; '
+            'print(xlmhg.xlmhg_test(np.uint8([1, 0, 1, 0, 0]), X=1)[2])')
+    out = subprocess.check_output([sys.executable, '-c', code], env=env)
+    assert 0 < float(out) <= 1.0
+
+
+def test_test_result(my_store, my_N, my_ind):
+    result1 = get_xlmhg_test_result(my_N, my_ind, X=1)
+    assert result1.dp_cells > 0
+    assert len(my_store) == 1
+    result2 = get_xlmhg_test_result(my_N, my_ind, X=1)
+    assert result2.dp_cells == 0
+    assert result2.tier == result1.tier
+    assert result2.pval == result1.pval
+
+    # PVAL1 results are stored separately
+    result3 = get_xlmhg_test_result(my_N, my_ind, X=1, use_alg1=True)
+    assert result3.dp_cells > 0
+    assert len(my_store) == 2
+
+
+def test_simple_api(my_store, my_v):
+    pval1 = xlmhg_test(my_v, X=1)[2]
+    assert len(my_store) == 1
+    assert xlmhg_test(my_v, X=1)[2] == pval1
+    assert get_xlmhg_test_result(my_v.size, np.uint16(np.nonzero(my_v)[0]),
+                                 X=1).dp_cells == 0
+
+
+def test_batch(my_store):
+    rng = np.random.RandomState(0)
+    N = 500
+    indices = [np.sort(np.uint16(rng.choice(N, 20, replace=False)))
+               for _ in range(20)]
+    top1 = get_xlmhg_top_k(N, indices, k=5)
+    num_stored = len(my_store)
+    assert num_stored >= 5
+    # the stored p-values are used
+    top2 = get_xlmhg_top_k(N, indices, k=5)
+    assert len(my_store) == num_stored
+    use_pval_store(None)
+    assert pvalstore.store is None
+    top3 = get_xlmhg_top_k(N, indices, k=5)
+    for top in [top2, top3]:
+        assert np.all(top.index == top1.index)
+        assert np.all(top.pval == top1.pval)
@@ -4,6 +4,8 @@
 
 """Tests for the simple Python API (`xlmhg_test`)."""
 
+import array
+
 import numpy as np
 import pytest
 
@@ -26,7 +28,7 @@ def test_mhg(my_v):
 def test_X(my_v):
     # test effect of X
     res = xlmhg_test(my_v, X=4)
-    assert res[2] == 0.01876934984520124
+    assert res[2] == pytest.approx(0.01876934984520124, rel=1e-12)
 
 
 def test_L(my_v):
@@ -55,7 +57,30 @@ def test_list_too_long(my_much_too_long_v):
 def test_table_too_small(my_N, my_ind, my_v):
     K = my_ind.size
     with pytest.raises(ValueError):
-        table = np.empty(((my_N-K), (my_N-K)), np.longdouble)
+        table = np.empty((K, 1), np.longdouble)
         result = xlmhg_test(my_v, table=table)
 
 
+def test_dense_input(my_v):
+    # the list can be any 1-dim integer or boolean buffer, with any stride
+    expected = xlmhg_test(my_v)
+    matrix = np.zeros((my_v.size, 3), dtype=np.uint8)
+    matrix[:, 1] = my_v
+    for v in [my_v.astype(np.bool_), my_v.astype(np.uint8),
+              my_v.astype(np.int64), matrix[:, 1],
+              array.array('l', my_v.astype(np.int_)),
+              memoryview(my_v.astype(np.int16))]:
+        assert xlmhg_test(v) == expected
+    with pytest.raises(AssertionError):
+        xlmhg_test(my_v.astype(np.float64))
+
+
+def test_consistency(my_v, my_incredible_stat_v, my_incredible_pval_v):
+    # the simple API reports the same p-values as `get_xlmhg_test_result`
+    for v in [my_v, my_incredible_stat_v, my_incredible_pval_v]:
+        for X in [1, 3]:
+            stat, cutoff, pval = xlmhg_test(v, X=X)
+            result = get_xlmhg_test_result(
+                v.size, np.uint16(np.nonzero(v)[0]), X=X)
+            assert (stat, cutoff, pval) == \
+                (result.stat, result.cutoff, result.pval)
@@ -0,0 +1,103 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for streaming tests (`xlmhg.stream`)."""
+
+import gzip
+
+import numpy as np
+import pytest
+
+from xlmhg import read_gmt, read_ranked_lists, iter_xlmhg_results, \
+    write_results, get_xlmhg_test_result
+
+
+@pytest.fixture
+def my_files(tmpdir):
+    rng = np.random.RandomState(0)
+    genes = ['g%d' % i for i in range(300)]
+    gmt_path = str(tmpdir.join('sets.gmt'))
+    with open(gmt_path, 'w') as f:
+        for i in range(25):
+            size = rng.randint(1, 40)
+            f.write('set%d\tdescription\t%s\n'
+                    % (i, '\t'.join(rng.choice(genes, size, replace=False))))
+        # a gene set with genes that are missing from all rankings
+        f.write('missing\t\tmissing1\tmissing2\tg0\n\n')
+    ranking_path = str(tmpdir.join('rankings.txt.gz'))
+    with gzip.open(ranking_path, 'wt') as f:
+        for j in range(3):
+            f.write('ranking%d\t%s\n'
+                    % (j, '\t'.join(rng.permutation(genes)[:250])))
+    return gmt_path, ranking_path
+
+
+def test_readers(my_files):
+    gmt_path, ranking_path = my_files
+    gene_sets = list(read_gmt(gmt_path))
+    assert len(gene_sets) == 26
+    assert gene_sets[-1] == ('missing', '', ['missing1', 'missing2', 'g0'])
+    rankings = list(read_ranked_lists(ranking_path))
+    assert [r[0] for r in rankings] == ['ranking0', 'ranking1', 'ranking2']
+    assert all(len(r[1]) == 250 for r in rankings)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_results(my_files, chunk_size):
+    gmt_path, ranking_path = my_files
+    gene_sets = dict((gs[0], gs[2]) for gs in read_gmt(gmt_path))
+    rankings = dict(read_ranked_lists(ranking_path))
+
+    results = list(iter_xlmhg_results(gmt_path, ranking_path, X=2, L=100,
+                                      chunk_size=chunk_size))
+    assert len(results) == len(gene_sets) * len(rankings)
+    assert len(set((r.ranking, r.gene_set) for r in results)) == len(results)
+    for r in results:
+        rank = dict((g, i) for i, g in enumerate(rankings[r.ranking]))
+        ind = np.uint16(sorted(rank[g] for g in gene_sets[r.gene_set]
+                               if g in rank))
+        expected = get_xlmhg_test_result(250, ind, X=2, L=100)
+        assert (r.K, r.stat, r.cutoff, r.pval) == \
+            (expected.K, expected.stat, expected.cutoff, expected.pval)
+
+
+def test_stats_only(my_files):
+    gmt_path, ranking_path = my_files
+    results = dict(((r.ranking, r.gene_set), r) for r in
+                   iter_xlmhg_results(gmt_path, ranking_path))
+    stats = list(iter_xlmhg_results(gmt_path, ranking_path, stats_only=True,
+                                    chunk_size=10))
+    assert len(stats) == len(results)
+    for s in stats:
+        r = results[(s.ranking, s.gene_set)]
+        assert s.stat == r.stat and s.cutoff == r.cutoff
+        assert s.pval >= r.pval and s.tier == 'O1_bound'
+
+    with pytest.raises(AssertionError):
+        # the rankings are read once per chunk
+        next(iter_xlmhg_results(gmt_path, read_ranked_lists(ranking_path)))
+
+
+@pytest.mark.parametrize('stats_only', [False, True])
+def test_short_ranking(stats_only):
+    # X exceeds the length of one of the ranked lists
+    gene_sets = [('set0', '', ['a', 'b']), ('set1', '', ['c', 'x'])]
+    rankings = [('short', ['b', 'a']), ('long', list('abcdefghij'))]
+    results = list(iter_xlmhg_results(gene_sets, rankings, X=5,
+                                      stats_only=stats_only))
+    assert len(results) == 4
+    short = [r for r in results if r.ranking == 'short']
+    assert [(r.N, r.X, r.L) for r in short] == [(2, 2, 2), (2, 2, 2)]
+    assert all(r.stat == 1.0 and r.pval == 1.0 for r in results)
+
+def test_write(my_files, tmpdir):
+    gmt_path, ranking_path = my_files
+    path = str(tmpdir.join('results.tsv.gz'))
+    num_results = write_results(
+        iter_xlmhg_results(gmt_path, ranking_path, chunk_size=4), path)
+    assert num_results == 78
+    with gzip.open(path, 'rt') as f:
+        lines = f.read().splitlines()
+    assert lines[0].split('\t')[:3] == ['ranking', 'gene_set', 'N']
+    assert len(lines) == 79
@@ -0,0 +1,48 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for the parameter sweep (`get_xlmhg_sweep`)."""
+
+import numpy as np
+import pytest
+
+from xlmhg import get_xlmhg_test_result, get_xlmhg_sweep
+from xlmhg.workload import get_synthetic_workload
+
+
+def check_sweep(N, indices, X_values, L_values):
+    res = get_xlmhg_sweep(N, indices, X_values, L_values)
+    assert res.stat.shape == (len(X_values), len(L_values))
+    for i, X in enumerate(X_values):
+        for j, L in enumerate(L_values):
+            expected = get_xlmhg_test_result(N, indices, X=X, L=L)
+            assert res.stat[i, j] == expected.stat
+            assert res.cutoff[i, j] == expected.cutoff
+            assert res.pval[i, j] == expected.pval
+
+
+def test_paper_example(my_N, my_ind):
+    check_sweep(my_N, my_ind, list(range(0, 7)), list(range(0, my_N+1)))
+
+
+def test_workload():
+    workload = get_synthetic_workload(N=500, num_sets=10, frac_enriched=0.5,
+                                      seed=4)
+    X_values = [0, 1, 3, 10]
+    L_values = [500, 10, 25, 50, 100, 250, 25]
+    for ind in workload.indices:
+        check_sweep(workload.N, ind, X_values, L_values)
+
+
+def test_no_pvals(my_N, my_ind):
+    res = get_xlmhg_sweep(my_N, my_ind, [1], [my_N], pval=False)
+    assert res.pval is None
+    assert res.stat[0, 0] == 0.01393188854489164
+
+
+def test_invalid(my_N, my_ind):
+    with pytest.raises(ValueError):
+        get_xlmhg_sweep(my_N, my_ind, [1], [my_N+1])
+    with pytest.raises(ValueError):
+        get_xlmhg_sweep(my_N, my_ind, [-1], [my_N])
@@ -0,0 +1,181 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Tests for file-based work queues (`xlmhg.workqueue`)."""
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pytest
+
+from xlmhg import iter_xlmhg_results, write_results, create_work_queue, \
+    run_worker, get_work_queue_status, merge_work_queue
+from xlmhg.cli import main
+from xlmhg.workqueue import _claim_shard
+
+
+@pytest.fixture
+def my_files(tmpdir):
+    rng = np.random.RandomState(0)
+    genes = ['g%d' % i for i in range(300)]
+    gmt_path = str(tmpdir.join('sets.gmt'))
+    with open(gmt_path, 'w') as f:
+        for i in range(25):
+            size = rng.randint(1, 40)
+            f.write('set%d\tdescription\t%s\n'
+                    % (i, '\t'.join(rng.choice(genes, size, replace=False))))
+    rankings_path = str(tmpdir.join('rankings.txt'))
+    with open(rankings_path, 'w') as f:
+        for j in range(3):
+            f.write('ranking%d\t%s\n'
+                    % (j, '\t'.join(rng.permutation(genes)[:250])))
+    expected_path = str(tmpdir.join('expected.tsv'))
+    write_results(iter_xlmhg_results(gmt_path, rankings_path, X=2,
+                                      chunk_size=4), expected_path)
+    with open(expected_path) as f:
+        expected = f.read()
+    return gmt_path, rankings_path, expected
+
+
+def test_workers(my_files, tmpdir):
+    gmt_path, rankings_path, expected = my_files
+    queue_dir = str(tmpdir.join('queue'))
+    assert create_work_queue(gmt_path, rankings_path, queue_dir, X=2,
+                             chunk_size=4) == 7
+    # creating the same queue again is a no-op
+    assert create_work_queue(gmt_path, rankings_path, queue_dir, X=2,
+                             chunk_size=4) == 7
+    assert get_work_queue_status(queue_dir) == (7, 0, 0)
+
+    output_path = str(tmpdir.join('results.tsv'))
+    with pytest.raises(ValueError):
+        merge_work_queue(queue_dir, output_path)
+
+    # several workers that compete for the shards
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(run_worker, queue_dir, 'worker%d' % i)
+                   for i in range(3)]
+        # each shard is processed exactly once
+        assert sum(f.result() for f in futures) == 7
+    assert get_work_queue_status(queue_dir) == (7, 7, 7)
+    assert run_worker(queue_dir) == 0
+
+    assert merge_work_queue(queue_dir, output_path) == 75
+    with open(output_path) as f:
+        assert f.read() == expected
+    assert not any('.tmp' in name for name in os.listdir(queue_dir))
+
+
+def test_stale_lock(my_files, tmpdir):
+    gmt_path, rankings_path, expected = my_files
+    queue_dir = str(tmpdir.join('queue'))
+    create_work_queue(gmt_path, rankings_path, queue_dir, X=2, chunk_size=4)
+
+    # simulate a worker that dies after claiming a shard
+    assert run_worker(queue_dir, max_shards=2) == 2
+    with open(os.path.join(queue_dir, 'shard-000002.lock'), 'w') as f:
+        f.write('dead\n')
+    assert get_work_queue_status(queue_dir) == (7, 3, 2)
+    assert run_worker(queue_dir) == 4
+    assert get_work_queue_status(queue_dir) == (7, 7, 6)
+
+    # the lock is only broken once it is older than the timeout
+    assert run_worker(queue_dir, lock_timeout=3600) == 0
+    past = time.time() - 7200
+    os.utime(os.path.join(queue_dir, 'shard-000002.lock'), (past, past))
+    assert run_worker(queue_dir, lock_timeout=3600) == 1
+    assert get_work_queue_status(queue_dir) == (7, 7, 7)
+
+    output_path = str(tmpdir.join('results.tsv'))
+    merge_work_queue(queue_dir, output_path)
+    with open(output_path) as f:
+        assert f.read() == expected
+
+
+def _break_lock(queue_dir, worker_id, barrier, results):
+    barrier.wait()
+    results.put(_claim_shard(queue_dir, 0, worker_id, 3600))
+
+
+def test_stale_lock_concurrent(tmpdir):
+    # several workers try to break the same stale lock at the same time
+    queue_dir = str(tmpdir)
+    lock_path = os.path.join(queue_dir, 'shard-000000.lock')
+    num_workers = 4
+    for _ in range(10):
+        with open(lock_path, 'w') as f:
+            f.write('dead\n')
+        past = time.time() - 7200
+        os.utime(lock_path, (past, past))
+        barrier = multiprocessing.Barrier(num_workers)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(
+                     target=_break_lock,
+                     args=(queue_dir, 'w%d' % i, barrier, results))
+                 for i in range(num_workers)]
+        for p in procs:
+            p.start()
+        claimed = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join()
+        # exactly one worker claims the shard
+        assert sum(claimed) == 1
+        os.remove(lock_path)
+
+
+def test_stale_lock_fresh(tmpdir, monkeypatch):
+    # another worker broke the stale lock after this worker found it to be
+    # stale, and created a new lock, which must not be broken
+    queue_dir = str(tmpdir)
+    lock_path = os.path.join(queue_dir, 'shard-000000.lock')
+    with open(lock_path, 'w') as f:
+        f.write('other\n')
+    getmtime = os.path.getmtime
+    calls = []
+
+    def get_old_mtime(path):
+        calls.append(path)
+        if len(calls) == 1:
+            return time.time() - 7200
+        return getmtime(path)
+
+    monkeypatch.setattr('xlmhg.workqueue.os.path.getmtime', get_old_mtime)
+    assert not _claim_shard(queue_dir, 0, 'w0', 3600)
+    with open(lock_path) as f:
+        assert f.read() == 'other\n'
+    assert os.listdir(queue_dir) == ['shard-000000.lock']
+
+
+def test_stale_queue(my_files, tmpdir):
+    gmt_path, rankings_path, _ = my_files
+    queue_dir = str(tmpdir.join('queue'))
+    create_work_queue(gmt_path, rankings_path, queue_dir, X=2, chunk_size=4)
+    with pytest.raises(ValueError):
+        # different parameters
+        create_work_queue(gmt_path, rankings_path, queue_dir, X=3,
+                          chunk_size=4)
+    with open(gmt_path, 'a') as f:
+        f.write('extra\t\tg1\tg2\n')
+    with pytest.raises(ValueError):
+        # different input
+        create_work_queue(gmt_path, rankings_path, queue_dir, X=2,
+                          chunk_size=4)
+
+
+def test_cli(my_files, tmpdir):
+    gmt_path, rankings_path, expected = my_files
+    queue_dir = str(tmpdir.join('queue'))
+    output_path = str(tmpdir.join('results.tsv'))
+    assert main(['-g', gmt_path, '-m', rankings_path, '-X', '2',
+                 '--chunk-size', '4', '--queue-dir', queue_dir, '-j', '2',
+                 '-q']) == 0
+    # additional workers only need the queue directory
+    assert main(['--queue-dir', queue_dir, '-q']) == 0
+    assert main(['--queue-dir', queue_dir, '--merge', '-o', output_path,
+                 '-q']) == 0
+    with open(output_path) as f:
+        assert f.read() == expected
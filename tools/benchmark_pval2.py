@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Compare the speed of PVAL2 in double and long double precision."""
+
+import time
+
+import numpy as np
+
+from xlmhg import mhg_cython
+
+CONFIGS = [(1000, 50), (2000, 100), (5000, 300), (10000, 500),
+           (20000, 1000), (20000, 3000)]
+
+
+def main():
+    np.random.seed(0)
+    for N, K in CONFIGS:
+        # random indices, with an enrichment at the top of the list
+        indices = np.random.choice(N, K, replace=False)
+        indices[:K//10] = np.random.choice(N//10, K//10, replace=False)
+        indices = np.uint16(np.unique(indices))
+        K = indices.size
+        stat, _ = mhg_cython.get_xlmhg_stat(indices, N, K, 1, N)
+        table = np.empty((K+1, 1), dtype=np.longdouble)
+        reps = max(1, int(2e7 / (N*K)))
+
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            mhg_cython.get_xlmhg_pval2(N, K, 1, N, stat, table)
+        t_long = (time.perf_counter() - t0) / reps
+
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            mhg_cython.get_xlmhg_pval2_double(N, K, 1, N, stat)
+        t_double = (time.perf_counter() - t0) / reps
+
+        print('N=%5d K=%4d  long double: %8.3f ms  double: %8.3f ms  '
+              'speedup: %.2fx'
+              % (N, K, 1e3*t_long, 1e3*t_double, t_long / t_double))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,25 @@ import pkg_resources
 
 __version__ = pkg_resources.require('xlmhg')[0].version
 
-from .result import mHGResult
-from .test import get_xlmhg_O1_bound, xlmhg_test, get_xlmhg_test_result
+from .anytime import iter_xlmhg_pval_brackets
+from .batch import get_xlmhg_batch_stats, get_xlmhg_rejections, \
+    get_xlmhg_top_k, get_xlmhg_batch_results, get_xlmhg_lazy_results, \
+    LazyBatchResults
+from .bounds import get_xlmhg_O1_bounds, get_xlmhg_ON_bounds
+from .checkpoint import run_checkpointed_job, merge_shards
+from .extension import use_traced_extension
+from .geneset import GeneSetIndex
+from .hypergeom import get_hypergeometric_pvals
+from .packed import pack_gene_sets, get_ranked_packed, get_packed_indices, \
+    get_packed_counts, get_xlmhg_packed_stats
+from .permutation import get_xlmhg_permutation_pval
+from .pvalstore import use_pval_store, PvalStore
+from .result import mHGResult, mHGPairedResult
+from .sweep import get_xlmhg_sweep
+from .stream import read_gmt, read_ranked_lists, iter_xlmhg_results, \
+    write_results
+from .test import get_xlmhg_O1_bound, xlmhg_test, get_xlmhg_test_result, \
+    get_xlmhg_bidirectional_result, prepare_xlmhg_test
+from .workqueue import create_work_queue, run_worker, \
+    get_work_queue_status, merge_work_queue
 from .visualize import get_result_figure
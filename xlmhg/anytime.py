@@ -0,0 +1,136 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Anytime calculation of XL-mHG p-values."""
+
+from collections import namedtuple
+import time
+import logging
+
+import numpy as np
+
+from . import extension
+from .test import _check_test_args, _get_table
+
+logger = logging.getLogger(__name__)
+
+PValBracket = namedtuple('PValBracket', ['label', 'lower', 'upper'])
+PValBracket.__doc__ = """Lower and upper bounds for an XL-mHG p-value.
+
+``label`` describes how the bounds were obtained: "stat" (the test statistic
+is a lower bound), "O1_bound" and "ON_bound" (the O(1)- and O(N)-bounds),
+"pval2_partial" (an incomplete PVAL2 calculation), or "exact" (the exact
+p-value; ``lower`` and ``upper`` are identical).
+"""
+
+
+def iter_xlmhg_pval_brackets(N, indices, X=None, L=None, deadline=None,
+                             interval=0.01, table=None, tol=1e-12):
+    """Calculate progressively tighter bounds for an XL-mHG p-value.
+
+    This generator first yields the test statistic (as a lower bound), then
+    the O(1)- and O(N)-bounds, and then runs PVAL2 in slices of ``interval``
+    seconds, yielding the bounds implied by the partial calculation after
+    each slice, until the exact p-value is known. The last bracket yielded
+    is always the tightest one.
+
+    If a ``deadline`` is specified, the generator stops as soon as the
+    deadline has passed (the time is also checked inside the C extension,
+    after each cutoff), so that the caller can use the last bracket yielded.
+
+    Parameters
+    ----------
+    N: int
+        The length of the list.
+    indices: 1-dim `numpy.ndarray` with an integer ``dtype``
+        Sorted list of indices corresponding to the "1"s in the ranked list.
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    deadline: float, optional
+        The deadline, as a value of `time.monotonic`. [None]
+    interval: float, optional
+        The time (in seconds) between successive brackets during the PVAL2
+        calculation. [0.01]
+    table: `numpy.ndarray` with ``ndim=2`` and ``dtype=numpy.longdouble``, optional
+        The dynamic programming table. Size has to be at least (K+1) x 1.
+        [None]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Yields
+    ------
+    `PValBracket`
+        The current lower and upper bounds for the p-value.
+    """
+    assert isinstance(interval, (float, np.floating))
+    if deadline is not None:
+        assert isinstance(deadline, (float, np.floating))
+
+    X, L = _check_test_args(N, indices, X, L, 'always', None, None, table,
+                            False, tol)
+    if not interval > 0:
+        raise ValueError('Invalid value interval=%.1e; should be > 0.'
+                         % interval)
+
+    mhg_cython = extension.mhg_cython
+    K = indices.size
+
+    def time_is_up():
+        return deadline is not None and time.monotonic() >= deadline
+
+    if X > min(K, L):
+        # by definition, s=1.0 and p=1.0
+        yield PValBracket('exact', 1.0, 1.0)
+        return
+
+    stat, _, O1_bound, _, _ = mhg_cython.get_xlmhg_stat_bounds(
+        indices, N, K, X, L, None, tol)
+    if stat == 1.0 or stat == 0.0:
+        yield PValBracket('exact', stat, stat)
+        return
+
+    yield PValBracket('stat', stat, 1.0)
+    if time_is_up():
+        return
+
+    upper = O1_bound
+    yield PValBracket('O1_bound', stat, upper)
+    if time_is_up():
+        return
+
+    upper = min(upper, float(
+        mhg_cython.get_xlmhg_ON_bound(N, K, X, L, stat, tol)))
+    yield PValBracket('ON_bound', stat, upper)
+
+    table = _get_table(table, K, N - K, False)
+    state = np.zeros(4, dtype=np.longdouble)
+    while not time_is_up():
+        max_seconds = interval
+        if deadline is not None:
+            max_seconds = min(max_seconds, deadline - time.monotonic())
+        status = mhg_cython.get_xlmhg_pval2_partial(
+            N, K, X, L, stat, table, state, max(max_seconds, 0.0), tol)
+        pval = float(state[1])
+
+        if status == 1:
+            if pval > 0 and pval <= upper * (1.0 + tol):
+                yield PValBracket('exact', pval, pval)
+            else:
+                logger.warning('Insufficient floating point precision for '
+                               'calculating the exact XL-mHG p-value.')
+            return
+        elif status == -1:
+            logger.warning('Insufficient floating point precision for '
+                           'calculating the exact XL-mHG p-value.')
+            return
+
+        # Paths that have not entered R yet can only enter it at one of the
+        # remaining cutoffs, and the probability of being in R at any single
+        # cutoff is at most the test statistic.
+        n = int(state[0])
+        lower = max(stat, pval)
+        upper = max(min(upper, pval + (L - n) * stat), lower)
+        yield PValBracket('pval2_partial', lower, upper)
@@ -0,0 +1,585 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Python API for performing batches of XL-mHG tests."""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import logging
+
+import numpy as np
+
+from . import extension
+from . import metrics
+from .bounds import get_xlmhg_ON_bounds
+from .test import get_xlmhg_test_result, _calculate_exact_pval
+
+logger = logging.getLogger(__name__)
+
+BatchStats = namedtuple('BatchStats', ['K', 'stat', 'cutoff', 'O1_bound'])
+BatchStats.__doc__ = """Test statistics and O(1)-bounds for a batch of tests.
+
+All fields are 1-dim `numpy.ndarray` objects, with one element per test.
+"""
+
+RejectionResult = namedtuple(
+    'RejectionResult',
+    ['rejected', 'pval_lower', 'pval_upper', 'num_exact'])
+RejectionResult.__doc__ = """The result of a multiple testing correction.
+
+``rejected`` is a boolean `numpy.ndarray` indicating which null hypotheses
+were rejected. ``pval_lower`` and ``pval_upper`` contain the final lower and
+upper bounds for each p-value (they are identical for all tests for which the
+exact p-value was calculated). ``num_exact`` is the number of exact p-values
+that had to be calculated.
+"""
+
+BatchResults = namedtuple('BatchResults', ['results', 'num_tested'])
+BatchResults.__doc__ = """The results of a batch of XL-mHG tests.
+
+``results`` is a list with one `mHGResult` object per test. Tests with
+identical ``indices`` arrays share the same object. ``num_tested`` is the
+number of distinct ``indices`` arrays, i.e., the number of tests that were
+actually performed.
+"""
+
+TopKResult = namedtuple('TopKResult', ['index', 'pval', 'num_exact'])
+TopKResult.__doc__ = """The most significant tests of a batch.
+
+``index`` is an integer `numpy.ndarray` with the positions of the (at most
+k) most significant tests in the batch, sorted by increasing p-value (ties are
+broken by position). ``pval`` contains the corresponding exact p-values.
+``num_exact`` is the number of exact p-values that had to be calculated.
+"""
+
+
+def _check_batch_args(N, indices, X, L, tol):
+    """Check the arguments shared by the batch functions.
+
+    Returns the values of ``X`` and ``L`` (after assigning default values).
+    """
+    # type checks
+    assert isinstance(N, (int, np.integer))
+    assert isinstance(indices, (list, tuple))
+    if X is not None:
+        assert isinstance(X, (int, np.integer))
+    if L is not None:
+        assert isinstance(L, (int, np.integer))
+    assert isinstance(tol, (float, np.floating))
+
+    # assign default values, if None
+    if X is None:
+        X = 0
+    if L is None:
+        L = N
+
+    ### check whether parameter values are in range
+    if N > 65536:
+        raise ValueError(
+            'Length of list cannot exceed 65536.'
+        )
+    if not (0 <= X <= N):
+        raise ValueError(
+            'Invalid value X=%d; should be >= 0 and <= %d.' % (X, N)
+        )
+    if not (0 <= L <= N):
+        raise ValueError(
+            'Invalid value L=%d; should be >= 0 and <= %d.' % (L, N)
+        )
+    if not (0.0 <= tol < 1.0):
+        raise ValueError('Invalid value tol=%.1e; should be in [0,1).' % tol)
+
+    for ind in indices:
+        if not (isinstance(ind, np.ndarray) and ind.ndim == 1 and
+                np.issubdtype(ind.dtype, np.uint16)):
+            raise ValueError('All index arrays must be 1-dim arrays with '
+                             'dtype=np.uint16.')
+        if not ind.flags.c_contiguous:
+            raise ValueError('Array is not C-contiguous! Try '
+                             '"np.ascontiguousarray()".')
+
+    return int(X), int(L)
+
+
+def _get_unique_indices(indices):
+    """Find the distinct ``indices`` arrays of a batch.
+
+    Returns the list of distinct arrays (in order of first occurrence), and
+    an integer `numpy.ndarray` with the position of each test's array in that
+    list.
+    """
+    positions = {}
+    unique = []
+    inverse = np.empty(len(indices), dtype=np.int64)
+    for i, ind in enumerate(indices):
+        # all arrays are uint16, so equal bytes imply equal arrays
+        key = ind.tobytes()
+        j = positions.get(key)
+        if j is None:
+            j = len(unique)
+            positions[key] = j
+            unique.append(ind)
+        inverse[i] = j
+    num_saved = len(indices) - len(unique)
+    if num_saved > 0:
+        logger.debug('%d of %d tests have duplicate indices arrays.',
+                     num_saved, len(indices))
+        if metrics.registry.enabled:
+            metrics.registry.increment('tests_deduplicated', num_saved)
+    return unique, inverse
+
+
+def _get_batch_stats(N, indices, X, L, tol):
+    """Calculate test statistics and O(1)-bounds (without checks).
+
+    The statistics are calculated once for each distinct ``indices`` array.
+    """
+    mhg_cython = extension.mhg_cython
+    unique, inverse = _get_unique_indices(indices)
+    num_tests = len(unique)
+    K = np.empty(num_tests, dtype=np.int64)
+    stat = np.empty(num_tests, dtype=np.float64)
+    cutoff = np.empty(num_tests, dtype=np.int64)
+    O1_bound = np.empty(num_tests, dtype=np.float64)
+    for i, ind in enumerate(unique):
+        K[i] = ind.size
+        stat[i], cutoff[i], O1_bound[i], _, _ = \
+            mhg_cython.get_xlmhg_stat_bounds(ind, N, ind.size, X, L, None,
+                                             tol)
+    return BatchStats(K[inverse], stat[inverse], cutoff[inverse],
+                      O1_bound[inverse])
+
+
+def _get_exact_pval(N, K, X, L, stat, O1_bound, table, tol):
+    """Calculate an exact p-value using PVAL2.
+
+    Like `get_xlmhg_test_result`, reports the O(1)-bound instead if the
+    p-value could not be calculated due to insufficient floating point
+    precision.
+    """
+    if stat == 1.0 or stat == 0.0:
+        return stat
+    return _calculate_exact_pval(N, K, X, L, stat, O1_bound, table, False,
+                                 tol)[0]
+
+
+def _get_batch_table(N, K):
+    """Create a dynamic programming table that is large enough for all tests
+    in a batch."""
+    max_K = int(K.max()) if K.size > 0 else 0
+    # PVAL2 only uses the first column
+    return np.empty((max_K+1, 1), dtype=np.longdouble)
+
+
+def get_xlmhg_batch_stats(N, indices, X=None, L=None, tol=1e-12):
+    """Calculate XL-mHG test statistics and O(1)-bounds for a batch of tests.
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    indices: list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        For each test, the sorted indices of the "1"s in the ranked list.
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `BatchStats`
+        The number of 1's, test statistic, cutoff and O(1)-bound for each
+        test.
+    """
+    X, L = _check_batch_args(N, indices, X, L, tol)
+    return _get_batch_stats(N, indices, X, L, tol)
+
+
+def get_xlmhg_rejections(N, indices, alpha=0.05, method='fdr_bh',
+                         X=None, L=None, tol=1e-12):
+    """Apply a multiple testing correction to a batch of XL-mHG tests.
+
+    This function determines which null hypotheses are rejected by the
+    Benjamini-Hochberg procedure ("fdr_bh") or the Bonferroni correction
+    ("bonferroni"), while calculating as few exact p-values as possible. The
+    XL-mHG test statistic (a lower bound for the p-value) and the O(1)- and
+    O(N)-bounds (upper bounds) bracket each p-value. Exact p-values are only
+    calculated for tests whose bracket contains a threshold that is relevant
+    for the decision. The result is the same as if the procedure had been
+    applied to the exact p-values of all tests.
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    indices: list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        For each test, the sorted indices of the "1"s in the ranked list.
+    alpha: float, optional
+        The family-wise error rate ("bonferroni") or false discovery rate
+        ("fdr_bh") to control. [0.05]
+    method: str, optional
+        The correction method, either "fdr_bh" or "bonferroni". ["fdr_bh"]
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `RejectionResult`
+        The rejected hypotheses, the final p-value brackets, and the number
+        of exact p-values calculated.
+    """
+    assert isinstance(alpha, (float, np.floating))
+    assert isinstance(method, str)
+
+    X, L = _check_batch_args(N, indices, X, L, tol)
+    if not (0.0 <= alpha <= 1.0):
+        raise ValueError('Invalid value alpha=%.1e; should be in [0,1].'
+                         % alpha)
+    if method not in ['fdr_bh', 'bonferroni']:
+        raise ValueError('Invalid value method="%s". Must be "fdr_bh" or '
+                         '"bonferroni".' % method)
+
+    m = len(indices)
+    stats = _get_batch_stats(N, indices, X, L, tol)
+    if m == 0:
+        return RejectionResult(np.zeros(0, dtype=np.bool_), stats.stat,
+                               stats.O1_bound, 0)
+
+    # the p-value brackets
+    # (widened by the floating point tolerance, so that all tests with a
+    #  p-value close to a threshold are calculated exactly)
+    lower = stats.stat.copy()
+    upper = stats.O1_bound.copy()
+    is_exact = (lower == 1.0) | (lower == 0.0)
+    has_ON_bound = is_exact.copy()
+    table = None
+    pval_cache = {}
+    num_exact = 0
+
+    def get_thresholds():
+        # determine the range of thresholds that the decision depends on
+        if method == 'bonferroni':
+            t = alpha / m
+            return t, t
+        ranks = np.arange(1, m+1)
+        lo = np.sort(np.where(is_exact, lower, lower * (1.0 - tol)))
+        hi = np.sort(np.where(is_exact, upper, upper * (1.0 + tol)))
+        # the true number of rejections R satisfies R_min <= R <= R_max
+        R_max = np.nonzero(lo <= alpha * ranks / m)[0]
+        R_max = R_max[-1] + 1 if R_max.size > 0 else 0
+        R_min = np.nonzero(hi <= alpha * ranks / m)[0]
+        R_min = R_min[-1] + 1 if R_min.size > 0 else 0
+        return alpha * R_min / m, alpha * R_max / m
+
+    while True:
+        t_min, t_max = get_thresholds()
+        # tests whose brackets contain a relevant threshold
+        undecided = (~is_exact) & \
+            (lower * (1.0 - tol) <= t_max) & (upper * (1.0 + tol) > t_min)
+        if not np.any(undecided):
+            break
+
+        # first, try to narrow down the brackets using the O(N)-bound
+        sel = np.nonzero(undecided & ~has_ON_bound)[0]
+        if sel.size > 0:
+            ON_bound = get_xlmhg_ON_bounds(N, lower[sel], stats.K[sel], X, L,
+                                           tol)
+            upper[sel] = np.minimum(upper[sel], ON_bound)
+            has_ON_bound[sel] = True
+            continue
+
+        # then, calculate the exact p-values
+        if table is None:
+            table = _get_batch_table(N, stats.K)
+        for i in np.nonzero(undecided)[0]:
+            # tests with the same K and test statistic (e.g., with identical
+            # indices arrays) have the same p-value
+            key = (int(stats.K[i]), float(stats.stat[i]))
+            if key not in pval_cache:
+                pval_cache[key] = _get_exact_pval(
+                    N, key[0], X, L, lower[i], stats.O1_bound[i], table, tol)
+                num_exact += 1
+            lower[i] = pval_cache[key]
+            upper[i] = pval_cache[key]
+            is_exact[i] = True
+
+    t_min, t_max = get_thresholds()
+    assert t_min == t_max
+    # all tests are either exact or have brackets that don't contain t
+    rejected = np.where(is_exact, upper <= t_max, upper * (1.0 + tol) <= t_max)
+    if t_max == 0:
+        rejected[:] = False
+    logger.debug('Calculated %d of %d exact p-values for the multiple '
+                 'testing correction.', num_exact, m)
+    return RejectionResult(rejected, lower, upper, num_exact)
+
+
+def get_xlmhg_top_k(N, indices, k=50, X=None, L=None, tol=1e-12):
+    """Find the k most significant tests in a batch of XL-mHG tests.
+
+    The XL-mHG test statistic is a lower bound for the p-value. Therefore,
+    exact p-values are calculated in the order of increasing test statistic,
+    and the search stops as soon as the next test statistic is larger than
+    the k-th smallest p-value found so far. Typically, this only requires
+    calculating a small fraction of the exact p-values.
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    indices: list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        For each test, the sorted indices of the "1"s in the ranked list.
+    k: int, optional
+        The number of tests to report. [50]
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `TopKResult`
+        The positions and p-values of the most significant tests.
+    """
+    assert isinstance(k, (int, np.integer))
+
+    X, L = _check_batch_args(N, indices, X, L, tol)
+    if not k >= 0:
+        raise ValueError('Invalid value k=%d; should be >= 0.' % k)
+
+    stats = _get_batch_stats(N, indices, X, L, tol)
+    table = None
+    pval_cache = {}
+    num_exact = 0
+
+    # max-heap (using negated p-values) of the k best tests found so far
+    heap = []
+    for i in np.argsort(stats.stat, kind='mergesort'):
+        if len(heap) == k and \
+                (k == 0 or stats.stat[i] > -heap[0][0] * (1.0 + tol)):
+            # none of the remaining tests can have a smaller p-value
+            break
+        stat = stats.stat[i]
+        if stat == 1.0 or stat == 0.0:
+            pval = stat
+        elif (int(stats.K[i]), stat) in pval_cache:
+            # e.g., a test with an identical indices array
+            pval = pval_cache[(int(stats.K[i]), stat)]
+        else:
+            if table is None:
+                table = _get_batch_table(N, stats.K)
+            pval = _get_exact_pval(N, int(stats.K[i]), X, L, stat,
+                                   stats.O1_bound[i], table, tol)
+            pval_cache[(int(stats.K[i]), stat)] = pval
+            num_exact += 1
+        item = (-pval, -int(i))
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    best = sorted((-neg_pval, -neg_i) for neg_pval, neg_i in heap)
+    index = np.int64([i for _, i in best])
+    pval = np.float64([p for p, _ in best])
+    logger.debug('Calculated %d of %d exact p-values for finding the top %d '
+                 'tests.', num_exact, len(indices), k)
+    return TopKResult(index, pval, num_exact)
+
+
+def get_xlmhg_batch_results(N, indices, X=None, L=None, exact_pval='always',
+                            pval_thresh=None, escore_pval_thresh=None,
+                            use_alg1=False, tol=1e-12):
+    """Perform a batch of XL-mHG tests on lists of the same length.
+
+    Collections of gene sets often contain duplicates, and different gene
+    sets can have identical ``indices`` arrays once they are restricted to
+    the genes in the ranked list. Each distinct ``indices`` array is
+    therefore only tested once (using `get_xlmhg_test_result`), and the
+    result is shared by all tests with that array.
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    indices: list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        For each test, the sorted indices of the "1"s in the ranked list.
+    X, L, exact_pval, pval_thresh, escore_pval_thresh, use_alg1, tol: optional
+        See `get_xlmhg_test_result`.
+
+    Returns
+    -------
+    `BatchResults`
+        The result of each test, and the number of tests performed.
+    """
+    _check_batch_args(N, indices, X, L, tol)
+    unique, inverse = _get_unique_indices(indices)
+    results = [get_xlmhg_test_result(
+        N, ind, X=X, L=L, exact_pval=exact_pval, pval_thresh=pval_thresh,
+        escore_pval_thresh=escore_pval_thresh, use_alg1=use_alg1, tol=tol)
+               for ind in unique]
+    return BatchResults([results[j] for j in inverse], len(unique))
+
+
+class LazyBatchResults(object):
+    """The results of a batch of XL-mHG tests, with exact p-values that are
+    only calculated when they are first requested.
+
+    The test statistics, cutoffs and upper bounds are calculated when the
+    object is created (see `get_xlmhg_lazy_results`). Exact p-values are
+    calculated by `get_pval` (for a single test) or `get_pvals` (for a
+    subset of the tests, optionally in several threads), and memoized. Tests
+    with the same K and test statistic (e.g., with identical ``indices``
+    arrays) share the same p-value, so it is only calculated once.
+
+    Attributes
+    ----------
+    N: int
+        The length of the lists.
+    X: int
+        The ``X`` parameter.
+    L: int
+        The ``L`` parameter.
+    K, stat, cutoff, O1_bound, ON_bound: 1-dim `numpy.ndarray`
+        The number of 1's, test statistic, cutoff, O(1)-bound and
+        O(N)-bound of each test.
+    """
+    def __init__(self, N, indices, X, L, tol):
+        self.N = int(N)
+        self.X = X
+        self.L = L
+        self.tol = tol
+        self.K, self.stat, self.cutoff, self.O1_bound = \
+            _get_batch_stats(N, indices, X, L, tol)
+        if len(indices) > 0:
+            self.ON_bound = get_xlmhg_ON_bounds(N, self.stat, self.K, X, L,
+                                                tol)
+        else:
+            self.ON_bound = np.empty(0, dtype=np.float64)
+        # the exact p-values calculated so far, by K and test statistic
+        self._pvals = {}
+
+    def __repr__(self):
+        return '<%s object (N=%d, X=%d, L=%d, %d tests, %d exact p-values)>' \
+                % (self.__class__.__name__, self.N, self.X, self.L, len(self),
+                   self.num_exact)
+
+    def __len__(self):
+        return self.K.size
+
+    @property
+    def num_exact(self):
+        """The number of (distinct) exact p-values calculated so far."""
+        return len(self._pvals)
+
+    def _get_key(self, i):
+        return int(self.K[i]), float(self.stat[i])
+
+    def _calculate_pvals(self, positions):
+        """Calculate the exact p-values of the tests at ``positions``."""
+        # each thread uses its own table
+        table = _get_batch_table(self.N, self.K[positions])
+        for i in positions:
+            self._pvals[self._get_key(i)] = _get_exact_pval(
+                self.N, int(self.K[i]), self.X, self.L, self.stat[i],
+                self.O1_bound[i], table, self.tol)
+
+    def get_pval(self, i):
+        """Get the exact p-value of the i-th test (calculating it, if
+        necessary)."""
+        key = self._get_key(i)
+        if key not in self._pvals:
+            self._calculate_pvals([i])
+        return self._pvals[key]
+
+    def get_pvals(self, sel=None, num_jobs=1):
+        """Get the exact p-values of a subset of the tests.
+
+        The p-values that have not been calculated yet are distributed
+        across ``num_jobs`` threads (the C extension releases the GIL while
+        calculating p-values).
+
+        Parameters
+        ----------
+        sel: 1-dim `numpy.ndarray` of int or bool, optional
+            The positions of the tests, or a boolean mask. If None, the
+            p-values of all tests are returned. [None]
+        num_jobs: int, optional
+            The number of threads. [1]
+
+        Returns
+        -------
+        1-dim `numpy.ndarray` with ``dtype`` = numpy.float64
+            The exact p-values of the selected tests.
+        """
+        assert isinstance(num_jobs, (int, np.integer))
+        if not num_jobs >= 1:
+            raise ValueError('Invalid value num_jobs=%d; should be >= 1.'
+                             % num_jobs)
+
+        positions = np.arange(len(self))
+        if sel is not None:
+            positions = positions[sel]
+        keys = [self._get_key(i) for i in positions]
+
+        # the first test for each p-value that is missing, sorted by K
+        first = {}
+        for key, i in zip(keys, positions):
+            if key not in self._pvals and key not in first:
+                first[key] = i
+        missing = [first[key] for key in sorted(first)]
+
+        if num_jobs == 1 or len(missing) <= 1:
+            self._calculate_pvals(missing)
+        else:
+            # interleave the keys, so that the threads get similar amounts of
+            # work (the runtime mostly depends on K)
+            with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+                futures = [executor.submit(self._calculate_pvals,
+                                           missing[j::num_jobs])
+                           for j in range(num_jobs)]
+                for f in futures:
+                    f.result()
+        logger.debug('Calculated %d exact p-values for %d tests.',
+                     len(missing), len(keys))
+        return np.float64([self._pvals[key] for key in keys])
+
+
+def get_xlmhg_lazy_results(N, indices, X=None, L=None, tol=1e-12):
+    """Perform a batch of XL-mHG tests, deferring the exact p-values.
+
+    Calculating exact p-values is by far the most expensive step of the
+    XL-mHG test, and often only a fraction of them is needed. This function
+    only calculates the test statistics, cutoffs, and O(1)- and O(N)-bounds,
+    and returns a `LazyBatchResults` object that calculates exact p-values
+    when they are requested.
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    indices: list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        For each test, the sorted indices of the "1"s in the ranked list.
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `LazyBatchResults`
+        The test results.
+    """
+    X, L = _check_batch_args(N, indices, X, L, tol)
+    return LazyBatchResults(N, indices, X, L, tol)
@@ -0,0 +1,115 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Vectorized calculation of upper bounds for XL-mHG p-values."""
+
+import numpy as np
+
+from . import extension
+
+
+def _broadcast_args(stat, K, X, L):
+    """Broadcast the arguments and convert them to contiguous 1-dim arrays.
+    """
+    stat, K, X, L = np.broadcast_arrays(
+        np.asarray(stat, dtype=np.float64), np.asarray(K), np.asarray(X),
+        np.asarray(L))
+
+    for name, arr in [('K', K), ('X', X), ('L', L)]:
+        if not (arr.size == 0 or np.issubdtype(arr.dtype, np.integer)):
+            raise ValueError('Invalid dtype for %s: %s; should be an integer '
+                             'type.' % (name, str(arr.dtype)))
+
+    # copy the arrays, since the arrays returned by `np.broadcast_arrays`
+    # can share memory (and can be read-only)
+    shape = stat.shape
+    args = [np.array(stat.ravel(), dtype=np.float64, copy=True)]
+    args.extend(np.array(arr.ravel(), dtype=np.int32, copy=True)
+                for arr in [K, X, L])
+    return shape, args
+
+
+def get_xlmhg_O1_bounds(stat, K, X, L):
+    """Calculate O(1)-bounds for many XL-mHG p-values at once.
+
+    This is the vectorized version of `get_xlmhg_O1_bound`. All arguments
+    are broadcast against each other (following the NumPy broadcasting
+    rules).
+
+    Parameters
+    ----------
+    stat: float or array-like of float
+        The XL-mHG test statistics.
+    K: int or array-like of int
+        The numbers of 1's in the lists.
+    X: int or array-like of int
+        The XL-mHG ``X`` parameters.
+    L: int or array-like of int
+        The XL-mHG ``L`` parameters.
+
+    Returns
+    -------
+    `numpy.ndarray` with ``dtype=np.float64``
+        The O(1)-bounds, with the broadcast shape of the arguments.
+    """
+    shape, args = _broadcast_args(stat, K, X, L)
+    out = np.empty(args[0].size, dtype=np.float64)
+    extension.mhg_cython.get_xlmhg_O1_bound_array(*args, out)
+    return out.reshape(shape)
+
+
+def get_xlmhg_ON_bounds(N, stat, K, X, L, tol=1e-12):
+    """Calculate O(N)-bounds for many XL-mHG p-values at once.
+
+    All arguments except ``N`` are broadcast against each other (following
+    the NumPy broadcasting rules).
+
+    Parameters
+    ----------
+    N: int
+        The length of the lists.
+    stat: float or array-like of float
+        The XL-mHG test statistics.
+    K: int or array-like of int
+        The numbers of 1's in the lists.
+    X: int or array-like of int
+        The XL-mHG ``X`` parameters.
+    L: int or array-like of int
+        The XL-mHG ``L`` parameters.
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `numpy.ndarray` with ``dtype=np.float64``
+        The O(N)-bounds, with the broadcast shape of the arguments.
+    """
+    assert isinstance(N, (int, np.integer))
+    assert isinstance(tol, (float, np.floating))
+
+    if not (1 <= N <= 65536):
+        raise ValueError(
+            'Invalid value N=%d; should be >= 1 and <= 65536.' % N
+        )
+    if not (0.0 <= tol < 1.0):
+        raise ValueError('Invalid value tol=%.1e; should be in [0,1).' % tol)
+
+    shape, args = _broadcast_args(stat, K, X, L)
+    stat, K, X, L = args
+    if np.any(K < 0) or np.any(K > N):
+        raise ValueError('Invalid values for K; should be >= 0 and <= %d.'
+                         % N)
+    if np.any(X < 0) or np.any(X > N):
+        raise ValueError('Invalid values for X; should be >= 0 and <= %d.'
+                         % N)
+    if np.any(L < 0) or np.any(L > N):
+        raise ValueError('Invalid values for L; should be >= 0 and <= %d.'
+                         % N)
+    if np.any(~((stat >= 0.0) & (stat <= 1.0))):
+        raise ValueError('Invalid values for stat; should be in [0,1].')
+
+    out = np.empty(stat.size, dtype=np.float64)
+    extension.mhg_cython.get_xlmhg_ON_bound_array(
+        int(N), stat, K, X, L, out, float(tol))
+    return out.reshape(shape)
@@ -0,0 +1,304 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Checkpointed (resumable) streaming jobs.
+
+A job tests all gene sets of a GMT file against a collection of ranked lists
+(see `iter_xlmhg_results`). Each chunk of gene sets is a unit of work, whose
+results are written to a separate shard file in the checkpoint directory. A
+manifest records the checksums of the inputs, the test parameters, and the
+shards that have been completed. All files are written to a temporary file
+first, and then atomically renamed, so that an interrupted job never leaves a
+partially written shard or manifest behind.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import socket
+
+import numpy as np
+
+from .stream import read_gmt, iter_chunks, write_results, _run_chunk, \
+    _open_text, _RESULT_HEADER
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+JobSummary = namedtuple('JobSummary',
+                        ['num_chunks', 'num_resumed', 'num_results'])
+JobSummary.__doc__ = """Summary of a checkpointed job.
+
+``num_chunks`` is the total number of chunks (units of work), of which
+``num_resumed`` were completed in an earlier run. ``num_results`` is the
+total number of results (tests) of the job.
+"""
+
+
+def get_file_checksum(path):
+    """Calculate the SHA-256 checksum of a file (reading it in blocks)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _get_rankings_checksum(rankings):
+    """Calculate the checksum of the ranked lists (a file or a list)."""
+    if isinstance(rankings, str):
+        return get_file_checksum(rankings)
+    h = hashlib.sha256()
+    for name, genes in rankings:
+        h.update(('\t'.join([str(name)] + [str(g) for g in genes]) + '\n')
+                 .encode('UTF-8'))
+    return h.hexdigest()
+
+
+def _write_atomic(path, write_func):
+    """Write a file atomically: ``write_func`` writes to a temporary file,
+    which is then renamed to ``path``."""
+    # the temporary file name is unique across hosts and processes
+    tmp_path = '%s.tmp-%s-%d' % (path, socket.gethostname(), os.getpid())
+    with open(tmp_path, 'w', encoding='UTF-8') as f:
+        write_func(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _get_shard_file(chunk_index):
+    return 'shard-%06d.tsv' % chunk_index
+
+
+def _load_manifest(checkpoint_dir, inputs, params):
+    """Load the manifest of a checkpoint directory, if it exists.
+
+    Returns the dictionary of completed shards (whose files are still
+    intact). Raises a `ValueError` if the manifest belongs to a different
+    job (i.e., if the inputs or the parameters differ).
+    """
+    path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return {}
+
+    with open(path, encoding='UTF-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION or \
+            manifest.get('inputs') != inputs or \
+            manifest.get('params') != params:
+        raise ValueError('The checkpoint in "%s" belongs to a different job '
+                         '(the inputs or the parameters have changed). '
+                         'Remove it, or use a different checkpoint '
+                         'directory.' % checkpoint_dir)
+
+    completed = {}
+    for chunk_index, shard in manifest['completed'].items():
+        shard_path = os.path.join(checkpoint_dir, shard['file'])
+        if os.path.isfile(shard_path) and \
+                get_file_checksum(shard_path) == shard['checksum']:
+            completed[int(chunk_index)] = shard
+        else:
+            logger.warning('Shard file "%s" is missing or corrupt; the chunk '
+                           'will be tested again.', shard_path)
+    return completed
+
+
+def _save_manifest(checkpoint_dir, inputs, params, completed):
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'inputs': inputs,
+        'params': params,
+        'completed': dict((str(i), shard)
+                          for i, shard in sorted(completed.items())),
+    }
+    _write_atomic(os.path.join(checkpoint_dir, MANIFEST_FILE),
+                  lambda f: json.dump(manifest, f, indent=1, sort_keys=True))
+
+
+def _save_shard(checkpoint_dir, chunk_index, results):
+    """Write the results of a chunk to a shard file, and return the
+    manifest entry for the shard."""
+    shard_file = _get_shard_file(chunk_index)
+    shard_path = os.path.join(checkpoint_dir, shard_file)
+    _write_atomic(shard_path, lambda f: write_results(results, f))
+    return {
+        'file': shard_file,
+        'checksum': get_file_checksum(shard_path),
+        'num_results': len(results),
+    }
+
+
+def merge_shards(checkpoint_dir, path_or_file):
+    """Merge the shards of a completed checkpointed job into a single results
+    file (see `write_results`).
+
+    Parameters
+    ----------
+    checkpoint_dir: str
+        The checkpoint directory.
+    path_or_file: str or file object
+        The path of the output file, or an open (text) file. Paths ending in
+        ".gz" are compressed on the fly.
+
+    Returns
+    -------
+    int
+        The number of results written.
+    """
+    with open(os.path.join(checkpoint_dir, MANIFEST_FILE),
+              encoding='UTF-8') as f:
+        manifest = json.load(f)
+    shards = sorted((int(i), shard['file'])
+                    for i, shard in manifest['completed'].items())
+    return _merge_result_files(
+        [os.path.join(checkpoint_dir, shard_file) for _, shard_file in shards],
+        path_or_file)
+
+
+def _merge_result_files(paths, path_or_file):
+    """Concatenate results files (see `write_results`), keeping only the
+    header of the first file. Returns the number of results written."""
+    f, close = _open_text(path_or_file, 'w')
+    num_results = 0
+    try:
+        if not paths:
+            f.write(_RESULT_HEADER + '\n')
+        for j, path in enumerate(paths):
+            with open(path, encoding='UTF-8') as shard:
+                header = shard.readline()
+                if j == 0:
+                    f.write(header)
+                for line in shard:
+                    f.write(line)
+                    num_results += 1
+    finally:
+        if close:
+            f.close()
+    return num_results
+
+
+def _merge_atomic(merge_func, output):
+    """Merge results into a file (atomically) or into an open file."""
+    if isinstance(output, str):
+        # keep the file extension (for compression)
+        tmp_path = os.path.join(os.path.dirname(output), '.tmp-%s-%d.%s'
+                                % (socket.gethostname(), os.getpid(),
+                                   os.path.basename(output)))
+        num_results = merge_func(tmp_path)
+        os.replace(tmp_path, output)
+        return num_results
+    return merge_func(output)
+
+
+def run_checkpointed_job(gene_sets, rankings, checkpoint_dir, output=None,
+                         X=None, L=None, exact_pval='always',
+                         pval_thresh=None, stats_only=False, chunk_size=1000,
+                         num_jobs=1, tol=1e-12):
+    """Test all gene sets against all ranked lists, with checkpointing.
+
+    The results of each chunk of gene sets are saved to a shard file in
+    ``checkpoint_dir`` as soon as the chunk is completed, and the chunk is
+    recorded in the manifest. If the job is interrupted, running it again
+    with the same arguments skips all chunks whose shards were completed.
+    The checksums of the input files and the test parameters are stored in
+    the manifest, and a checkpoint is only reused if they are unchanged.
+
+    Parameters
+    ----------
+    gene_sets: str
+        The path of a GMT file (see `read_gmt`).
+    rankings: str or list
+        The path of a file with ranked lists (see `read_ranked_lists`), or a
+        list of (name, genes) tuples.
+    checkpoint_dir: str
+        The checkpoint directory (created if it does not exist).
+    output: str or file object, optional
+        If specified, the shards are merged into this results file when the
+        job is completed (see `merge_shards`). [None]
+    X, L, exact_pval, pval_thresh, stats_only, tol: optional
+        See `iter_xlmhg_results`.
+    chunk_size: int, optional
+        The number of gene sets per chunk (unit of work). [1000]
+    num_jobs: int, optional
+        The number of worker processes. [1]
+
+    Returns
+    -------
+    `JobSummary`
+        The number of chunks, resumed chunks, and results.
+    """
+    assert isinstance(gene_sets, str)
+    assert isinstance(checkpoint_dir, str)
+    assert isinstance(chunk_size, (int, np.integer))
+    assert isinstance(num_jobs, (int, np.integer))
+
+    if not chunk_size >= 1:
+        raise ValueError('Invalid value chunk_size=%d; should be >= 1.'
+                         % chunk_size)
+    if not num_jobs >= 1:
+        raise ValueError('Invalid value num_jobs=%d; should be >= 1.'
+                         % num_jobs)
+
+    inputs = {
+        'gene_sets': get_file_checksum(gene_sets),
+        'rankings': _get_rankings_checksum(rankings),
+    }
+    kwargs = dict(X=X, L=L, exact_pval=exact_pval, pval_thresh=pval_thresh,
+                  stats_only=stats_only, tol=tol)
+    params = {
+        'X': None if X is None else int(X),
+        'L': None if L is None else int(L),
+        'exact_pval': exact_pval,
+        'pval_thresh': None if pval_thresh is None else float(pval_thresh),
+        'stats_only': bool(stats_only),
+        'chunk_size': int(chunk_size),
+        'tol': float(tol),
+    }
+
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    completed = _load_manifest(checkpoint_dir, inputs, params)
+    num_resumed = len(completed)
+    if num_resumed > 0:
+        logger.info('Resuming job from checkpoint (%d chunk(s) completed).',
+                    num_resumed)
+
+    def save(chunk_index, results):
+        completed[chunk_index] = _save_shard(checkpoint_dir, chunk_index,
+                                             results)
+        _save_manifest(checkpoint_dir, inputs, params, completed)
+
+    num_chunks = 0
+    with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+        pending = []
+        for chunk_index, chunk in enumerate(
+                iter_chunks(read_gmt(gene_sets), chunk_size)):
+            num_chunks += 1
+            if chunk_index in completed:
+                continue
+            if num_jobs == 1:
+                save(chunk_index, _run_chunk(chunk, rankings, kwargs))
+                continue
+            pending.append((chunk_index, executor.submit(
+                _run_chunk, chunk, rankings, kwargs)))
+            if len(pending) >= 2 * num_jobs:
+                i, future = pending.pop(0)
+                save(i, future.result())
+        for i, future in pending:
+            save(i, future.result())
+
+    # the manifest is also written for empty jobs
+    _save_manifest(checkpoint_dir, inputs, params, completed)
+    num_results = sum(shard['num_results'] for shard in completed.values())
+
+    if output is not None:
+        _merge_atomic(lambda f: merge_shards(checkpoint_dir, f), output)
+
+    return JobSummary(num_chunks, num_resumed, num_results)
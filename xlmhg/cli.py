@@ -0,0 +1,227 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Command-line interface for testing gene sets against ranked lists.
+
+This module is installed as the ``xlmhg`` console script, and can also be
+run as a script (``python -m xlmhg.cli``).
+"""
+
+import sys
+import os
+import time
+import argparse
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from . import pvalstore
+from .stream import read_gmt, iter_chunks, iter_xlmhg_results, \
+    write_results, _run_chunk
+from .checkpoint import run_checkpointed_job
+from .workqueue import create_work_queue, run_worker, merge_work_queue, \
+    get_work_queue_status
+
+
+def _read_ranked_list(path):
+    """Read a single ranked list (one gene per line, in the first column).
+
+    Empty lines and lines starting with "#" are ignored.
+    """
+    genes = []
+    with open(path, encoding='UTF-8') as f:
+        for line in f:
+            gene = line.rstrip('\r\n').split('\t')[0]
+            if gene and not gene.startswith('#'):
+                genes.append(gene)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return [(name, genes)]
+
+
+def _iter_parallel_results(gene_sets, rankings, num_jobs, chunk_size,
+                           kwargs):
+    """Distribute the chunks of gene sets across worker processes.
+
+    At most ``2 * num_jobs`` chunks are pending at any time, and the results
+    are yielded in order."""
+    with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+        pending = deque()
+        for chunk in iter_chunks(gene_sets, chunk_size):
+            pending.append(executor.submit(_run_chunk, chunk, rankings,
+                                           kwargs))
+            if len(pending) >= 2 * num_jobs:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+
+def _run_queue(args, rankings, kwargs, output, t0):
+    """Create, process, or merge a work queue."""
+    if args.merge:
+        num_tests = merge_work_queue(args.queue_dir, output)
+        if not args.quiet:
+            sys.stderr.write('Merged %d results.\n' % num_tests)
+        return 0
+
+    if args.gmt is not None:
+        create_work_queue(args.gmt, rankings, args.queue_dir,
+                          chunk_size=args.chunk_size, **kwargs)
+    if args.jobs == 1:
+        num_shards = run_worker(args.queue_dir,
+                                lock_timeout=args.lock_timeout)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(run_worker, args.queue_dir,
+                                       lock_timeout=args.lock_timeout)
+                       for _ in range(args.jobs)]
+            num_shards = sum(f.result() for f in futures)
+    seconds = time.perf_counter() - t0
+
+    if not args.quiet:
+        status = get_work_queue_status(args.queue_dir)
+        sys.stderr.write('Processed %d shard(s) in %.2f s. %d of %d shards '
+                         'of the queue are completed.\n'
+                         % (num_shards, seconds, status.num_completed,
+                            status.num_shards))
+    return 0
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog='xlmhg',
+        description='Test gene sets (from a GMT file) for enrichment at the '
+                    'top of one or more ranked lists, using the XL-mHG test.')
+    parser.add_argument('-g', '--gmt',
+                        help='The gene sets, in GMT format.')
+    ranked = parser.add_mutually_exclusive_group()
+    ranked.add_argument('-r', '--ranked-list',
+                        help='A ranked list, with one gene per line.')
+    ranked.add_argument('-m', '--rankings',
+                        help='Several ranked lists, one per line (the name '
+                             'of the list, followed by the genes in order of '
+                             'their rank, separated by tabs).')
+    parser.add_argument('-o', '--output', default='-',
+                        help='The output file (tab-separated; "-" for '
+                             'stdout). [-]')
+    parser.add_argument('-X', type=int, default=None)
+    parser.add_argument('-L', type=int, default=None)
+    parser.add_argument('-p', '--pval-thresh', type=float, default=None)
+    parser.add_argument('--exact-pval', default='always',
+                        choices=['always', 'if_significant', 'if_necessary',
+                                 'approx'])
+    parser.add_argument('--stats-only', action='store_true',
+                        help='Only calculate the test statistics, and report '
+                             'the O(1)-bound instead of the p-value.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='The number of worker processes. [1]')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='The number of gene sets per chunk. [1000]')
+    parser.add_argument('--checkpoint-dir',
+                        help='Save the results of each chunk in this '
+                             'directory, so that an interrupted run can be '
+                             'resumed by running the same command again.')
+    parser.add_argument('--queue-dir',
+                        help='Use a work queue in this directory (on a '
+                             'shared filesystem), so that several workers '
+                             'can process the job. If --gmt is given, the '
+                             'queue is created first (unless it exists). '
+                             'Each worker processes shards until none are '
+                             'left.')
+    parser.add_argument('--lock-timeout', type=float, default=None,
+                        help='Claim shards of a work queue again if they '
+                             'were claimed more than this many seconds ago '
+                             'without being completed.')
+    parser.add_argument('--merge', action='store_true',
+                        help='Merge the results of a completed work queue '
+                             '(instead of processing shards).')
+    parser.add_argument('--pval-store',
+                        help='Store exact p-values in this cache directory, '
+                             'and reuse them in later runs.')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not report throughput statistics.')
+    return parser
+
+
+def main(args=None):
+    """Run XL-mHG tests from the command line."""
+    parser = _get_parser()
+    args = parser.parse_args(args)
+    if args.jobs < 1:
+        parser.error('invalid value --jobs=%d; should be >= 1' % args.jobs)
+    if args.chunk_size < 1:
+        parser.error('invalid value --chunk-size=%d; should be >= 1'
+                     % args.chunk_size)
+
+    if args.gmt is None and args.queue_dir is None:
+        parser.error('the following argument is required: -g/--gmt')
+    if args.gmt is not None and \
+            args.ranked_list is None and args.rankings is None:
+        parser.error('one of the arguments -r/--ranked-list -m/--rankings '
+                     'is required')
+    if args.merge and args.queue_dir is None:
+        parser.error('--merge requires --queue-dir')
+    if args.exact_pval in ['if_significant', 'if_necessary'] and \
+            args.pval_thresh is None:
+        parser.error('--exact-pval %s requires -p/--pval-thresh'
+                     % args.exact_pval)
+
+    if args.pval_store is not None:
+        # worker processes that do not inherit the store open it as well
+        os.environ[pvalstore.STORE_ENV_VAR] = args.pval_store
+        pvalstore.use_pval_store(args.pval_store)
+
+    if args.ranked_list is not None:
+        rankings = _read_ranked_list(args.ranked_list)
+    else:
+        rankings = args.rankings
+    kwargs = dict(X=args.X, L=args.L, exact_pval=args.exact_pval,
+                  pval_thresh=args.pval_thresh, stats_only=args.stats_only)
+
+    t0 = time.perf_counter()
+    output = sys.stdout if args.output == '-' else args.output
+    if args.queue_dir is not None:
+        return _run_queue(args, rankings, kwargs, output, t0)
+
+    if args.checkpoint_dir is not None:
+        summary = run_checkpointed_job(
+            args.gmt, rankings, args.checkpoint_dir, output=output,
+            chunk_size=args.chunk_size, num_jobs=args.jobs, **kwargs)
+        seconds = time.perf_counter() - t0
+        if not args.quiet:
+            sys.stderr.write('Completed %d chunks (%d resumed from the '
+                             'checkpoint) with %d tests in %.2f s.\n'
+                             % (summary.num_chunks, summary.num_resumed,
+                                summary.num_results, seconds))
+        return 0
+
+    if args.jobs == 1:
+        results = iter_xlmhg_results(args.gmt, rankings,
+                                     chunk_size=args.chunk_size, **kwargs)
+    else:
+        results = _iter_parallel_results(read_gmt(args.gmt), rankings,
+                                         args.jobs, args.chunk_size, kwargs)
+
+    tiers = Counter()
+
+    def count_tiers(results):
+        for r in results:
+            tiers[r.tier] += 1
+            yield r
+
+    num_tests = write_results(count_tiers(results), output)
+    seconds = time.perf_counter() - t0
+
+    if not args.quiet:
+        sys.stderr.write('Performed %d tests in %.2f s (%.1f tests/s).\n'
+                         % (num_tests, seconds,
+                            num_tests / max(seconds, 1e-9)))
+        for tier, count in sorted(tiers.items()):
+            sys.stderr.write('  %-12s %8d (%.1f%%)\n'
+                             % (tier, count, 100.0 * count / num_tests))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
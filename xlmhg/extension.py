@@ -0,0 +1,86 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Selection of the XL-mHG C extension.
+
+By default, the optimized `mhg_cython` extension is used. If the environment
+variable ``XLMHG_TRACE`` is set to "1", or after calling
+`use_traced_extension`, the `mhg_cython_trace` extension is used instead,
+which is compiled with profiling and line tracing enabled. The traced
+extension is only built if the environment variable ``XLMHG_BUILD_TRACE`` is
+set to "1" when the package is installed.
+
+Modules that call the kernels should access them via the `mhg_cython`
+attribute of this module (i.e., ``extension.mhg_cython.get_xlmhg_stat(...)``),
+so that switching the extension takes effect immediately.
+"""
+
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV_VAR = 'XLMHG_TRACE'
+
+
+def _import_extension(traced=False):
+    if traced:
+        from . import mhg_cython_trace as ext
+    else:
+        try:
+            # This is a duct-tape fix for the Google App Engine, on which
+            # importing the C extension fails.
+            from . import mhg_cython as ext
+        except ImportError:
+            print('Warning (xlmhg): Failed to import the "mhg_cython" C '
+                  'extension. Falling back to the pure Python '
+                  'implementation, which is very slow.', file=sys.stderr)
+            from . import mhg as ext
+    return ext
+
+
+def use_traced_extension(traced=True):
+    """Select the traced (or the optimized) version of the C extension.
+
+    The traced version is compiled with Cython's ``profile`` and
+    ``linetrace`` directives, so that cProfile and line_profiler can be used
+    to analyze the kernels. It is considerably slower than the optimized
+    version.
+
+    Parameters
+    ----------
+    traced: bool, optional
+        Whether to use the traced version. [True]
+
+    Returns
+    -------
+    module
+        The selected extension module.
+
+    Raises
+    ------
+    ImportError
+        If the traced extension is not available (i.e., if the package was
+        installed without setting ``XLMHG_BUILD_TRACE`` to "1").
+    """
+    global mhg_cython
+    mhg_cython = _import_extension(traced)
+    return mhg_cython
+
+
+def is_traced():
+    """Returns whether the traced version of the C extension is in use."""
+    return mhg_cython.__name__.endswith('mhg_cython_trace')
+
+
+if os.environ.get(TRACE_ENV_VAR, '0') == '1':
+    try:
+        mhg_cython = _import_extension(traced=True)
+    except ImportError:
+        logger.warning('The traced C extension is not available. Using the '
+                       'optimized C extension instead.')
+        mhg_cython = _import_extension(traced=False)
+else:
+    mhg_cython = _import_extension(traced=False)
@@ -0,0 +1,205 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Mapping of named gene sets onto ranked lists."""
+
+import logging
+
+import numpy as np
+
+from .packed import pack_gene_sets
+
+logger = logging.getLogger(__name__)
+
+
+def _get_id_kind(dtype):
+    """Determine the kind of gene identifiers (identifiers of different
+    kinds cannot be compared)."""
+    if np.issubdtype(dtype, np.number) or np.issubdtype(dtype, np.bool_):
+        return 'number'
+    return dtype.kind
+
+
+class GeneSetIndex(object):
+    """An index of gene sets over a universe of gene identifiers.
+
+    The index is built once for a collection of gene sets. It stores the
+    sorted array of all gene identifiers (the universe), and the members of
+    each gene set as positions in that array, in compressed sparse row (CSR)
+    layout. Given a ranking of gene identifiers, the indices of the members
+    of all gene sets in the ranked list can then be determined with a few
+    vectorized operations (`numpy.searchsorted` and a single sort), instead
+    of looking up every gene of every gene set in a dictionary.
+
+    Parameters
+    ----------
+    gene_sets: dict or list
+        The gene sets, either as a dictionary mapping gene set names to
+        lists of gene identifiers, or as a list of lists of gene identifiers.
+        Gene identifiers can be strings or integers.
+    names: list of str, optional
+        The names of the gene sets (only if ``gene_sets`` is a list). If
+        None, the gene sets are named by their position. [None]
+
+    Attributes
+    ----------
+    names: list
+        The names of the gene sets.
+    genes: 1-dim `numpy.ndarray`
+        The sorted identifiers of all genes contained in any gene set.
+    indptr: 1-dim `numpy.ndarray` with ``dtype`` = numpy.int64
+        The members of the i-th gene set are stored in
+        ``members[indptr[i]:indptr[i+1]]``.
+    members: 1-dim `numpy.ndarray` with ``dtype`` = numpy.int64
+        The (sorted) positions of the members of each gene set in ``genes``.
+    """
+    def __init__(self, gene_sets, names=None):
+        if isinstance(gene_sets, dict):
+            assert names is None
+            names = list(gene_sets.keys())
+            gene_sets = [gene_sets[n] for n in names]
+        assert isinstance(gene_sets, (list, tuple))
+        if names is None:
+            names = list(range(len(gene_sets)))
+        assert isinstance(names, (list, tuple))
+
+        if len(names) != len(gene_sets):
+            raise ValueError('The number of names (%d) does not match the '
+                             'number of gene sets (%d).'
+                             % (len(names), len(gene_sets)))
+
+        sizes = np.int64([len(genes) for genes in gene_sets])
+        if sizes.sum() > 0:
+            all_genes = np.concatenate([np.asarray(genes)
+                                        for genes in gene_sets
+                                        if len(genes) > 0])
+        else:
+            all_genes = np.empty(0, dtype=np.str_)
+        self.genes, pos = np.unique(all_genes, return_inverse=True)
+
+        # sort the members of each gene set and remove duplicates
+        set_id = np.repeat(np.arange(len(gene_sets), dtype=np.int64), sizes)
+        key = np.unique(set_id * self.genes.size + pos.ravel())
+        self.members = key % max(self.genes.size, 1)
+        counts = np.bincount(key // max(self.genes.size, 1),
+                             minlength=len(gene_sets))
+        self.indptr = np.zeros(len(gene_sets) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+        self.names = list(names)
+
+    def __repr__(self):
+        return '<%s object (%d gene sets, %d genes)>' \
+                % (self.__class__.__name__, len(self), self.genes.size)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_gene_indices(self, identifiers):
+        """Look up the positions of gene identifiers in ``genes``.
+
+        Parameters
+        ----------
+        identifiers: list or 1-dim `numpy.ndarray`
+            The gene identifiers.
+
+        Returns
+        -------
+        1-dim `numpy.ndarray` with ``dtype`` = numpy.int64
+            The position of each gene in ``genes``, or -1 for genes that are
+            not contained in any gene set.
+
+        Raises
+        ------
+        ValueError
+            If the identifiers cannot be compared to those in ``genes``
+            (e.g., integer identifiers in the gene sets and string
+            identifiers in the ranking).
+        """
+        identifiers = np.asarray(identifiers)
+        assert identifiers.ndim == 1
+        if self.genes.size == 0 or identifiers.size == 0:
+            return np.full(identifiers.size, -1, dtype=np.int64)
+        if _get_id_kind(identifiers.dtype) != _get_id_kind(self.genes.dtype):
+            raise ValueError('The gene identifiers (dtype=%s) are of a '
+                             'different type than those in the gene sets '
+                             '(dtype=%s).'
+                             % (identifiers.dtype, self.genes.dtype))
+        pos = np.searchsorted(self.genes, identifiers)
+        pos[pos == self.genes.size] = 0
+        pos[self.genes[pos] != identifiers] = -1
+        return pos.astype(np.int64)
+
+    def get_ranked_csr(self, ranking):
+        """Determine the indices of the members of all gene sets in a ranked
+        list.
+
+        Members of a gene set that are missing from the ranking (i.e., from
+        the background) are ignored, so each gene set is restricted to the
+        ranked genes.
+
+        Parameters
+        ----------
+        ranking: list or 1-dim `numpy.ndarray`
+            The gene identifiers, in order of their rank. (Let N denote the
+            length of the ranking.)
+
+        Returns
+        -------
+        indptr: 1-dim `numpy.ndarray` with ``dtype`` = numpy.int64
+            The indices for the i-th gene set are stored in
+            ``indices[indptr[i]:indptr[i+1]]``.
+        indices: 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+            The sorted indices of the "1"s in the ranked list of each gene
+            set.
+        """
+        ranking = np.asarray(ranking)
+        N = ranking.size
+        if N > 65536:
+            raise ValueError('Length of list cannot exceed 65536.')
+        if np.unique(ranking).size < N:
+            raise ValueError('The ranking contains duplicate genes.')
+
+        pos = self.get_gene_indices(ranking)
+        found = np.nonzero(pos >= 0)[0]
+        rank = np.full(self.genes.size, -1, dtype=np.int64)
+        rank[pos[found]] = found
+        if found.size < N:
+            logger.debug('%d of %d ranked genes are not contained in any '
+                         'gene set.', N - found.size, N)
+
+        # the ranks of all members of all gene sets, sorted first by gene set
+        # and then by rank
+        set_id = np.repeat(np.arange(len(self), dtype=np.int64),
+                           np.diff(self.indptr))
+        member_rank = rank[self.members]
+        sel = member_rank >= 0
+        key = np.sort(set_id[sel] * max(N, 1) + member_rank[sel])
+
+        indices = np.uint16(key % max(N, 1))
+        counts = np.bincount(key // max(N, 1), minlength=len(self))
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, indices
+
+    def get_ranked_indices(self, ranking):
+        """Determine the indices of the members of all gene sets in a ranked
+        list, in the format used by the batch functions (e.g.,
+        `get_xlmhg_batch_stats`).
+
+        Returns
+        -------
+        list of 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+            For each gene set, the sorted indices of the "1"s in the ranked
+            list. The arrays are views of the ``indices`` array returned by
+            `get_ranked_csr`.
+        """
+        indptr, indices = self.get_ranked_csr(ranking)
+        return [indices[indptr[i]:indptr[i+1]] for i in range(len(self))]
+
+    def get_packed(self):
+        """Create a bit-packed membership matrix for the gene sets (see
+        `pack_gene_sets`), with one column per gene in ``genes``."""
+        return pack_gene_sets(
+            [self.members[self.indptr[i]:self.indptr[i+1]]
+             for i in range(len(self))], self.genes.size)
@@ -0,0 +1,72 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Vectorized calculation of hypergeometric p-values."""
+
+import numpy as np
+
+from . import extension
+
+
+def get_hypergeometric_pvals(k, N, K, n, log=False):
+    """Calculate hypergeometric p-values (upper tail probabilities).
+
+    Calculates P(X >= k), for X ~ Hypergeom(N, K, n), i.e., the probability
+    of observing at least ``k`` 1's among the first ``n`` elements of a
+    randomly ordered list of length ``N`` containing ``K`` 1's. This is the
+    p-value of a one-sided hypergeometric test for enrichment at a fixed
+    cutoff ``n``, and the quantity that the XL-mHG test statistic is based
+    on.
+
+    All arguments are broadcast against each other (following the NumPy
+    broadcasting rules). The calculations are performed in extended
+    (long double) precision, using the same recurrence relations as the
+    XL-mHG kernels.
+
+    Parameters
+    ----------
+    k: int or array-like of int
+        The observed numbers of 1's above the cutoff.
+    N: int or array-like of int
+        The lengths of the lists.
+    K: int or array-like of int
+        The numbers of 1's in the lists.
+    n: int or array-like of int
+        The cutoffs.
+    log: bool, optional
+        Whether to return the natural logarithm of the p-values. This allows
+        reporting p-values that are smaller than the smallest positive double
+        precision number. [False]
+
+    Returns
+    -------
+    `numpy.ndarray` with ``dtype=np.float64``
+        The (log-transformed) p-values, with the broadcast shape of the
+        arguments.
+    """
+    assert isinstance(log, (bool, np.bool_))
+
+    arrs = np.broadcast_arrays(
+        np.asarray(k), np.asarray(N), np.asarray(K), np.asarray(n))
+    for name, arr in zip(['k', 'N', 'K', 'n'], arrs):
+        if not (arr.size == 0 or np.issubdtype(arr.dtype, np.integer)):
+            raise ValueError('Invalid dtype for %s: %s; should be an integer '
+                             'type.' % (name, str(arr.dtype)))
+
+    # copy the arrays, since the arrays returned by `np.broadcast_arrays`
+    # can share memory (and can be read-only)
+    shape = arrs[0].shape
+    k, N, K, n = [np.array(arr.ravel(), dtype=np.int32, copy=True)
+                  for arr in arrs]
+
+    if np.any(N < 0):
+        raise ValueError('Invalid values for N; should be >= 0.')
+    if np.any((K < 0) | (K > N)):
+        raise ValueError('Invalid values for K; should be >= 0 and <= N.')
+    if np.any((n < 0) | (n > N)):
+        raise ValueError('Invalid values for n; should be >= 0 and <= N.')
+
+    out = np.empty(k.size, dtype=np.float64)
+    extension.mhg_cython.get_hg_pval_array(k, N, K, n, out, bool(log))
+    return out.reshape(shape)
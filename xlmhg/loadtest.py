@@ -0,0 +1,213 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""End-to-end throughput and scaling tests for the XL-mHG API.
+
+This module can be run as a script (``python -m xlmhg.loadtest``).
+"""
+
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .test import get_xlmhg_test_result
+from .workload import get_synthetic_workload
+
+logger = logging.getLogger(__name__)
+
+DECISION_TIERS = ['trivial', 'stat', 'O1_bound', 'ON_bound', 'exact',
+                  'O1_fallback', 'approx']
+
+
+# maps the tier reported by `get_xlmhg_test_result` to the step of the test
+# that determined the p-value
+_TIER_STEPS = {
+    'trivial': 'trivial',
+    'stat': 'stat',
+    'O1_bound': 'O1_bound',
+    'ON_bound': 'ON_bound',
+    'pval1': 'exact',
+    'pval2': 'exact',
+    'O1_fallback': 'O1_fallback',
+    'approx': 'approx',
+}
+
+
+def _run_tests(N, indices, X, L, exact_pval, pval_thresh, tol):
+    """Worker function: Run a chunk of tests and time each of them."""
+    latencies = np.empty(len(indices), dtype=np.float64)
+    tiers = dict([tier, 0] for tier in DECISION_TIERS)
+    # allocate one dynamic programming table for the whole chunk
+    # (PVAL2 only uses the first column)
+    max_K = max([ind.size for ind in indices] + [0])
+    table = np.empty((max_K+1, 1), dtype=np.longdouble)
+    for i, ind in enumerate(indices):
+        t0 = time.perf_counter()
+        result = get_xlmhg_test_result(
+            N, ind, X=X, L=L, exact_pval=exact_pval, pval_thresh=pval_thresh,
+            table=table, tol=tol)
+        latencies[i] = time.perf_counter() - t0
+        tiers[_TIER_STEPS[result.tier]] += 1
+    return latencies, tiers
+
+
+def run_load_test(workload, num_workers=1, X=None, L=None,
+                  exact_pval='if_necessary', pval_thresh=0.05,
+                  chunk_size=50, tol=1e-12):
+    """Run all tests of a workload using a pool of worker processes.
+
+    Parameters
+    ----------
+    workload: `SyntheticWorkload`
+        The workload (see `get_synthetic_workload`).
+    num_workers: int, optional
+        The number of worker processes. [1]
+    X: int, optional
+        The XL-mHG ``X`` parameter. [None]
+    L: int, optional
+        The XL-mHG ``L`` parameter. [None]
+    exact_pval: str, optional
+        See `get_xlmhg_test_result`. ['if_necessary']
+    pval_thresh: float, optional
+        See `get_xlmhg_test_result`. [0.05]
+    chunk_size: int, optional
+        The number of tests sent to a worker at a time. [50]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    dict
+        The throughput statistics (number of workers and tests, total wall
+        time, tests per second, median and 99th percentile latency per test,
+        and the share of tests decided by each step of the test; see
+        `DECISION_TIERS`).
+    """
+    assert isinstance(num_workers, (int, np.integer))
+    assert isinstance(chunk_size, (int, np.integer))
+
+    if not num_workers >= 1:
+        raise ValueError('Invalid value num_workers=%d; should be >= 1.'
+                         % num_workers)
+    if not chunk_size >= 1:
+        raise ValueError('Invalid value chunk_size=%d; should be >= 1.'
+                         % chunk_size)
+
+    N = workload.N
+    indices = workload.indices
+    chunks = [indices[i:(i+chunk_size)]
+              for i in range(0, len(indices), chunk_size)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_run_tests, N, chunk, X, L, exact_pval,
+                                   pval_thresh, tol)
+                   for chunk in chunks]
+        chunk_results = [f.result() for f in futures]
+    seconds = time.perf_counter() - t0
+
+    num_tests = len(indices)
+    latencies = np.concatenate([np.empty(0)] + [r[0] for r in chunk_results])
+    tiers = dict([tier, 0] for tier in DECISION_TIERS)
+    for r in chunk_results:
+        for tier, count in r[1].items():
+            tiers[tier] += count
+
+    stats = {
+        'workers': num_workers,
+        'tests': num_tests,
+        'seconds': seconds,
+        'tests_per_sec': num_tests / seconds,
+        'p50_latency': float(np.percentile(latencies, 50))
+                       if num_tests > 0 else float('nan'),
+        'p99_latency': float(np.percentile(latencies, 99))
+                       if num_tests > 0 else float('nan'),
+    }
+    for tier in DECISION_TIERS:
+        stats['frac_' + tier] = tiers[tier] / float(max(num_tests, 1))
+    return stats
+
+
+def run_scaling_test(workload, max_workers=None, **kwargs):
+    """Run a load test with 1, 2, 4, ... up to ``max_workers`` workers.
+
+    Additional keyword arguments are passed on to `run_load_test`.
+
+    Returns
+    -------
+    list of dict
+        The results of `run_load_test` for each number of workers.
+    """
+    if max_workers is None:
+        from os import cpu_count
+        max_workers = cpu_count() or 1
+
+    worker_counts = []
+    w = 1
+    while w < max_workers:
+        worker_counts.append(w)
+        w *= 2
+    worker_counts.append(max_workers)
+
+    results = []
+    for num_workers in worker_counts:
+        stats = run_load_test(workload, num_workers=num_workers, **kwargs)
+        logger.info('%d worker(s): %.1f tests/s, p99 latency %.2f ms',
+                    num_workers, stats['tests_per_sec'],
+                    1000 * stats['p99_latency'])
+        results.append(stats)
+    return results
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        description='Measure the throughput of XL-mHG tests on a synthetic '
+                    'workload.')
+    parser.add_argument('-N', '--list-length', type=int, default=10000)
+    parser.add_argument('-n', '--num-sets', type=int, default=1000)
+    parser.add_argument('-e', '--frac-enriched', type=float, default=0.1)
+    parser.add_argument('-w', '--max-workers', type=int, default=None)
+    parser.add_argument('-X', type=int, default=None)
+    parser.add_argument('-L', type=int, default=None)
+    parser.add_argument('-p', '--pval-thresh', type=float, default=0.05)
+    parser.add_argument('--exact-pval', default='if_necessary',
+                        choices=['always', 'if_significant', 'if_necessary',
+                                 'approx'])
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def main(args=None):
+    """Run a scaling test from the command line."""
+    args = _get_parser().parse_args(args)
+
+    workload = get_synthetic_workload(
+        N=args.list_length, num_sets=args.num_sets,
+        frac_enriched=args.frac_enriched, seed=args.seed)
+    results = run_scaling_test(
+        workload, max_workers=args.max_workers, X=args.X, L=args.L,
+        exact_pval=args.exact_pval, pval_thresh=args.pval_thresh,
+        chunk_size=args.chunk_size)
+
+    print('workers   tests/s   p50 (ms)   p99 (ms)   trivial     stat   '
+          'O(1)-bound   O(N)-bound    exact   fallback   approx')
+    for stats in results:
+        print('%7d %9.1f %10.3f %10.3f %8.1f%% %7.1f%% %11.1f%% %11.1f%% '
+              '%7.1f%% %9.1f%% %7.1f%%'
+              % (stats['workers'], stats['tests_per_sec'],
+                 1000 * stats['p50_latency'], 1000 * stats['p99_latency'],
+                 100 * stats['frac_trivial'], 100 * stats['frac_stat'],
+                 100 * stats['frac_O1_bound'], 100 * stats['frac_ON_bound'],
+                 100 * stats['frac_exact'], 100 * stats['frac_O1_fallback'],
+                 100 * stats['frac_approx']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
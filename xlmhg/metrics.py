@@ -0,0 +1,140 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Process-wide counters and histograms for monitoring XL-mHG tests.
+
+The registry is disabled by default, unless the environment variable
+``XLMHG_METRICS`` is set to "1". When it is disabled, the test functions only
+check the `MetricsRegistry.enabled` attribute and do not record anything.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+
+# upper bounds (in seconds) of the buckets of the runtime histogram
+DEFAULT_TIME_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+
+# upper bounds of the buckets of the histogram of DP cells visited
+DEFAULT_CELL_BUCKETS = (0, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+class Histogram(object):
+    """A histogram with fixed bucket boundaries.
+
+    Parameters
+    ----------
+    buckets: tuple of float
+        The (inclusive) upper bounds of the buckets, in increasing order.
+        Values larger than the last bound are counted in an additional
+        overflow bucket.
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        return {
+            'buckets': list(self.buckets),
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class MetricsRegistry(object):
+    """A thread-safe registry of counters and histograms.
+
+    Parameters
+    ----------
+    enabled: bool, optional
+        Whether the registry records anything. [False]
+
+    Attributes
+    ----------
+    enabled: bool
+        Whether the registry records anything. Callers should check this
+        attribute before calling any of the recording methods.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def enable(self):
+        """Start recording."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording (recorded values are kept)."""
+        self.enabled = False
+
+    def increment(self, name, value=1):
+        """Increment a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_TIME_BUCKETS):
+        """Record a value in a histogram.
+
+        The bucket boundaries are only used when the histogram is created.
+        """
+        with self._lock:
+            try:
+                hist = self._histograms[name]
+            except KeyError:
+                hist = Histogram(buckets)
+                self._histograms[name] = hist
+            hist.observe(value)
+
+    def record_test(self, tier, dp_cells, seconds):
+        """Record the decision tier, DP cells visited and runtime of a test.
+        """
+        with self._lock:
+            counters = self._counters
+            counters['tests'] = counters.get('tests', 0) + 1
+            name = 'tier.' + tier
+            counters[name] = counters.get(name, 0) + 1
+            counters['dp_cells'] = counters.get('dp_cells', 0) + dp_cells
+        self.observe('test_time', seconds, DEFAULT_TIME_BUCKETS)
+        self.observe('tier_time.' + tier, seconds, DEFAULT_TIME_BUCKETS)
+        self.observe('test_dp_cells', dp_cells, DEFAULT_CELL_BUCKETS)
+
+    def snapshot(self):
+        """Return a copy of all counters and histograms.
+
+        Returns
+        -------
+        dict
+            A dictionary with keys "counters" (a dictionary mapping counter
+            names to values) and "histograms" (a dictionary mapping histogram
+            names to dictionaries with keys "buckets", "counts", "count", and
+            "sum").
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': dict(
+                    [name, hist.to_dict()]
+                    for name, hist in self._histograms.items()),
+            }
+
+    def reset(self):
+        """Remove all counters and histograms."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+
+registry = MetricsRegistry(
+    enabled=(os.environ.get('XLMHG_METRICS', '0') == '1'))
+"""The process-wide registry used by the XL-mHG test functions."""
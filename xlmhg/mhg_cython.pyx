@@ -13,11 +13,19 @@ DEF DEFAULT_TOL = 1e-12
 #     double DBL_MIN
 
 cdef extern from "math.h":
-    long double ABS "fabsl" (long double x)
+    long double ABS "fabsl" (long double x) nogil
+    long double LOG "logl" (long double x) nogil
+    long double LOG1P "log1pl" (long double x) nogil
+    long double EXP "expl" (long double x) nogil
+    long double LGAMMA "lgammal" (long double x) nogil
     # long double NAN "nanl" (const char* tagp)
     # double NAN
 
 cimport cython
+from libc.math cimport NAN, INFINITY, erfc, exp, log, sqrt
+from libc.stdint cimport uint64_t
+from libc.string cimport memcpy
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
 
 import numpy as np
 cimport numpy as np
@@ -31,7 +39,33 @@ def get_default_tol():
     return float(DEFAULT_TOL)
 
 
-cdef inline int is_equal(long double a, long double b, long double tol):
+# the element types of dense (0/1) vectors and of indices arrays
+ctypedef fused dense_t:
+    unsigned char
+    signed char
+    unsigned short
+    short
+    unsigned int
+    int
+    unsigned long
+    long
+    unsigned long long
+    long long
+
+
+# the element types of the PVAL2 table
+ctypedef fused pval2_t:
+    double
+    long double
+
+# In double precision, PVAL2 table entries below MIN_DOUBLE_ENTRY are set to
+# zero (arithmetic with subnormal numbers is very slow), so p-values below
+# MIN_DOUBLE_PVAL are not reported (see `get_xlmhg_pval2_double`).
+DEF MIN_DOUBLE_ENTRY = 1e-280
+DEF MIN_DOUBLE_PVAL = 1e-250
+
+
+cdef inline int is_equal(long double a, long double b, long double tol) nogil:
     # tests equality of two floating point numbers
     # (of type long doube => 80-bit extended precision)
     if a == b or (ABS(a-b) <= tol * max(ABS(a), ABS(b))):
@@ -40,7 +74,7 @@ cdef inline int is_equal(long double a, long double b, long double tol):
         return 0
 
 
-cdef long double get_hgp(long double p, int k, int N, int K, int n):
+cdef long double get_hgp(long double p, int k, int N, int K, int n) nogil:
     # calculates hypergeometric p-value when f(k | N,K,n) is already known
     cdef long double pval = p
     while k < min(K, n):
@@ -51,12 +85,85 @@ cdef long double get_hgp(long double p, int k, int N, int K, int n):
     return pval
 
 
+cdef long double _get_log_hg_pmf(int k, int N, int K, int n) nogil:
+    # calculates log f(k; N,K,n)
+    return LGAMMA(K+1) - LGAMMA(k+1) - LGAMMA(K-k+1) + \
+        LGAMMA(N-K+1) - LGAMMA(n-k+1) - LGAMMA(N-K-n+k+1) - \
+        LGAMMA(N+1) + LGAMMA(n+1) + LGAMMA(N-n+1)
+
+
+cdef long double _get_log_hg_pval(int k, int N, int K, int n) nogil:
+    # calculates log P(X >= k) for X ~ Hypergeom(N,K,n)
+    cdef int k_max = min(K, n)
+    cdef int mode, j
+    cdef long double p, s
+
+    if k <= 0 or k <= n-(N-K):
+        # k is at or below the lower end of the support
+        return 0.0
+    elif k > k_max:
+        return -INFINITY
+
+    mode = <int>((<long double>(n+1) * <long double>(K+1)) /
+                 <long double>(N+2))
+    p = 1.0
+    s = 1.0
+    if k > mode:
+        # sum up the (decreasing) terms of the upper tail, relative to
+        # f(k; N,K,n) (this is the same recurrence as in `get_hgp`)
+        j = k
+        while j < k_max:
+            p *= (<long double>(n-j) * <long double>(K-j)) / \
+                 (<long double>(j+1) * <long double>(N-K-n+j+1))
+            s += p
+            j += 1
+        return _get_log_hg_pmf(k, N, K, n) + LOG(s)
+    else:
+        # sum up the (decreasing) terms of the lower tail, relative to
+        # f(k-1; N,K,n), and use P(X >= k) = 1 - P(X <= k-1)
+        # (this is the same recurrence as in `get_xlmhg_ON_bound`)
+        j = k-1
+        while j > 0 and j > n-(N-K):
+            p *= (<long double>j * <long double>(N-K-n+j)) / \
+                 (<long double>(n-j+1) * <long double>(K-j+1))
+            s += p
+            j -= 1
+        return LOG1P(-EXP(_get_log_hg_pmf(k-1, N, K, n) + LOG(s)))
+
+
+def get_hg_pval_array(const int[::1] k, const int[::1] N, const int[::1] K,
+                      const int[::1] n, double[::1] out, bint log=False):
+    """Calculate hypergeometric p-values for arrays of parameters (see
+    `xlmhg.get_hypergeometric_pvals`)."""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t size = k.shape[0]
+    with nogil:
+        if log:
+            for i in range(size):
+                out[i] = <double>_get_log_hg_pval(k[i], N[i], K[i], n[i])
+        else:
+            for i in range(size):
+                out[i] = <double>EXP(
+                    _get_log_hg_pval(k[i], N[i], K[i], n[i]))
+
+
 def get_xlmhg_stat(unsigned short[::1] indices, int N, int K, int X, int L,
                    long double tol=DEFAULT_TOL):
     """Calculates the XL-mHG test statistic."""
+    cdef long double stat = 1.0
+    cdef int cutoff = 0
+    _get_xlmhg_stat[cython.ushort](indices, N, K, X, L, tol, &stat, &cutoff)
+    return stat, cutoff
+
+
+cdef void _get_xlmhg_stat(const dense_t[:] indices, int N, int K, int X,
+                          int L, long double tol,
+                          long double* stat_ptr, int* cutoff_ptr) nogil:
     # special cases
     if K == 0 or K == N or K < X:
-        return 1.0, 0
+        stat_ptr[0] = 1.0
+        cutoff_ptr[0] = 0
+        return
 
     cdef long double hgp
     cdef int cutoff = 0
@@ -85,12 +192,313 @@ def get_xlmhg_stat(unsigned short[::1] indices, int N, int K, int X, int L,
                 cutoff = n
         i += 1
     stat = min(stat, 1.0) # because we initially set stat to 1.1
-    return stat, cutoff
+    stat_ptr[0] = stat
+    cutoff_ptr[0] = cutoff
+
+
+def get_xlmhg_stat_sweep(unsigned short[::1] indices, int N, int K,
+                         int[::1] X_values, int[::1] L_counts,
+                         double[:,::1] stat_out, int[:,::1] cutoff_out,
+                         long double tol=DEFAULT_TOL):
+    """Calculate the XL-mHG test statistic for many values of X and L.
+
+    ``L_counts[j]`` is the number of 1's above the j-th value of L (i.e.,
+    the number of indices that are smaller than L). The statistic and cutoff
+    for the i-th value of X and the j-th value of L are stored in
+    ``stat_out[i, j]`` and ``cutoff_out[i, j]``."""
+    cdef int num_X = X_values.shape[0]
+    cdef int num_L = L_counts.shape[0]
+    cdef int max_count = 0
+    cdef long double[::1] hgps
+    cdef long double[::1] prefix_stat
+    cdef int[::1] prefix_cutoff
+    cdef long double p = 1.0
+    cdef long double stat
+    cdef int a, b, i, n, k, X, cutoff
+
+    for b in range(num_L):
+        max_count = max(max_count, L_counts[b])
+    hgps = np.empty(max_count, dtype=np.longdouble)
+    prefix_stat = np.empty(max_count, dtype=np.longdouble)
+    prefix_cutoff = np.empty(max_count, dtype=np.intc)
+
+    with nogil:
+        # single scan: calculate the hypergeometric p-value at each "1"
+        # (using the same recurrences as `get_xlmhg_stat`)
+        n = 0
+        k = 0
+        for i in range(max_count):
+            while n < indices[i]:
+                p *= (<long double>((n+1)*(N-K-n+k)) /
+                      <long double>((N-n)*(n-k+1)))
+                n += 1
+            p *= (<long double>((n+1)*(K-k)) /\
+                    <long double>((N-n)*(k+1)))
+            k += 1
+            n += 1
+            hgps[i] = get_hgp(p, k, N, K, n)
+
+        for a in range(num_X):
+            X = X_values[a]
+            if K == 0 or K == N or K < X:
+                # special cases
+                for b in range(num_L):
+                    stat_out[a, b] = 1.0
+                    cutoff_out[a, b] = 0
+                continue
+
+            # the test statistic for L is the "running minimum" over all
+            # cutoffs with at least X 1's above L
+            stat = 1.1
+            cutoff = 0
+            for i in range(max_count):
+                if i+1 >= X and hgps[i] < stat and \
+                        is_equal(hgps[i], stat, tol) == 0:
+                    stat = hgps[i]
+                    cutoff = indices[i] + 1
+                prefix_stat[i] = stat
+                prefix_cutoff[i] = cutoff
+
+            for b in range(num_L):
+                if L_counts[b] == 0:
+                    stat_out[a, b] = 1.0
+                    cutoff_out[a, b] = 0
+                else:
+                    stat_out[a, b] = <double>min(prefix_stat[L_counts[b]-1],
+                                                 1.0)
+                    cutoff_out[a, b] = prefix_cutoff[L_counts[b]-1]
+
+
+def get_xlmhg_stat_matrix(unsigned short[:,::1] indices, int N, int X,
+                          int L, double[::1] stat_out,
+                          long double tol=DEFAULT_TOL):
+    """Calculate the XL-mHG test statistics for many lists.
+
+    Each row of ``indices`` contains the sorted indices of the 1's in one
+    list (all lists have the same number of 1's). The statistic for the i-th
+    row is stored in ``stat_out[i]``."""
+    cdef int num_rows = indices.shape[0]
+    cdef int K = indices.shape[1]
+    cdef long double stat
+    cdef int cutoff
+    cdef int r
+
+    with nogil:
+        for r in range(num_rows):
+            _get_xlmhg_stat[cython.ushort](indices[r], N, K, X, L, tol,
+                                           &stat, &cutoff)
+            stat_out[r] = <double>stat
+
+
+def get_xlmhg_stat_dense(const dense_t[:] v, int X, int L,
+                         long double tol=DEFAULT_TOL):
+    """Calculate the XL-mHG test statistic for a dense vector.
+
+    ``v`` is the ranked list itself (all non-zero elements are considered
+    "1"s), which can have any integer type and any stride, and is read in
+    place. Returns a 4-tuple (K, stat, cutoff, O1_bound), where K is the
+    number of "1"s in the list."""
+    cdef int N = v.shape[0]
+    cdef int K = 0
+    cdef long double stat_ld = 1.0
+    cdef double stat = 1.0
+    cdef int cutoff = 0
+    cdef double O1_bound, ON_bound
+    cdef int n
+
+    with nogil:
+        for n in range(N):
+            if v[n] != 0:
+                K += 1
+        _get_xlmhg_stat_dense(v, N, K, X, L, tol, &stat_ld, &cutoff)
+        _get_xlmhg_bounds(stat_ld, N, K, X, L, False, 0.0, tol,
+                          &stat, &O1_bound, &ON_bound)
+    return K, stat, cutoff, O1_bound
+
+
+cdef void _get_xlmhg_stat_dense(const dense_t[:] v, int N, int K, int X,
+                                int L, long double tol,
+                                long double* stat_ptr,
+                                int* cutoff_ptr) nogil:
+    # same as `_get_xlmhg_stat`, but scans the list itself instead of the
+    # indices of the 1's (the results are identical)
+    if K == 0 or K == N or K < X:
+        stat_ptr[0] = 1.0
+        cutoff_ptr[0] = 0
+        return
+
+    cdef long double hgp
+    cdef int cutoff = 0
+    cdef long double stat = 1.1
+    cdef int n = 0
+    cdef int k = 0
+    cdef long double p = 1.0
+    while k < K and n < L:
+        if v[n] == 0:
+            # "add zero"
+            p *= (<long double>((n+1)*(N-K-n+k)) /
+                  <long double>((N-n)*(n-k+1)))
+            n += 1
+            continue
+        # "add one" => calculate hypergeometric p-value
+        p *= (<long double>((n+1)*(K-k)) /\
+                <long double>((N-n)*(k+1)))
+        k += 1
+        n += 1
+        if k >= X: # calculate p-value only if enough elements have been seen
+            hgp = get_hgp(p, k, N, K, n)
+            if hgp < stat and is_equal(hgp, stat, tol) == 0:
+                stat = hgp
+                cutoff = n
+    stat = min(stat, 1.0) # because we initially set stat to 1.1
+    stat_ptr[0] = stat
+    cutoff_ptr[0] = cutoff
+
+
+cdef inline int _popcount64(uint64_t x) nogil:
+    # SWAR population count
+    x = x - ((x >> 1) & <uint64_t>0x5555555555555555ULL)
+    x = (x & <uint64_t>0x3333333333333333ULL) + \
+        ((x >> 2) & <uint64_t>0x3333333333333333ULL)
+    x = (x + (x >> 4)) & <uint64_t>0x0F0F0F0F0F0F0F0FULL
+    return <int>((x * <uint64_t>0x0101010101010101ULL) >> 56)
+
+
+cdef int _get_packed_count(const unsigned char* row, int n) nogil:
+    # the number of 1's among the first n bits of a bit-packed row
+    # (`np.packbits` layout, i.e., the most significant bit comes first)
+    cdef int num_bytes = n >> 3
+    cdef int count = 0
+    cdef int b = 0
+    cdef uint64_t word
+    while b + 8 <= num_bytes:
+        memcpy(&word, &row[b], 8)
+        count += _popcount64(word)
+        b += 8
+    while b < num_bytes:
+        count += _popcount64(row[b])
+        b += 1
+    if n & 7:
+        count += _popcount64(row[b] & (0xFF00 >> (n & 7)) & 0xFF)
+    return count
+
+
+def get_packed_counts(const unsigned char[:,::1] packed, int n,
+                      long long[::1] count_out):
+    """Count the 1's among the first n bits of each row of a bit-packed
+    matrix. The count for the i-th row is stored in ``count_out[i]``."""
+    cdef int num_rows = packed.shape[0]
+    cdef int r
+    with nogil:
+        for r in range(num_rows):
+            count_out[r] = _get_packed_count(&packed[r, 0], n)
+
+
+def get_ranked_packed(const unsigned char[:,::1] packed,
+                      const int[::1] ranking, unsigned char[:,::1] out):
+    """Reorder the columns of a bit-packed matrix.
+
+    Bit n of the i-th row of ``out`` is set to bit ``ranking[n]`` of the i-th
+    row of ``packed``."""
+    cdef int num_rows = packed.shape[0]
+    cdef int N = ranking.shape[0]
+    # the byte offsets and bit masks of the genes, in order of their rank
+    cdef int[::1] offset = np.empty(N, dtype=np.intc)
+    cdef unsigned char[::1] mask = np.empty(N, dtype=np.uint8)
+    cdef const unsigned char* row
+    cdef int r, n, g
+    cdef unsigned char byte
+    with nogil:
+        for n in range(N):
+            offset[n] = ranking[n] >> 3
+            mask[n] = 0x80 >> (ranking[n] & 7)
+        for r in range(num_rows):
+            row = &packed[r, 0]
+            for n in range(0, N, 8):
+                byte = 0
+                for g in range(n, min(n + 8, N)):
+                    if row[offset[g]] & mask[g]:
+                        byte |= 0x80 >> (g & 7)
+                out[r, n >> 3] = byte
+
+
+def get_xlmhg_stat_packed(const unsigned char[:,::1] packed, int N, int X,
+                          int L, long long[::1] K_out, double[::1] stat_out,
+                          long long[::1] cutoff_out, double[::1] O1_bound_out,
+                          long double tol=DEFAULT_TOL):
+    """Calculate the XL-mHG test statistics for the rows of a bit-packed
+    matrix.
+
+    Bit n of each row indicates whether the n-th element of the ranked list
+    is a "1". The number of 1's, test statistic, cutoff and O(1)-bound for
+    the i-th row are stored in ``K_out[i]``, ``stat_out[i]``,
+    ``cutoff_out[i]`` and ``O1_bound_out[i]``."""
+    cdef int num_rows = packed.shape[0]
+    cdef int num_bytes = (L + 7) >> 3
+    # the indices of the 1's of the current row (followed by L, if not all
+    # of them are smaller than L)
+    cdef unsigned short[::1] indices = np.empty(N + 1, dtype=np.uint16)
+    cdef long double stat_ld
+    cdef double stat, O1_bound, ON_bound
+    cdef int cutoff
+    cdef int r, K, b, j, k, n
+    cdef uint64_t word
+    cdef unsigned char byte
+
+    with nogil:
+        for r in range(num_rows):
+            K = _get_packed_count(&packed[r, 0], N)
+            k = 0
+            b = 0
+            while b < num_bytes and k < K:
+                if b + 8 <= num_bytes:
+                    memcpy(&word, &packed[r, b], 8)
+                    if word == 0:
+                        b += 8
+                        continue
+                byte = packed[r, b]
+                for j in range(8):
+                    if byte & (0x80 >> j):
+                        n = 8 * b + j
+                        if n >= L:
+                            break
+                        indices[k] = n
+                        k += 1
+                b += 1
+            if k < K:
+                indices[k] = L
+
+            _get_xlmhg_stat[cython.ushort](indices, N, K, X, L, tol,
+                                           &stat_ld, &cutoff)
+            _get_xlmhg_bounds(stat_ld, N, K, X, L, False, 0.0, tol,
+                              &stat, &O1_bound, &ON_bound)
+            K_out[r] = K
+            stat_out[r] = stat
+            cutoff_out[r] = cutoff
+            O1_bound_out[r] = O1_bound
+
+
+cdef inline double _get_xlmhg_O1_bound(double stat, int K, int X,
+                                       int L) nogil:
+    # see `get_xlmhg_O1_bound` in test.py
+    cdef int min_KL = min(K, L)
+    cdef int max_X1 = max(X, 1)
+    if stat == 1.0:
+        return 1.0
+    elif min_KL == 0 or X > min_KL:
+        return 0.0
+    return min((min_KL-max_X1+1)*stat, 1.0)
 
 
 def get_xlmhg_ON_bound(int N, int K, int X, int L, long double stat,
                        long double tol=DEFAULT_TOL):
     """PVAL-BOUND: Calculate an upper bound for the XL-mHG p-value in O(N)."""
+    return _get_xlmhg_ON_bound(N, K, X, L, stat, tol)
+
+
+cdef long double _get_xlmhg_ON_bound(int N, int K, int X, int L,
+                                     long double stat,
+                                     long double tol) nogil:
     # we assume that:
     # 0 < stat <= 1.0
     # 0 <= X <= N
@@ -153,9 +561,237 @@ def get_xlmhg_ON_bound(int N, int K, int X, int L, long double stat,
     return min((k_max-k_min+1)*stat, 1.0)
 
 
+def get_xlmhg_stat_bounds(const dense_t[:] indices, int N, int K, int X,
+                          int L, pval_thresh=None,
+                          long double tol=DEFAULT_TOL):
+    """PVAL-THRESH: Calculate the test statistic and the p-value bounds.
+
+    Calculates the XL-mHG test statistic and cutoff, the O(1)-bound and (if
+    required) the O(N)-bound, and uses them to determine whether the test is
+    significant at the given significance threshold.
+
+    ``indices`` can have any integer type and any stride, and is read in
+    place. Returns a 5-tuple (stat, cutoff, O1_bound, ON_bound, significant).
+    ``ON_bound`` is NaN if the O(N)-bound did not need to be calculated.
+    ``significant`` is None if ``pval_thresh`` is None, or if the bounds were
+    inconclusive (in which case the exact p-value must be calculated).
+    """
+    cdef double stat = 1.0
+    cdef int cutoff = 0
+    cdef double O1_bound = 1.0
+    cdef double ON_bound = NAN
+    cdef int significant
+    cdef bint has_pval_thresh = pval_thresh is not None
+    cdef double thresh = pval_thresh if has_pval_thresh else 0.0
+    significant = _get_xlmhg_stat_bounds(
+        indices, N, K, X, L, has_pval_thresh, thresh, tol,
+        &stat, &cutoff, &O1_bound, &ON_bound)
+    return stat, cutoff, O1_bound, ON_bound, \
+        (None if significant == -1 else significant == 1)
+
+
+cdef int _get_xlmhg_stat_bounds(const dense_t[:] indices, int N, int K,
+                                int X, int L, bint has_pval_thresh,
+                                double pval_thresh, long double tol,
+                                double* stat_ptr, int* cutoff_ptr,
+                                double* O1_bound_ptr,
+                                double* ON_bound_ptr) nogil:
+    # returns 1 if the test is significant, 0 if it is not, and -1 if the
+    # bounds are inconclusive (or if no threshold is given)
+    cdef long double stat_ld
+    _get_xlmhg_stat(indices, N, K, X, L, tol, &stat_ld, cutoff_ptr)
+    return _get_xlmhg_bounds(stat_ld, N, K, X, L, has_pval_thresh,
+                             pval_thresh, tol, stat_ptr, O1_bound_ptr,
+                             ON_bound_ptr)
+
+
+cdef int _get_xlmhg_bounds(long double stat_ld, int N, int K, int X, int L,
+                           bint has_pval_thresh, double pval_thresh,
+                           long double tol, double* stat_ptr,
+                           double* O1_bound_ptr, double* ON_bound_ptr) nogil:
+    # the second half of `_get_xlmhg_stat_bounds`
+    cdef double stat, O1_bound, ON_bound
+
+    # the bounds (and the p-value) are calculated based on the rounded
+    # value of the test statistic, which is what the user gets to see
+    stat = <double>stat_ld
+    stat_ptr[0] = stat
+
+    O1_bound = _get_xlmhg_O1_bound(stat, K, X, L)
+    O1_bound_ptr[0] = O1_bound
+    ON_bound_ptr[0] = NAN
+
+    if not has_pval_thresh:
+        return -1
+
+    if stat > pval_thresh and is_equal(stat, pval_thresh, tol) == 0:
+        # the test statistic is a lower bound for the p-value
+        return 0
+    elif O1_bound <= pval_thresh or is_equal(O1_bound, pval_thresh, tol) != 0:
+        return 1
+
+    ON_bound = <double>_get_xlmhg_ON_bound(N, K, X, L, stat, tol)
+    ON_bound_ptr[0] = ON_bound
+    if ON_bound <= pval_thresh or is_equal(ON_bound, pval_thresh, tol) != 0:
+        return 1
+
+    return -1
+
+
+def get_xlmhg_O1_bound_array(const double[::1] stat, const int[::1] K,
+                             const int[::1] X, const int[::1] L,
+                             double[::1] out):
+    """Calculate O(1)-bounds for arrays of test statistics (see
+    `xlmhg.get_xlmhg_O1_bounds`)."""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = stat.shape[0]
+    with nogil:
+        for i in range(n):
+            out[i] = _get_xlmhg_O1_bound(stat[i], K[i], X[i], L[i])
+
+
+def get_xlmhg_ON_bound_array(int N, const double[::1] stat,
+                             const int[::1] K, const int[::1] X,
+                             const int[::1] L, double[::1] out,
+                             long double tol=DEFAULT_TOL):
+    """Calculate O(N)-bounds for arrays of test statistics (see
+    `xlmhg.get_xlmhg_ON_bounds`)."""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = stat.shape[0]
+    with nogil:
+        for i in range(n):
+            out[i] = <double>_get_xlmhg_ON_bound(N, K[i], X[i], L[i],
+                                                 stat[i], tol)
+
+
+def get_xlmhg_stat_bounds_both_ends(unsigned short[::1] indices, int N,
+                                    int K, int X, int L, pval_thresh=None,
+                                    long double tol=DEFAULT_TOL):
+    """PVAL-THRESH for both ends of the list.
+
+    Like `get_xlmhg_stat_bounds`, but calculates the results for the list
+    ("top") and for the reversed list ("bottom") from a single scan of the
+    indices. Returns two 5-tuples (see `get_xlmhg_stat_bounds`).
+    """
+    cdef long double stat_top, stat_bottom
+    cdef int cutoff_top = 0
+    cdef int cutoff_bottom = 0
+    cdef double[3] top
+    cdef double[3] bottom
+    cdef int sig_top, sig_bottom
+    cdef bint has_pval_thresh = pval_thresh is not None
+    cdef double thresh = pval_thresh if pval_thresh is not None else 0.0
+
+    with nogil:
+        _get_xlmhg_stat_both_ends(indices, N, K, X, L, tol,
+                                  &stat_top, &cutoff_top,
+                                  &stat_bottom, &cutoff_bottom)
+        sig_top = _get_xlmhg_bounds(stat_top, N, K, X, L, has_pval_thresh,
+                                    thresh, tol, &top[0], &top[1], &top[2])
+        sig_bottom = _get_xlmhg_bounds(stat_bottom, N, K, X, L,
+                                       has_pval_thresh, thresh, tol,
+                                       &bottom[0], &bottom[1], &bottom[2])
+
+    return (
+        (top[0], cutoff_top, top[1], top[2],
+         None if sig_top == -1 else sig_top == 1),
+        (bottom[0], cutoff_bottom, bottom[1], bottom[2],
+         None if sig_bottom == -1 else sig_bottom == 1))
+
+
+cdef void _get_xlmhg_stat_both_ends(unsigned short[::1] indices, int N,
+                                    int K, int X, int L, long double tol,
+                                    long double* stat_top_ptr,
+                                    int* cutoff_top_ptr,
+                                    long double* stat_bottom_ptr,
+                                    int* cutoff_bottom_ptr) nogil:
+    # Calculates the XL-mHG test statistic for the list and for the reversed
+    # list in a single pass (see `_get_xlmhg_stat`). In the reversed list,
+    # the i-th "1" is at position N-1-indices[K-1-i].
+    if K == 0 or K == N or K < X:
+        stat_top_ptr[0] = 1.0
+        cutoff_top_ptr[0] = 0
+        stat_bottom_ptr[0] = 1.0
+        cutoff_bottom_ptr[0] = 0
+        return
+
+    cdef long double hgp
+    cdef long double stat_t = 1.1, stat_b = 1.1
+    cdef int cutoff_t = 0, cutoff_b = 0
+    cdef int n_t = 0, n_b = 0
+    cdef long double p_t = 1.0, p_b = 1.0
+    cdef int i = 0
+    cdef int k = 0
+    cdef int ind_t, ind_b
+    cdef bint top_done = 0, bottom_done = 0
+
+    while i < K and not (top_done and bottom_done):
+        k = i  # number of 1's seen so far (on both ends)
+        ind_t = indices[i]
+        ind_b = N-1-indices[K-1-i]
+        if not top_done:
+            if ind_t >= L:
+                top_done = 1
+            else:
+                while n_t < ind_t:
+                    p_t *= (<long double>((n_t+1)*(N-K-n_t+k)) /
+                            <long double>((N-n_t)*(n_t-k+1)))
+                    n_t += 1
+                p_t *= (<long double>((n_t+1)*(K-k)) /\
+                        <long double>((N-n_t)*(k+1)))
+                n_t += 1
+                if k+1 >= X:
+                    hgp = get_hgp(p_t, k+1, N, K, n_t)
+                    if hgp < stat_t and is_equal(hgp, stat_t, tol) == 0:
+                        stat_t = hgp
+                        cutoff_t = n_t
+        if not bottom_done:
+            if ind_b >= L:
+                bottom_done = 1
+            else:
+                while n_b < ind_b:
+                    p_b *= (<long double>((n_b+1)*(N-K-n_b+k)) /
+                            <long double>((N-n_b)*(n_b-k+1)))
+                    n_b += 1
+                p_b *= (<long double>((n_b+1)*(K-k)) /\
+                        <long double>((N-n_b)*(k+1)))
+                n_b += 1
+                if k+1 >= X:
+                    hgp = get_hgp(p_b, k+1, N, K, n_b)
+                    if hgp < stat_b and is_equal(hgp, stat_b, tol) == 0:
+                        stat_b = hgp
+                        cutoff_b = n_b
+        i += 1
+
+    stat_top_ptr[0] = min(stat_t, 1.0)
+    cutoff_top_ptr[0] = cutoff_t
+    stat_bottom_ptr[0] = min(stat_b, 1.0)
+    cutoff_bottom_ptr[0] = cutoff_b
+
+
+# NOTE: The p-values calculated by the PVAL1 and PVAL2 kernels below are kept
+# in the persistent p-value store. Any change to these kernels (or to `mhg.py`)
+# that can affect their results must be accompanied by an increment of
+# `pvalstore.KERNEL_REVISION`, so that stale p-values are not reused.
+
 def get_xlmhg_pval1(int N, int K, int X, int L, long double stat, \
-                    long double[:,::1] table, long double tol=DEFAULT_TOL):
-    """PVAL1: Calculate the XL-mHG p-value in O(N^2)."""
+                    long double[:,::1] table, long double tol=DEFAULT_TOL,
+                    bint return_cells=False):
+    """PVAL1: Calculate the XL-mHG p-value in O(N^2).
+
+    If ``return_cells`` is True, returns a tuple with the p-value and the
+    number of dynamic programming table cells visited."""
+    cdef long long cells = 0
+    cdef long double pval = _get_xlmhg_pval1(N, K, X, L, stat, table, tol,
+                                             &cells)
+    if return_cells:
+        return pval, cells
+    return pval
+
+
+cdef long double _get_xlmhg_pval1(int N, int K, int X, int L,
+                                  long double stat, long double[:,::1] table,
+                                  long double tol, long long* cells) nogil:
 
     # cheap checks
     if stat == 1.0:
@@ -166,7 +802,7 @@ def get_xlmhg_pval1(int N, int K, int X, int L, long double stat, \
         return 0.0
 
     # initialization
-    cdef int W, n, k, w
+    cdef int W, n, k, w, k_start
     cdef long double p_start, p, hgp
 
     W = N-K
@@ -186,11 +822,12 @@ def get_xlmhg_pval1(int N, int K, int X, int L, long double stat, \
 
         if p_start <= 0.0:
             # not enough floating point precision to calculate p-value
-            return float('nan')
+            return NAN
 
         p = p_start
         hgp = p
         w = n - k
+        k_start = k
 
         # R is the space of configurations with mHG better than or equal to the
         # one observed
@@ -230,11 +867,73 @@ def get_xlmhg_pval1(int N, int K, int X, int L, long double stat, \
             w += 1
             k -= 1
 
+        # we've visited all cells on the diagonal for cutoff n
+        cells[0] += k_start - k
+
     return 1.0 - table[K, W]
 
 def get_xlmhg_pval2(int N, int K, int X, int L, long double stat,\
-                    long double[:,::1] table, long double tol=DEFAULT_TOL):
-    """PVAL2: Improved calculation of the XL-mHG p-value in O(N^2)."""
+                    long double[:,::1] table, long double tol=DEFAULT_TOL,
+                    bint return_cells=False):
+    """PVAL2: Improved calculation of the XL-mHG p-value in O(N^2).
+
+    Only the first K+1 entries of ``table`` are used.
+
+    If ``return_cells`` is True, returns a tuple with the p-value and the
+    number of dynamic programming table cells visited.
+
+    The GIL is released during the calculation, so that p-values can be
+    calculated in several threads (each using its own table)."""
+    cdef long long cells = 0
+    cdef long double pval
+    with nogil:
+        pval = _get_xlmhg_pval2(N, K, X, L, stat, &table[0,0], tol, &cells)
+    if return_cells:
+        return pval, cells
+    return pval
+
+
+def get_xlmhg_pval2_double(int N, int K, int X, int L, long double stat,
+                           long double tol=DEFAULT_TOL,
+                           bint return_cells=False):
+    """PVAL2 in double precision.
+
+    The dynamic programming table is stored in double precision, which
+    allows the inner loop to be vectorized. Returns NaN if the p-value is
+    too small to be calculated accurately in double precision (in which case
+    it should be calculated using `get_xlmhg_pval2`).
+
+    If ``return_cells`` is True, returns a tuple with the p-value and the
+    number of dynamic programming table cells visited.
+
+    The GIL is released during the calculation."""
+    cdef long long cells = 0
+    cdef long double pval
+    # the diagonals are stored alternately in the two halves of the table
+    cdef double[::1] table = np.empty(2*(K+1), dtype=np.float64)
+    with nogil:
+        pval = _get_xlmhg_pval2(N, K, X, L, stat, &table[0], tol, &cells)
+    if not pval >= MIN_DOUBLE_PVAL:
+        pval = NAN
+    if return_cells:
+        return pval, cells
+    return pval
+
+
+cdef long double _get_xlmhg_pval2(int N, int K, int X, int L,
+                                  long double stat, pval2_t* table,
+                                  long double tol, long long* cells,
+                                  int num_L=0, int* L_values=NULL,
+                                  long double* pvals=NULL) nogil:
+    # Only the diagonal of the dynamic programming table for the current
+    # cutoff n is stored, i.e., `table[k]` is the entry for (k, n-k). In long
+    # double precision, the diagonal is updated in place, so `table` must
+    # have room for K+1 entries. In double precision, the diagonals for
+    # cutoffs n-1 and n are stored in separate halves of `table` (which must
+    # have room for 2*(K+1) entries).
+    # If `L_values` is given, also records the p-values for all
+    # L' in `L_values` (which must be sorted, with L' <= L), since the
+    # p-value for L' is the value of `pval` after the first L' cutoffs.
 
     # cheap checks
     if stat == 1.0:
@@ -245,87 +944,387 @@ def get_xlmhg_pval2(int N, int K, int X, int L, long double stat,\
         return 0.0
 
     # initialization
-    cdef int W, n, k, w
-    cdef long double pval, p_start, p, hgp
+    cdef int n, status
+    cdef long double pval, p_start
+    cdef int j = 0
+    cdef pval2_t* src = table
+    cdef pval2_t* dst = table
+    if pval2_t is double:
+        dst = table + (K+1)
 
     # go over the first L cutoffs
     pval = 0.0
-    W = N-K
-    table[0,0] = 1.0
+    while j < num_L and L_values[j] <= 0:
+        pvals[j] = pval
+        j += 1
+    table[0] = 1.0
     p_start = 1.0
     for n in range(1, L+1):
+        status = _fill_pval2_diagonal(N, K, X, n, stat, src, dst, tol,
+                                      &p_start, &pval, cells)
+        if pval2_t is double:
+            src, dst = dst, src
+        if status == -1:
+            # not enough floating point precision to calculate p-value
+            while j < num_L:
+                pvals[j] = NAN
+                j += 1
+            return NAN
+        elif status == 1:
+            # We've exited R (or we were never in it).
+            break
 
-        if K >= n:
-            k = n
-            p_start *= ((<long double>(K-n+1)) /\
-                    (<long double>(N-n+1)))
-        else:
-            k = K
-            p_start *= ((<long double>n) /\
-                    <long double>(n-K))
+        while j < num_L and L_values[j] == n:
+            pvals[j] = pval
+            j += 1
 
-        if p_start <= 0.0:
-            # not enough floating point precision to calculate p-value
-            return float('nan')
+    while j < num_L:
+        pvals[j] = pval
+        j += 1
 
-        p = p_start
-        hgp = p
-        w = n - k
+    return pval
 
-        if k == K and (hgp > stat and not is_equal(hgp, stat, tol)):
-            # We've exited R (or we were never in it).
-            # That means we're done here!
-            break
 
-        # R is the space of configurations with mHG better than or equal to the
-        # one observed
-        # - go over all configurations for threshold n
-        # - start with highest possible enrichment and then go down
-        # - as long as we're in R, all paths going through this configuration
-        #   are "doomed"
-        # - because we're using (K x W) grid instead of parallelogram,
-        #   "going down" becomes going down and right...
+cdef inline int _fill_pval2_diagonal(int N, int K, int X, int n,
+                                     long double stat, pval2_t* src,
+                                     pval2_t* dst, long double tol,
+                                     long double* p_start_ptr,
+                                     long double* pval_ptr,
+                                     long long* cells) nogil:
+    # Fills in the diagonal of the PVAL2 table for cutoff n (`dst`), based
+    # on the diagonal for cutoff n-1 (`src`), and adds the probability of the
+    # paths that enter R at cutoff n to `pval_ptr[0]`. In long double
+    # precision, `src` and `dst` are the same array, which is overwritten in
+    # place (going from high to low k).
+    # Returns 0 if the calculation should continue with cutoff n+1, 1 if
+    # we're done (we've exited R), and -1 if there is not enough floating
+    # point precision to calculate the p-value.
+    cdef int W, k, w, k_start
+    cdef long double p, hgp
+    cdef int k_min, j0, i, m
+    cdef double c, v
+    cdef double* s
+    cdef double* d
+    cdef long double p_start = p_start_ptr[0]
+    cdef long double pval = pval_ptr[0]
 
-        # find the first configuration that's not in R
-        # this happens when either k < X, or hypergeometric p-value > mHG
-        # if k == 0 or w == W, we have hypergeometric p-value = 1
-        # since mHG < 1, as soon as k == 0 or w == W, we have left R
-        while k >= X and w < W and \
-                (hgp < stat or is_equal(hgp, stat, tol)):
-            # we're still in R
-            table[k, w] = 0.0
-
-            # check if we've "just entered" R (this is only possible "from below")
-            if table[k-1, w] > 0.0:
-                # calculate the fraction of "fresh" paths (paths which have never entered R before)
-                # that enter here, and add that number to r
-                pval += (table[k-1, w] * (<long double>(K-k+1)/<long double>(N-n+1)))
- 
-
-            p *= ((<long double>(k*(N-K-n+k))) / (<long double>((n-k+1)*(K-k+1))))
-            hgp += p
-            w += 1
-            k -= 1
+    W = N-K
+    if K >= n:
+        k = n
+        p_start *= ((<long double>(K-n+1)) /\
+                (<long double>(N-n+1)))
+    else:
+        k = K
+        p_start *= ((<long double>n) /\
+                <long double>(n-K))
+    p_start_ptr[0] = p_start
 
-        # fill in rest of the table based on entries for cutoff n-1
+    if p_start <= 0.0:
+        # not enough floating point precision to calculate p-value
+        return -1
+
+    p = p_start
+    hgp = p
+    w = n - k
+    k_start = k
+
+    if k == K and (hgp > stat and not is_equal(hgp, stat, tol)):
+        # We've exited R (or we were never in it).
+        # That means we're done here!
+        return 1
+
+    # R is the space of configurations with mHG better than or equal to the
+    # one observed
+    # - go over all configurations for threshold n
+    # - start with highest possible enrichment and then go down
+    # - as long as we're in R, all paths going through this configuration
+    #   are "doomed"
+    # - because we're using (K x W) grid instead of parallelogram,
+    #   "going down" becomes going down and right...
+
+    # find the first configuration that's not in R
+    # this happens when either k < X, or hypergeometric p-value > mHG
+    # if k == 0 or w == W, we have hypergeometric p-value = 1
+    # since mHG < 1, as soon as k == 0 or w == W, we have left R
+    while k >= X and w < W and \
+            (hgp < stat or is_equal(hgp, stat, tol)):
+        # we're still in R
+        dst[k] = 0.0
+
+        # check if we've "just entered" R (this is only possible "from below")
+        if src[k-1] > 0.0:
+            # calculate the fraction of "fresh" paths (paths which have never entered R before)
+            # that enter here, and add that number to r
+            pval += (src[k-1] * (<long double>(K-k+1)/<long double>(N-n+1)))
+
+
+        p *= ((<long double>(k*(N-K-n+k))) / (<long double>((n-k+1)*(K-k+1))))
+        hgp += p
+        w += 1
+        k -= 1
+    pval_ptr[0] = pval
+
+    # fill in rest of the table based on entries for cutoff n-1
+    if pval2_t is double:
+        # In double precision, the divisions are replaced by a multiplication,
+        # and the cells with k > 0 and w > 0 are visited in order of
+        # increasing k, so that this loop can be vectorized.
+        if k >= 0:
+            c = 1.0 / <double>(N-n+1)
+            k_min = max(k-(W-w), 0)
+            if w == 0:
+                # paths only come in "from below"
+                dst[k] = src[k-1] * (<double>(K-k+1) * c)
+                w += 1
+                k -= 1
+            j0 = max(k_min, 1)
+            m = k-j0+1
+            s = src + j0
+            d = dst + j0
+            for i in range(m):
+                # paths come in "from the left" and "from below"
+                v = (s[i] * <double>(W-w-k+j0+i+1) +
+                     s[i-1] * <double>(K-j0-i+1)) * c
+                d[i] = v if v >= MIN_DOUBLE_ENTRY else 0.0
+            if k_min == 0:
+                # paths only come in "from the left"
+                dst[0] = src[0] * (<double>(W-w-k+1) * c)
+            k = k_min-1
+    else:
         while k >= 0 and w <= W:
             if k == 0:
                 # paths only come in "from the left"
-                table[k, w] = \
-                    table[k, w-1] * (<long double>(W-w+1) / <long double>(N-n+1))
+                dst[k] = \
+                    src[k] * (<long double>(W-w+1) / <long double>(N-n+1))
             elif w == 0:
                 # paths only come in "from below"
-                table[k, w] = \
-                    table[k-1, w] * (<long double>(K-k+1) / <long double>(N-n+1))
+                dst[k] = \
+                    src[k-1] * (<long double>(K-k+1) / <long double>(N-n+1))
             else:
                 # paths come in "from the left" and "from below"
-                table[k, w] = \
-                    table[k, w-1] * (<long double>(W-w+1) / <long double>(N-n+1)) + \
-                    table[k-1, w] * (<long double>(K-k+1) / <long double>(N-n+1))
+                dst[k] = \
+                    src[k] * (<long double>(W-w+1) / <long double>(N-n+1)) + \
+                    src[k-1] * (<long double>(K-k+1) / <long double>(N-n+1))
             w += 1
             k -= 1
 
-    return pval
+    # we've visited all cells on the diagonal for cutoff n
+    cells[0] += k_start - k
+    return 0
+
+
+cdef inline double _get_monotonic_time() nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return ts.tv_sec + 1e-9 * ts.tv_nsec
+
+
+def get_xlmhg_pval2_partial(int N, int K, int X, int L, long double stat,
+                            long double[:,::1] table,
+                            long double[::1] state, double max_seconds=-1.0,
+                            long double tol=DEFAULT_TOL):
+    """PVAL2 with a time limit. The calculation can be resumed.
+
+    ``state`` (length 4) contains the number of cutoffs processed, the
+    probability of entering R at one of these cutoffs (a lower bound for the
+    p-value), internal state, and the number of dynamic programming table
+    cells visited. It must be filled with zeros before the first call, and
+    the same table must be passed to all calls for the same test. The time
+    limit (ignored if negative) is checked after each cutoff.
+
+    Returns 1 if the calculation is finished (``state[1]`` is the p-value),
+    0 if the time limit was reached, and -1 if there is not enough floating
+    point precision to calculate the p-value."""
+    cdef int n = <int>state[0]
+    cdef long double pval = state[1]
+    cdef long double p_start = state[2]
+    cdef long long cells = 0
+    cdef int status = 0
+    cdef double t0
+
+    # cheap checks
+    if stat == 1.0 or stat == 0.0 or K == 0 or K == N or K < X:
+        state[0] = L
+        state[1] = stat if (stat == 1.0 or stat == 0.0) else 0.0
+        return 1
+
+    with nogil:
+        t0 = _get_monotonic_time()
+        if n == 0:
+            table[0,0] = 1.0
+            p_start = 1.0
+            pval = 0.0
+        while n < L:
+            n += 1
+            status = _fill_pval2_diagonal(N, K, X, n, stat, &table[0,0],
+                                          &table[0,0], tol, &p_start, &pval,
+                                          &cells)
+            if status == 1:
+                # we've exited R, so the p-value won't change anymore
+                n = L
+                status = 0
+            elif status == -1 or \
+                    (max_seconds >= 0 and
+                     _get_monotonic_time() - t0 >= max_seconds):
+                break
+
+    state[0] = n
+    state[1] = pval
+    state[2] = p_start
+    state[3] += cells
+    if status == -1:
+        return -1
+    elif n >= L:
+        return 1
+    return 0
+
+
+def get_xlmhg_pval2_multi(int N, int K, int X, int[::1] L_values,
+                          long double stat, long double[:,::1] table,
+                          long double[::1] pvals,
+                          long double tol=DEFAULT_TOL):
+    """PVAL2: Calculate the XL-mHG p-values for several values of L at once.
+
+    All p-values are calculated using the same test statistic, in a single
+    pass over the dynamic programming table. ``L_values`` must be sorted in
+    ascending order. The p-values are stored in ``pvals``."""
+    cdef long long cells = 0
+    cdef int num_L = L_values.shape[0]
+    cdef Py_ssize_t i
+    if num_L == 0:
+        return
+    if stat == 1.0 or stat == 0 or K == 0 or K == N or K < X:
+        # cheap checks (see `_get_xlmhg_pval2`)
+        for i in range(num_L):
+            pvals[i] = 1.0 if stat == 1.0 else 0.0
+        return
+    _get_xlmhg_pval2(N, K, X, L_values[num_L-1], stat, &table[0,0], tol,
+                     &cells, num_L, &L_values[0], &pvals[0])
+
+
+def get_xlmhg_pval2_multi_double(int N, int K, int X, int[::1] L_values,
+                                 long double stat, long double[::1] pvals,
+                                 long double tol=DEFAULT_TOL):
+    """PVAL2 in double precision, for several values of L at once.
+
+    See `get_xlmhg_pval2_multi` and `get_xlmhg_pval2_double`. P-values that
+    are too small to be calculated in double precision are set to NaN."""
+    cdef long long cells = 0
+    cdef int num_L = L_values.shape[0]
+    cdef Py_ssize_t i
+    cdef double[::1] table
+    if num_L == 0:
+        return
+    if stat == 1.0 or stat == 0 or K == 0 or K == N or K < X:
+        # cheap checks (see `_get_xlmhg_pval2`)
+        for i in range(num_L):
+            pvals[i] = 1.0 if stat == 1.0 else 0.0
+        return
+    table = np.empty(2*(K+1), dtype=np.float64)
+    with nogil:
+        _get_xlmhg_pval2(N, K, X, L_values[num_L-1], stat, &table[0], tol,
+                         &cells, num_L, &L_values[0], &pvals[0])
+    for i in range(num_L):
+        if not pvals[i] >= MIN_DOUBLE_PVAL:
+            pvals[i] = NAN
+
+
+DEF SQRT_2 = 1.4142135623730951
+DEF LOG_SQRT_2PI = 0.9189385332046728
+
+
+cdef double _get_log_normal_sf(double z) nogil:
+    # calculates the logarithm of the standard normal survival function
+    cdef double q = 0.5 * erfc(z / SQRT_2)
+    if q > 0:
+        return log(q)
+    # asymptotic expansion (for very large z)
+    return -z*z/2.0 - LOG_SQRT_2PI - log(z) + log(1.0 - 1.0/(z*z))
+
+
+cdef double _get_normal_isf(double p) nogil:
+    # calculates the inverse of the standard normal survival function
+    # (0 < p < 1), using Newton's method on log(Q(z))
+    cdef double log_p = log(p)
+    cdef double z = sqrt(max(-2.0 * log_p, 1.0))
+    cdef double log_q, deriv, step
+    cdef int i
+    for i in range(50):
+        log_q = _get_log_normal_sf(z)
+        # d/dz log(Q(z)) = -phi(z) / Q(z)
+        deriv = -exp(-z*z/2.0 - LOG_SQRT_2PI - log_q)
+        step = (log_q - log_p) / deriv
+        z -= step
+        if ABS(step) < 1e-12 * max(ABS(z), 1.0):
+            break
+    return z
+
+
+cdef inline double _get_overshoot_correction(double x) nogil:
+    # Siegmund's correction factor nu(x) for a boundary crossing probability
+    # of a process that is only observed at discrete time steps
+    cdef double y = x / 2.0
+    cdef double Phi, phi
+    if x < 1e-8:
+        return 1.0
+    Phi = 0.5 * erfc(-y / SQRT_2)
+    phi = exp(-y*y/2.0 - LOG_SQRT_2PI)
+    return (2.0/x) * (Phi - 0.5) / (y*Phi + phi)
+
+
+def get_xlmhg_approx_pval(int N, int K, int X, int L, double stat,
+                          long double tol=DEFAULT_TOL):
+    """Approximate the XL-mHG p-value in O(L).
+
+    Under the null hypothesis, the standardized number of 1's above the
+    cutoff n behaves like a standardized Brownian bridge, which becomes a
+    stationary Ornstein-Uhlenbeck process after the time change
+    s = log(t/(1-t))/2 (with t = n/N). The test statistic is converted into a
+    boundary z (by treating it as a normal tail probability), and the
+    probability of crossing z is approximated by the first-order
+    boundary-crossing formula, with a correction for the discrete steps
+    between 1's."""
+    return _get_xlmhg_approx_pval(N, K, X, L, stat, tol)
+
+
+cdef double _get_xlmhg_approx_pval(int N, int K, int X, int L, double stat,
+                                   long double tol) nogil:
+    cdef double z, z_phi, t, ds, total
+    cdef long double p
+    cdef int n, n_first, n_max
+
+    if stat <= 0.0 or stat >= 1.0 or K == 0 or K == N:
+        return stat
+
+    z = _get_normal_isf(stat)
+    if z <= 0:
+        return 1.0
+
+    # determine the first cutoff at which the test statistic can be reached
+    # (i.e., the first cutoff n for which the probability of only observing
+    # 1's above n is <= stat)
+    n_first = 0
+    n_max = min(K, L)
+    p = 1.0
+    for n in range(1, n_max+1):
+        p *= (<long double>(K-n+1) / <long double>(N-n+1))
+        if p <= stat or is_equal(p, stat, tol) != 0:
+            n_first = n
+            break
+    if n_first == 0:
+        return stat
+    n_first = max(n_first, X)
+
+    # sum over the remaining cutoffs (in the time scale s)
+    total = 0.0
+    for n in range(n_first, min(L, N-1)+1):
+        t = <double>n / <double>N
+        ds = 1.0 / (2.0 * n * (1.0 - t))
+        total += ds * _get_overshoot_correction(
+            z * sqrt(2.0 * ds * N / <double>K))
+
+    z_phi = z * exp(-z*z/2.0 - LOG_SQRT_2PI)
+    return min(stat + z_phi * total, 1.0)
 
 
 def get_xlmhg_escore(unsigned short[::1] indices, int N, int K, int X, int L,
@@ -369,3 +1368,155 @@ def get_xlmhg_escore(unsigned short[::1] indices, int N, int K, int X, int L,
     if escore == 0.0:
         return float('nan')
     return escore
+
+
+# values for `PreparedTest.exact_pval`
+DEF EXACT_PVAL_ALWAYS = 0
+DEF EXACT_PVAL_IF_SIGNIFICANT = 1
+DEF EXACT_PVAL_IF_NECESSARY = 2
+
+_EXACT_PVAL_MODES = {
+    'always': EXACT_PVAL_ALWAYS,
+    'if_significant': EXACT_PVAL_IF_SIGNIFICANT,
+    'if_necessary': EXACT_PVAL_IF_NECESSARY,
+}
+
+
+cdef class PreparedTest:
+    """XL-mHG tests with fixed parameters and a reusable workspace.
+
+    Performs the same calculations as `get_xlmhg_test_result`, but all
+    parameters are fixed (and validated) once, when the object is created,
+    and the dynamic programming table is reused across tests. Do not create
+    instances directly; use `xlmhg.prepare_xlmhg_test` instead, which
+    validates the parameters.
+    """
+    cdef readonly int N
+    cdef readonly int X
+    cdef readonly int L
+    cdef readonly str exact_pval
+    cdef int _exact_pval_mode
+    cdef bint _has_pval_thresh
+    cdef double _pval_thresh
+    cdef readonly bint use_alg1
+    cdef readonly double tol
+    cdef long double[:,::1] table
+    cdef double[::1] double_table
+
+    def __init__(self, int N, int X, int L, str exact_pval='always',
+                 pval_thresh=None, bint use_alg1=False,
+                 double tol=DEFAULT_TOL):
+        self.N = N
+        self.X = X
+        self.L = L
+        self.exact_pval = exact_pval
+        self._exact_pval_mode = _EXACT_PVAL_MODES[exact_pval]
+        self._has_pval_thresh = pval_thresh is not None
+        self._pval_thresh = pval_thresh if pval_thresh is not None else 0.0
+        self.use_alg1 = use_alg1
+        self.tol = tol
+        # the number of columns (W+1) is at most N+1 (PVAL2 only uses the
+        # first column), the number of rows (K+1) grows as needed
+        self.table = np.empty((1, N+1 if use_alg1 else 1),
+                              dtype=np.longdouble)
+        # the table for PVAL2 in double precision (2*(K+1) entries)
+        self.double_table = np.empty(2, dtype=np.float64)
+
+    @property
+    def pval_thresh(self):
+        if self._has_pval_thresh:
+            return self._pval_thresh
+        return None
+
+    def __call__(self, unsigned short[::1] indices):
+        return self.run(indices)
+
+    cpdef tuple run(self, unsigned short[::1] indices):
+        """Perform an XL-mHG test.
+
+        Parameters
+        ----------
+        indices: 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+            Sorted list of indices corresponding to the "1"s in the ranked
+            list (must be C-contiguous).
+
+        Returns
+        -------
+        stat: float
+            The XL-mHG test statistic.
+        cutoff: int
+            The (first) cutoff at which stat was attained.
+        pval: float
+            The XL-mHG p-value (either exact or an upper bound).
+        """
+        cdef int N = self.N
+        cdef int X = self.X
+        cdef int L = self.L
+        cdef int K = indices.shape[0]
+        cdef long double tol = self.tol
+        cdef double stat, pval, O1_bound, ON_bound
+        cdef int cutoff = 0
+        cdef int is_significant  # -1 = unknown
+        cdef long long cells = 0
+
+        # the kernels are compiled without bounds checking
+        if K > N or (K > 0 and indices[K-1] >= N):
+            raise ValueError('Invalid indices array (K=%d, N=%d). K must '
+                             'be <= N, and all indices must be < N.'
+                             % (K, N))
+
+        if X > min(K, L):
+            # by definition
+            return 1.0, 0, 1.0
+
+        # steps 1 and 2: calculate the test statistic, and determine whether
+        # we need to calculate the exact p-value
+        is_significant = _get_xlmhg_stat_bounds[cython.ushort](
+            indices, N, K, X, L,
+            self._has_pval_thresh and
+                self._exact_pval_mode != EXACT_PVAL_ALWAYS,
+            self._pval_thresh, tol, &stat, &cutoff, &O1_bound, &ON_bound)
+        if stat == 1.0 or stat == 0.0:
+            return stat, cutoff, stat
+
+        if ON_bound == ON_bound:
+            # the O(N)-bound was calculated and determined significance
+            pval = ON_bound
+        else:
+            pval = O1_bound
+
+        # step 3: calculate the exact p-value (if required)
+        if self._exact_pval_mode == EXACT_PVAL_ALWAYS or \
+                is_significant == -1 or \
+                (self._exact_pval_mode == EXACT_PVAL_IF_SIGNIFICANT and
+                    is_significant == 1):
+            if self.table.shape[0] < K+1:
+                self.table = np.empty((K+1, self.table.shape[1]),
+                                      dtype=np.longdouble)
+            if not self.use_alg1:
+                # PVAL2 in double precision, repeated in long double
+                # precision if the result is not valid (see
+                # `get_xlmhg_pval2_double`)
+                if self.double_table.shape[0] < 2*(K+1):
+                    self.double_table = np.empty(2*(K+1), dtype=np.float64)
+                pval = <double>_get_xlmhg_pval2(N, K, X, L, stat,
+                                                &self.double_table[0], tol,
+                                                &cells)
+                if not pval >= MIN_DOUBLE_PVAL or \
+                        (pval > O1_bound and is_equal(pval, O1_bound, tol) == 0):
+                    pval = <double>_get_xlmhg_pval2(N, K, X, L, stat,
+                                                    &self.table[0,0], tol,
+                                                    &cells)
+            else:
+                pval = <double>_get_xlmhg_pval1(N, K, X, L, stat, self.table,
+                                                tol, &cells)
+
+        if pval != pval or pval <= 0 or \
+                (pval > O1_bound and is_equal(pval, O1_bound, tol) == 0):
+            # insufficient floating point precision for calculating p-value,
+            # report O(1)-bound instead
+            pval = O1_bound
+        # the p-value can not exceed its O(1)-bound (small rounding errors)
+        pval = min(pval, O1_bound)
+
+        return stat, cutoff, pval
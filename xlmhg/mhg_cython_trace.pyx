@@ -0,0 +1,16 @@
+# Copyright (c) 2015-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+#cython: profile=True, linetrace=True, binding=True, wraparound=False, boundscheck=False, cdivision=True
+
+"""XL-mHG Cython implementation with profiling and line tracing enabled.
+
+This module is compiled from the same source as `mhg_cython`, but with the
+``profile`` and ``linetrace`` directives turned on, so that tools like
+cProfile and line_profiler can see into the kernels. It is much slower than
+`mhg_cython` and only used when explicitly selected
+(see `xlmhg.use_traced_extension`).
+"""
+
+include "mhg_cython.pyx"
@@ -0,0 +1,222 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Bit-packed gene set membership matrices."""
+
+import numpy as np
+
+from . import extension
+from .batch import BatchStats
+
+
+def pack_gene_sets(gene_sets, num_genes):
+    """Create a bit-packed membership matrix for a collection of gene sets.
+
+    The matrix has one row per gene set, and one bit per gene, in the layout
+    used by `numpy.packbits` (with the default ``bitorder='big'``). That is,
+    gene g belongs to the i-th gene set if bit ``7 - g % 8`` of
+    ``packed[i, g // 8]`` is set, and ``numpy.unpackbits(packed, axis=1)``
+    recovers the (unpacked) membership matrix. Since each member gene only
+    requires one bit (instead of 16 bits for a uint16 index), this
+    representation uses less memory than index arrays for all gene sets that
+    contain more than 1/16 of the genes.
+
+    Parameters
+    ----------
+    gene_sets: list of 1-dim `numpy.ndarray` of integers
+        For each gene set, the indices of the genes in the set.
+    num_genes: int
+        The total number of genes.
+
+    Returns
+    -------
+    2-dim `numpy.ndarray` with ``dtype`` = numpy.uint8
+        The bit-packed membership matrix (with ``(num_genes + 7) // 8``
+        columns).
+    """
+    assert isinstance(gene_sets, (list, tuple))
+    assert isinstance(num_genes, (int, np.integer))
+
+    if not num_genes >= 0:
+        raise ValueError('Invalid value num_genes=%d; should be >= 0.'
+                         % num_genes)
+
+    packed = np.zeros((len(gene_sets), (num_genes + 7) // 8), dtype=np.uint8)
+    for i, genes in enumerate(gene_sets):
+        genes = np.asarray(genes)
+        assert genes.ndim == 1 and (genes.size == 0 or
+                                    np.issubdtype(genes.dtype, np.integer))
+        genes = genes.astype(np.int64)
+        if genes.size > 0 and \
+                (genes.min() < 0 or genes.max() >= num_genes):
+            raise ValueError('Gene set %d contains invalid gene indices; '
+                             'they should be >= 0 and < %d.'
+                             % (i, num_genes))
+        np.bitwise_or.at(packed[i], genes >> 3,
+                         (0x80 >> (genes & 7)).astype(np.uint8))
+    return packed
+
+
+def _check_packed_args(packed, ranking):
+    """Check a bit-packed membership matrix and a ranking.
+
+    Returns the ranking as a C-contiguous `numpy.ndarray` of C ints.
+    """
+    assert isinstance(packed, np.ndarray) and packed.ndim == 2 and \
+        np.issubdtype(packed.dtype, np.uint8)
+    assert isinstance(ranking, np.ndarray) and ranking.ndim == 1 and \
+        np.issubdtype(ranking.dtype, np.integer)
+
+    if not packed.flags.c_contiguous:
+        raise ValueError('Array is not C-contiguous! Try '
+                         '"np.ascontiguousarray()".')
+    if ranking.size > 65536:
+        raise ValueError('Length of list cannot exceed 65536.')
+    num_genes = 8 * packed.shape[1]
+    if ranking.size > 0 and \
+            (ranking.min() < 0 or ranking.max() >= num_genes):
+        raise ValueError('The ranking contains invalid gene indices; they '
+                         'should be >= 0 and < %d.' % num_genes)
+    if np.unique(ranking).size < ranking.size:
+        raise ValueError('The ranking contains duplicate gene indices.')
+
+    return np.ascontiguousarray(ranking, dtype=np.intc)
+
+
+def get_ranked_packed(packed, ranking):
+    """Reorder the columns of a bit-packed membership matrix by rank.
+
+    Parameters
+    ----------
+    packed: 2-dim `numpy.ndarray` with ``dtype`` = numpy.uint8
+        The bit-packed membership matrix (see `pack_gene_sets`).
+    ranking: 1-dim `numpy.ndarray` of integers
+        The indices of the genes in the ranked list, in order of their rank.
+        (Let N denote the length of the ranking.)
+
+    Returns
+    -------
+    2-dim `numpy.ndarray` with ``dtype`` = numpy.uint8
+        A bit-packed matrix with ``(N + 7) // 8`` columns, in which bit n
+        of each row indicates whether the n-th gene in the ranked list is a
+        member of the gene set (i.e., whether it is a "1" in the ranked list).
+    """
+    ranking = _check_packed_args(packed, ranking)
+    N = ranking.size
+    ranked = np.empty((packed.shape[0], (N + 7) // 8), dtype=np.uint8)
+    extension.mhg_cython.get_ranked_packed(packed, ranking, ranked)
+    return ranked
+
+
+def get_packed_indices(ranked, i, N):
+    """Get the indices of the 1's in one row of a rank-ordered bit-packed
+    matrix (see `get_ranked_packed`), e.g., for `get_xlmhg_test_result`.
+
+    Returns
+    -------
+    1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        Sorted list of indices corresponding to the "1"s in the ranked list.
+    """
+    assert isinstance(ranked, np.ndarray) and ranked.ndim == 2 and \
+        np.issubdtype(ranked.dtype, np.uint8)
+    return np.uint16(np.nonzero(np.unpackbits(ranked[i], count=N))[0])
+
+
+def get_packed_counts(ranked, n):
+    """Count the 1's above cutoff ``n`` in each row of a rank-ordered
+    bit-packed matrix (see `get_ranked_packed`).
+
+    The counts are obtained with a population count over the packed 64-bit
+    words that precede the cutoff, without unpacking the matrix.
+
+    Returns
+    -------
+    1-dim `numpy.ndarray` with ``dtype`` = numpy.int64
+        The number of 1's among the first ``n`` elements of each list.
+    """
+    assert isinstance(ranked, np.ndarray) and ranked.ndim == 2 and \
+        np.issubdtype(ranked.dtype, np.uint8)
+    assert isinstance(n, (int, np.integer))
+
+    if not ranked.flags.c_contiguous:
+        raise ValueError('Array is not C-contiguous! Try '
+                         '"np.ascontiguousarray()".')
+    if not (0 <= n <= 8 * ranked.shape[1]):
+        raise ValueError('Invalid value n=%d; should be >= 0 and <= %d.'
+                         % (n, 8 * ranked.shape[1]))
+
+    counts = np.empty(ranked.shape[0], dtype=np.int64)
+    extension.mhg_cython.get_packed_counts(ranked, n, counts)
+    return counts
+
+
+def get_xlmhg_packed_stats(packed, ranking, X=None, L=None, tol=1e-12):
+    """Calculate XL-mHG test statistics for all gene sets of a bit-packed
+    membership matrix.
+
+    For each gene set, the ranked list is obtained by marking the members of
+    the gene set in the ranking. The test statistics are calculated directly
+    from the bit-packed matrix (after reordering its columns by rank), so
+    no index arrays have to be stored for the gene sets. The results are
+    identical to those of `get_xlmhg_batch_stats`.
+
+    Parameters
+    ----------
+    packed: 2-dim `numpy.ndarray` with ``dtype`` = numpy.uint8
+        The bit-packed membership matrix (see `pack_gene_sets`).
+    ranking: 1-dim `numpy.ndarray` of integers
+        The indices of the genes in the ranked list, in order of their rank.
+        Genes that do not appear in the ranking are ignored. (Let N denote
+        the length of the ranking.)
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `BatchStats`
+        The number of 1's, test statistic, cutoff and O(1)-bound for each
+        gene set.
+    """
+    if X is not None:
+        assert isinstance(X, (int, np.integer))
+    if L is not None:
+        assert isinstance(L, (int, np.integer))
+    assert isinstance(tol, (float, np.floating))
+
+    ranking = _check_packed_args(packed, ranking)
+    N = ranking.size
+
+    # assign default values, if None
+    if X is None:
+        X = 0
+    if L is None:
+        L = N
+
+    ### check whether parameter values are in range
+    if not (0 <= X <= N):
+        raise ValueError(
+            'Invalid value X=%d; should be >= 0 and <= %d.' % (X, N)
+        )
+    if not (0 <= L <= N):
+        raise ValueError(
+            'Invalid value L=%d; should be >= 0 and <= %d.' % (L, N)
+        )
+    if not (0.0 <= tol < 1.0):
+        raise ValueError('Invalid value tol=%.1e; should be in [0,1).' % tol)
+
+    num_tests = packed.shape[0]
+    ranked = np.empty((num_tests, (N + 7) // 8), dtype=np.uint8)
+    extension.mhg_cython.get_ranked_packed(packed, ranking, ranked)
+
+    K = np.empty(num_tests, dtype=np.int64)
+    stat = np.empty(num_tests, dtype=np.float64)
+    cutoff = np.empty(num_tests, dtype=np.int64)
+    O1_bound = np.empty(num_tests, dtype=np.float64)
+    extension.mhg_cython.get_xlmhg_stat_packed(
+        ranked, N, int(X), int(L), K, stat, cutoff, O1_bound, tol)
+    return BatchStats(K, stat, cutoff, O1_bound)
@@ -0,0 +1,234 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Monte Carlo permutation tests based on the XL-mHG test statistic."""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from math import erf, sqrt
+import logging
+
+import numpy as np
+
+from . import extension
+from .test import _check_test_args
+
+logger = logging.getLogger(__name__)
+
+# the maximum number of random numbers drawn at a time by `get_random_subsets`
+# (for large subsets)
+_MAX_CHUNK_NUMBERS = 2**22
+
+PermutationResult = namedtuple(
+    'PermutationResult',
+    ['stat', 'pval', 'ci_low', 'ci_high', 'num_perm', 'num_extreme',
+     'stopped_early'])
+PermutationResult.__doc__ = """The result of an XL-mHG permutation test.
+
+``stat`` is the observed XL-mHG test statistic. ``pval`` is the empirical
+p-value, ``(num_extreme + 1) / (num_perm + 1)``, where ``num_extreme`` is the
+number of permutations with a test statistic at least as extreme as the
+observed one. ``ci_low`` and ``ci_high`` are the bounds of the Wilson score
+confidence interval for the p-value (calculated for the same estimator, i.e.,
+with the observed list counted as one of the permutations). ``stopped_early`` indicates whether the
+test was stopped before ``num_perm`` reached the requested number of
+permutations.
+"""
+
+
+def _get_normal_quantile(q):
+    """Calculate a quantile of the standard normal distribution (q > 0.5).
+
+    Uses bisection on the cumulative distribution function."""
+    low, high = 0.0, 40.0
+    for _ in range(100):
+        mid = (low + high) / 2.0
+        if 0.5 * (1.0 + erf(mid / sqrt(2.0))) < q:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+def _get_wilson_interval(k, n, z):
+    """Calculate the Wilson score interval for a binomial proportion."""
+    if n == 0:
+        return 0.0, 1.0
+    p = k / float(n)
+    denom = 1.0 + z**2 / n
+    center = (p + z**2 / (2.0 * n)) / denom
+    half_width = z * sqrt(p * (1.0 - p) / n + z**2 / (4.0 * n**2)) / denom
+    return max(center - half_width, 0.0), min(center + half_width, 1.0)
+
+
+def get_random_subsets(rng, N, K, size):
+    """Draw random K-subsets of {0, ..., N-1}.
+
+    Parameters
+    ----------
+    rng: `numpy.random.Generator`
+        The random number generator.
+    N: int
+        The size of the set to draw from.
+    K: int
+        The size of each subset.
+    size: int
+        The number of subsets.
+
+    Returns
+    -------
+    2-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        The subsets (one per row), with the elements of each subset sorted in
+        increasing order.
+    """
+    if K == 0 or K == N:
+        ind = np.tile(np.arange(K), (size, 1))
+    elif K * K <= N:
+        # duplicates are rare: draw indices with replacement and redraw the
+        # subsets that contain duplicates
+        ind = rng.integers(0, N, size=(size, K))
+        ind.sort(axis=1)
+        redraw = np.nonzero(np.any(ind[:, 1:] == ind[:, :-1], axis=1))[0]
+        while redraw.size > 0:
+            sel = rng.integers(0, N, size=(redraw.size, K))
+            sel.sort(axis=1)
+            ind[redraw] = sel
+            redraw = redraw[np.any(sel[:, 1:] == sel[:, :-1], axis=1)]
+    else:
+        # the K elements with the smallest random keys form a random subset;
+        # process the subsets in chunks to limit the memory used for the keys
+        ind = np.empty((size, K), dtype=np.int64)
+        chunk_size = max(_MAX_CHUNK_NUMBERS // N, 1)
+        for i in range(0, size, chunk_size):
+            keys = rng.random((min(chunk_size, size - i), N))
+            ind[i:(i+chunk_size)] = \
+                np.argpartition(keys, K - 1, axis=1)[:, :K]
+        ind.sort(axis=1)
+    return np.ascontiguousarray(ind, dtype=np.uint16)
+
+
+def _run_batch(seed_seq, N, K, X, L, size, tol):
+    """Worker function: Calculate the test statistics for a batch of random
+    lists."""
+    rng = np.random.Generator(np.random.PCG64(seed_seq))
+    ind = get_random_subsets(rng, N, K, size)
+    stats = np.empty(size, dtype=np.float64)
+    extension.mhg_cython.get_xlmhg_stat_matrix(ind, N, X, L, stats, tol)
+    return stats
+
+
+def get_xlmhg_permutation_pval(N, indices, X=None, L=None, num_perm=10000,
+                               batch_size=1000, pval_thresh=None,
+                               confidence=0.99, seed=None, num_threads=1,
+                               tol=1e-12):
+    """Estimate the XL-mHG p-value using random permutations.
+
+    The permuted lists are represented by random K-subsets of {0, ..., N-1},
+    which are drawn in batches. Each batch uses its own random number
+    generator, which is seeded from a `numpy.random.SeedSequence` derived
+    from ``seed``. Therefore, the result only depends on ``seed``, and not on
+    the number of threads used. The test statistics of each batch are
+    calculated in a single call to the C extension (without holding the GIL).
+
+    If ``pval_thresh`` is specified, the test stops as soon as the confidence
+    interval for the p-value no longer contains ``pval_thresh``.
+
+    Parameters
+    ----------
+    N: int
+        The length of the list.
+    indices: 1-dim `numpy.ndarray` with an integer ``dtype``
+        Sorted list of indices corresponding to the "1"s in the ranked list.
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    num_perm: int, optional
+        The (maximum) number of permutations. [10000]
+    batch_size: int, optional
+        The number of permutations per batch. [1000]
+    pval_thresh: float, optional
+        The significance threshold used for stopping early. [None]
+    confidence: float, optional
+        The confidence level of the confidence interval. [0.99]
+    seed: int or `numpy.random.SeedSequence`, optional
+        The seed for the random number generators. [None]
+    num_threads: int, optional
+        The number of threads used to process batches in parallel. [1]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `PermutationResult`
+        The observed test statistic, the empirical p-value and its confidence
+        interval.
+    """
+    assert isinstance(num_perm, (int, np.integer))
+    assert isinstance(batch_size, (int, np.integer))
+    assert isinstance(confidence, (float, np.floating))
+    assert isinstance(num_threads, (int, np.integer))
+
+    X, L = _check_test_args(N, indices, X, L, 'always', pval_thresh, None,
+                            None, False, tol)
+    if not num_perm >= 0:
+        raise ValueError('Invalid value num_perm=%d; should be >= 0.'
+                         % num_perm)
+    if not batch_size >= 1:
+        raise ValueError('Invalid value batch_size=%d; should be >= 1.'
+                         % batch_size)
+    if not (0.0 < confidence < 1.0):
+        raise ValueError('Invalid value confidence=%.2f; should be in (0,1).'
+                         % confidence)
+    if not num_threads >= 1:
+        raise ValueError('Invalid value num_threads=%d; should be >= 1.'
+                         % num_threads)
+
+    indices = np.ascontiguousarray(indices, dtype=np.uint16)
+    K = indices.size
+    stat, _ = extension.mhg_cython.get_xlmhg_stat(indices, N, K, X, L, tol)
+    stat = float(stat)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    batch_sizes = [min(batch_size, num_perm - start)
+                   for start in range(0, num_perm, batch_size)]
+    seed_seqs = seed.spawn(len(batch_sizes))
+    z = _get_normal_quantile(1.0 - (1.0 - confidence) / 2.0)
+
+    n = 0
+    b = 0
+    ci_low, ci_high = 0.0, 1.0
+    stopped_early = False
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        # process the batches in rounds of `num_threads` batches
+        for start in range(0, len(batch_sizes), num_threads):
+            stop = min(start + num_threads, len(batch_sizes))
+            futures = [executor.submit(_run_batch, seed_seqs[i], N, K, X, L,
+                                       batch_sizes[i], tol)
+                       for i in range(start, stop)]
+            for i, future in zip(range(start, stop), futures):
+                perm_stats = future.result()
+                n += perm_stats.size
+                b += int(np.sum(
+                    (perm_stats < stat) |
+                    (np.abs(perm_stats - stat) <=
+                     tol * np.maximum(perm_stats, stat))))
+                # the interval for the reported p-value (b+1)/(n+1)
+                ci_low, ci_high = _get_wilson_interval(b + 1, n + 1, z)
+                if pval_thresh is not None and \
+                        (ci_high < pval_thresh or ci_low > pval_thresh) and \
+                        i < len(batch_sizes) - 1:
+                    stopped_early = True
+                    break
+            if stopped_early:
+                for future in futures:
+                    future.cancel()
+                break
+
+    pval = (b + 1) / float(n + 1)
+    logger.debug('Permutation test: %d of %d permutations at least as '
+                 'extreme (p=%.2e).', b, n, pval)
+    return PermutationResult(stat, pval, ci_low, ci_high, n, b,
+                             stopped_early)
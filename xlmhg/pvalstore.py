@@ -0,0 +1,281 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""A persistent store of exact XL-mHG p-values, shared across runs.
+
+The exact p-value only depends on N, K, X, L, and the test statistic (and on
+the tolerance and algorithm used to calculate it), so the same p-values are
+often calculated again and again when the same ranked lists and gene sets are
+tested repeatedly. The store keeps these p-values in an SQLite database in a
+cache directory, where they are looked up before the dynamic programming
+algorithm is run, and added after it has been run.
+
+The store is disabled by default, unless the environment variable
+``XLMHG_PVAL_STORE`` is set to the path of a cache directory, or
+`use_pval_store` is called. It can be used by several processes (and hosts,
+if the filesystem supports SQLite locking) at the same time. Each version of
+XL-mHG uses a separate database file, so that p-values calculated by a
+different implementation of the kernels are never reused.
+
+The database is only opened when it is first used. If it cannot be opened
+(e.g., because the cache directory is not writable), a warning is logged and
+the store is disabled, so that the p-values are simply calculated.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from . import extension
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+STORE_ENV_VAR = 'XLMHG_PVAL_STORE'
+
+# Increment whenever the p-value kernels (PVAL1 and PVAL2 in mhg_cython.pyx
+# and mhg.py) change in a way that can affect their results. Each revision
+# uses a separate database file.
+KERNEL_REVISION = 2
+
+# the default maximum size of the database (in bytes)
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# the number of p-values added by a process between checks of the size
+_EVICT_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pvals (
+    N INTEGER NOT NULL,
+    K INTEGER NOT NULL,
+    X INTEGER NOT NULL,
+    L INTEGER NOT NULL,
+    stat REAL NOT NULL,
+    tol REAL NOT NULL,
+    alg TEXT NOT NULL,
+    pval REAL NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (N, K, X, L, stat, tol, alg)
+);
+CREATE INDEX IF NOT EXISTS pvals_created ON pvals (created);
+"""
+
+
+def _get_version_key():
+    from . import __version__
+    return '%s-k%d' % (__version__, KERNEL_REVISION)
+
+
+class PvalStore(object):
+    """A persistent store of exact XL-mHG p-values (see module docstring).
+
+    When the database grows larger than ``max_size``, the oldest p-values
+    are removed, until it is reduced to three quarters of that size.
+
+    The database is opened when it is first used. If `get` or `put` fail to
+    open it, the store disables itself (i.e., `get` returns None and `put`
+    does nothing).
+
+    Parameters
+    ----------
+    cache_dir: str
+        The cache directory (created if it does not exist).
+    max_size: int, optional
+        The maximum size of the database, in bytes. [256 MB]
+    timeout: float, optional
+        The number of seconds to wait for locks held by other processes. If
+        the database remains locked, the store is skipped. [10.0]
+
+    Attributes
+    ----------
+    path: str
+        The path of the database file.
+    enabled: bool
+        False if the database could not be opened.
+    """
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE, timeout=10.0):
+        assert isinstance(cache_dir, str)
+        assert isinstance(max_size, int)
+        assert isinstance(timeout, (int, float))
+        if not max_size > 0:
+            raise ValueError('Invalid value max_size=%d; should be > 0.'
+                             % max_size)
+
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir,
+                                 'pvals-%s.sqlite3' % _get_version_key())
+        self.max_size = max_size
+        self.timeout = float(timeout)
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._num_added = 0
+
+    def __repr__(self):
+        return '<%s object (%s)>' % (self.__class__.__name__, self.path)
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM pvals').fetchone()[0]
+
+    def _connect(self):
+        """Return the connection of this process (connections must not be
+        shared with child processes)."""
+        if self._pid != os.getpid():
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.executescript(_SCHEMA)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._conn = conn
+            self._pid = os.getpid()
+            self._num_added = 0
+        return self._conn
+
+    @staticmethod
+    def _get_alg(alg):
+        # results of the pure Python implementation are stored separately
+        name = extension.mhg_cython.__name__.rsplit('.', 1)[-1]
+        return alg if name.startswith('mhg_cython') else 'python.' + alg
+
+    def get(self, N, K, X, L, stat, tol, alg):
+        """Look up an exact p-value.
+
+        Parameters
+        ----------
+        N, K, X, L, stat, tol
+            The parameters of the test.
+        alg: str
+            The algorithm used for calculating the p-value ("pval1" or
+            "pval2").
+
+        Returns
+        -------
+        float or None
+            The p-value, or None if it is not stored.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT pval FROM pvals WHERE N=? AND K=? AND X=? AND '
+                    'L=? AND stat=? AND tol=? AND alg=?',
+                    (int(N), int(K), int(X), int(L), float(stat), float(tol),
+                     self._get_alg(alg))).fetchone()
+        except (sqlite3.Error, OSError) as err:
+            self._handle_error(err)
+            return None
+
+        if metrics.registry.enabled:
+            metrics.registry.increment('pval_store.hits' if row is not None
+                                       else 'pval_store.misses')
+        return None if row is None else row[0]
+
+    def put(self, N, K, X, L, stat, tol, alg, pval):
+        """Add an exact p-value (see `get`)."""
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR IGNORE INTO pvals VALUES (?,?,?,?,?,?,?,?,?)',
+                    (int(N), int(K), int(X), int(L), float(stat), float(tol),
+                     self._get_alg(alg), float(pval), time.time()))
+                self._num_added += 1
+                if self._num_added % _EVICT_INTERVAL == 0:
+                    self._evict(conn)
+        except (sqlite3.Error, OSError) as err:
+            self._handle_error(err)
+
+    def _handle_error(self, err):
+        if self._conn is None or self._pid != os.getpid():
+            # the database could not be opened
+            logger.warning('Could not open the p-value store "%s" (%s); '
+                           'the store is disabled.', self.path, err)
+            self.enabled = False
+        else:
+            # e.g., the database remained locked
+            logger.warning('Could not access the p-value store: %s', err)
+
+    def _get_size(self, conn):
+        """Determine the size of the database (excluding free pages)."""
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _evict(self, conn):
+        """Remove the oldest p-values if the database is too large."""
+        size = self._get_size(conn)
+        if size <= self.max_size:
+            return
+        num_rows = conn.execute('SELECT COUNT(*) FROM pvals').fetchone()[0]
+        num_remove = int(num_rows * (1.0 - 0.75 * self.max_size / size)) + 1
+        conn.execute('DELETE FROM pvals WHERE rowid IN (SELECT rowid FROM '
+                     'pvals ORDER BY created LIMIT ?)', (num_remove, ))
+        logger.info('Removed %d of %d p-values from the p-value store '
+                    '(%.1f MB).', num_remove, num_rows, size / 1e6)
+
+    def evict(self):
+        """Remove the oldest p-values if the database is too large.
+
+        This is also done automatically while p-values are added."""
+        with self._lock:
+            self._evict(self._connect())
+
+    def clear(self):
+        """Remove all p-values."""
+        with self._lock:
+            self._connect().execute('DELETE FROM pvals')
+
+    def close(self):
+        """Close the database connection (of this process)."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+
+def use_pval_store(cache_dir, max_size=DEFAULT_MAX_SIZE):
+    """Enable (or disable) the persistent p-value store.
+
+    Parameters
+    ----------
+    cache_dir: str or None
+        The cache directory. If None, the store is disabled.
+    max_size: int, optional
+        The maximum size of the database, in bytes. [256 MB]
+
+    Returns
+    -------
+    `PvalStore` or None
+        The store that is now used by the test functions.
+    """
+    global store
+    if store is not None:
+        store.close()
+    store = None if cache_dir is None else PvalStore(cache_dir, max_size)
+    return store
+
+
+store = None
+"""The process-wide p-value store used by the test functions (or None)."""
+
+if os.environ.get(STORE_ENV_VAR):
+    # the database is only opened when it is first used
+    store = PvalStore(os.environ[STORE_ENV_VAR])
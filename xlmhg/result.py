@@ -4,20 +4,12 @@
 
 """Contains the `mHGResult` class."""
 
-import sys
 import hashlib
 import logging
 
 import numpy as np
 
-try:
-    # This is a duct-tape fix for the Google App Engine, on which importing
-    # the C extension fails.
-    from . import mhg_cython
-except ImportError:
-    print('Warning (xlmhg): Failed to import "mhg_cython" C extension.',
-          file=sys.stderr)
-    from . import mhg as mhg_cython
+from . import extension
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +42,14 @@ class mHGResult(object):
         See :attr:`escore_pval_thresh` attribute.
     escore_tol: float, optional
         See :attr:`escore_tol` attribute.
+    tier: str, optional
+        See :attr:`tier` attribute.
+    dp_cells: int, optional
+        See :attr:`dp_cells` attribute.
+    time: float, optional
+        See :attr:`time` attribute.
+    pval_error: float, optional
+        See :attr:`pval_error` attribute.
 
     Attributes
     ----------
@@ -73,9 +73,26 @@ class mHGResult(object):
         The user-specified p-value threshold used in the E-score calculation.
     escore_tol: float or None
         The floating point tolerance used in the E-score calculation.
+    tier: str or None
+        The step of the test that determined the reported p-value: "trivial"
+        (the test statistic was 0 or 1), "stat" (the test statistic exceeded
+        the significance threshold), "O1_bound" or "ON_bound" (the O(1)- or
+        O(N)-bound was sufficient), "pval1" or "pval2" (the exact p-value was
+        calculated using PVAL1 or PVAL2), "O1_fallback" (the exact
+        p-value calculation failed due to insufficient floating point
+        precision, and the O(1)-bound was reported instead), or "approx" (the
+        p-value was approximated).
+    dp_cells: int or None
+        The number of dynamic programming table cells visited.
+    time: float or None
+        The wall time (in seconds) required to perform the test.
+    pval_error: float or None
+        For approximate p-values, the maximum absolute error of the
+        approximation (based on the lower and upper bounds of the p-value).
     """
     def __init__(self, N, indices, X, L, stat, cutoff, pval,
-                 pval_thresh=None, escore_pval_thresh=None, escore_tol=None):
+                 pval_thresh=None, escore_pval_thresh=None, escore_tol=None,
+                 tier=None, dp_cells=None, time=None, pval_error=None):
 
         assert isinstance(N, int)
         assert isinstance(indices, np.ndarray) and indices.ndim == 1 and \
@@ -92,6 +109,14 @@ class mHGResult(object):
             assert isinstance(escore_pval_thresh, float)
         if escore_tol is not None:
             assert isinstance(escore_tol, float)
+        if tier is not None:
+            assert isinstance(tier, str)
+        if dp_cells is not None:
+            assert isinstance(dp_cells, int)
+        if time is not None:
+            assert isinstance(time, float)
+        if pval_error is not None:
+            assert isinstance(pval_error, float)
 
         self.indices = indices
         self.N = N
@@ -103,6 +128,10 @@ class mHGResult(object):
         self.pval_thresh = pval_thresh
         self.escore_pval_thresh = escore_pval_thresh
         self.escore_tol = escore_tol
+        self.tier = tier
+        self.dp_cells = dp_cells
+        self.time = time
+        self.pval_error = pval_error
 
     def __repr__(self):
         return '<%s object (N=%d, K=%d, pval=%.1e, hash="%s")>' \
@@ -164,9 +193,68 @@ class mHGResult(object):
     @property
     def escore(self):
         """(property) Returns the E-score associated with the result."""
+        mhg_cython = extension.mhg_cython
         hg_pval_thresh = self.escore_pval_thresh or self.pval
         escore_tol = self.escore_tol or mhg_cython.get_default_tol()
         es = mhg_cython.get_xlmhg_escore(
             self.indices, self.N, self.K, self.X, self.L,
             hg_pval_thresh, escore_tol)
-        return es
\ No newline at end of file
+        return es
+
+
+class mHGPairedResult(object):
+    """The results of XL-mHG tests for both ends of a list.
+
+    This class is used by the `get_xlmhg_bidirectional_result` function to
+    represent the results of testing a list for enrichment at the top and at
+    the bottom.
+
+    Parameters
+    ----------
+    top: `mHGResult`
+        See :attr:`top` attribute.
+    bottom: `mHGResult`
+        See :attr:`bottom` attribute.
+
+    Attributes
+    ----------
+    top: `mHGResult`
+        The result of the test for enrichment at the top of the list.
+    bottom: `mHGResult`
+        The result of the test for enrichment at the bottom of the list
+        (i.e., at the top of the reversed list).
+    """
+    def __init__(self, top, bottom):
+
+        assert isinstance(top, mHGResult)
+        assert isinstance(bottom, mHGResult)
+
+        self.top = top
+        self.bottom = bottom
+
+    def __repr__(self):
+        return '<%s object (N=%d, K=%d, top_pval=%.1e, bottom_pval=%.1e)>' \
+               % (self.__class__.__name__,
+                  self.top.N, self.top.K, self.top.pval, self.bottom.pval)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        elif type(self) == type(other):
+            return self.top == other.top and self.bottom == other.bottom
+        else:
+            return NotImplemented
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __iter__(self):
+        return iter((self.top, self.bottom))
+
+    @property
+    def pval(self):
+        """(property) Returns the smaller of the two p-values."""
+        return min(self.top.pval, self.bottom.pval)
@@ -0,0 +1,270 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Streaming XL-mHG tests for large collections of gene sets and rankings.
+
+The functions in this module are generators, so that collections of gene
+sets (in GMT format) and ranked lists that do not fit into memory can be
+tested against each other. Memory use is bounded by the number of gene sets
+that are processed together (``chunk_size``) and by the length of the ranked
+lists, but not by the size of the collections.
+"""
+
+from collections import namedtuple
+from collections.abc import Iterator
+import gzip
+import io
+import itertools
+import logging
+
+import numpy as np
+
+from .batch import get_xlmhg_batch_stats, get_xlmhg_batch_results
+from .geneset import GeneSetIndex
+
+logger = logging.getLogger(__name__)
+
+StreamResult = namedtuple(
+    'StreamResult',
+    ['ranking', 'gene_set', 'N', 'K', 'X', 'L', 'stat', 'cutoff', 'pval',
+     'tier'])
+StreamResult.__doc__ = """The result of a single test in a streaming job.
+
+``ranking`` and ``gene_set`` are the names of the ranked list and of the gene
+set. ``K`` is the number of genes of the gene set that are contained in the
+ranked list. ``tier`` describes how the p-value was determined (see
+`mHGResult`).
+"""
+
+_RESULT_HEADER = '\t'.join(StreamResult._fields)
+
+
+def _open_text(path_or_file, mode='r'):
+    """Open a (possibly gzip-compressed) text file.
+
+    File objects are returned unchanged (and are not closed by the caller).
+    """
+    if not isinstance(path_or_file, str):
+        return path_or_file, False
+    if path_or_file.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path_or_file, mode + 'b'),
+                                encoding='UTF-8'), True
+    return open(path_or_file, mode, encoding='UTF-8'), True
+
+
+def read_gmt(path_or_file):
+    """Read gene sets from a GMT file, one at a time.
+
+    Each (non-empty) line of a GMT file contains the name of a gene set, a
+    description, and the identifiers of the genes in the set, separated by
+    tabs. Files ending in ".gz" are decompressed on the fly.
+
+    Parameters
+    ----------
+    path_or_file: str or file object
+        The path of the GMT file, or an open (text) file.
+
+    Yields
+    ------
+    name: str
+        The name of the gene set.
+    description: str
+        The description of the gene set.
+    genes: list of str
+        The identifiers of the genes in the gene set.
+    """
+    f, close = _open_text(path_or_file)
+    try:
+        for i, line in enumerate(f):
+            fields = line.rstrip('\r\n').split('\t')
+            if fields == ['']:
+                continue
+            if len(fields) < 2:
+                raise ValueError('Invalid GMT file: Line %d contains less '
+                                 'than two fields.' % (i + 1))
+            yield fields[0], fields[1], [g for g in fields[2:] if g]
+    finally:
+        if close:
+            f.close()
+
+
+def read_ranked_lists(path_or_file):
+    """Read ranked lists of genes, one at a time.
+
+    Each (non-empty) line of the file contains the name of a ranked list,
+    followed by the gene identifiers in order of their rank, separated by
+    tabs. Files ending in ".gz" are decompressed on the fly.
+
+    Parameters
+    ----------
+    path_or_file: str or file object
+        The path of the file, or an open (text) file.
+
+    Yields
+    ------
+    name: str
+        The name of the ranked list.
+    genes: list of str
+        The gene identifiers, in order of their rank.
+    """
+    f, close = _open_text(path_or_file)
+    try:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if fields == ['']:
+                continue
+            yield fields[0], [g for g in fields[1:] if g]
+    finally:
+        if close:
+            f.close()
+
+
+def iter_chunks(iterable, chunk_size):
+    """Group the items of an iterable into lists of ``chunk_size`` items
+    (the last list can be shorter)."""
+    assert isinstance(chunk_size, (int, np.integer))
+    if not chunk_size >= 1:
+        raise ValueError('Invalid value chunk_size=%d; should be >= 1.'
+                         % chunk_size)
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_items(items, reader):
+    """Iterate over a file (using ``reader``) or a re-iterable collection."""
+    if isinstance(items, str):
+        return reader(items)
+    return iter(items)
+
+
+def iter_xlmhg_results(gene_sets, rankings, X=None, L=None,
+                       exact_pval='always', pval_thresh=None,
+                       stats_only=False, chunk_size=1000, tol=1e-12):
+    """Test all gene sets against all ranked lists, one chunk at a time.
+
+    The gene sets are read in chunks of ``chunk_size`` gene sets. For each
+    chunk, a `GeneSetIndex` is built, and the ranked lists are read one at a
+    time (i.e., they are read once per chunk). The indices of all gene sets
+    in the chunk are determined in a single vectorized operation per ranked
+    list, and the tests are performed using `get_xlmhg_batch_results` (so
+    that gene sets with identical indices are only tested once). Only one
+    chunk of gene sets and one ranked list are held in memory at any
+    time.
+
+    Parameters
+    ----------
+    gene_sets: str or list
+        The path of a GMT file (see `read_gmt`), or a list of (name,
+        description, genes) tuples.
+    rankings: str or list
+        The path of a file with ranked lists (see `read_ranked_lists`), or a
+        list of (name, genes) tuples. This is iterated over once per chunk,
+        so it cannot be a generator.
+    X: int, optional
+        The ``X`` parameter. If it exceeds the length of a ranked list, the
+        length of the list is used instead (the test statistic of all gene
+        sets is then 1.0 by definition). [0]
+    L: int, optional
+        The ``L`` parameter. If it exceeds the length of a ranked list, the
+        length of the list is used instead. [N]
+    exact_pval: str, enumerated
+        See `get_xlmhg_test_result`. ['always']
+    pval_thresh: float, optional
+        See `get_xlmhg_test_result`. [None]
+    stats_only: bool, optional
+        If True, only the test statistics and O(1)-bounds are calculated
+        (using `get_xlmhg_batch_stats`), and the O(1)-bound is reported
+        instead of the p-value (with tier "O1_bound"). [False]
+    chunk_size: int, optional
+        The number of gene sets that are processed together. [1000]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Yields
+    ------
+    `StreamResult`
+        The result of each test. The results are ordered by chunk, then by
+        ranked list, and then by gene set.
+    """
+    if X is not None:
+        assert isinstance(X, (int, np.integer))
+    if L is not None:
+        assert isinstance(L, (int, np.integer))
+    assert isinstance(stats_only, (bool, np.bool_))
+    # the ranked lists are read once per chunk
+    assert not isinstance(rankings, Iterator)
+
+    for chunk in iter_chunks(_iter_items(gene_sets, read_gmt), chunk_size):
+        names = [gs[0] for gs in chunk]
+        index = GeneSetIndex([gs[2] for gs in chunk], names=names)
+        del chunk
+        num_rankings = 0
+        for ranking_name, ranking in _iter_items(rankings, read_ranked_lists):
+            num_rankings += 1
+            N = len(ranking)
+            X_ = 0 if X is None else min(X, N)
+            L_ = N if L is None else min(L, N)
+            indices = index.get_ranked_indices(ranking)
+
+            if stats_only:
+                stats = get_xlmhg_batch_stats(N, indices, X=X_, L=L_, tol=tol)
+                for i, name in enumerate(names):
+                    yield StreamResult(
+                        ranking_name, name, N, int(stats.K[i]), X_, L_,
+                        float(stats.stat[i]), int(stats.cutoff[i]),
+                        float(stats.O1_bound[i]), 'O1_bound')
+                continue
+
+            # gene sets with identical indices are only tested once
+            results = get_xlmhg_batch_results(
+                N, indices, X=X_, L=L_, exact_pval=exact_pval,
+                pval_thresh=pval_thresh, tol=tol).results
+            for name, result in zip(names, results):
+                yield StreamResult(ranking_name, name, N, result.K, X_, L_,
+                                   result.stat, result.cutoff, result.pval,
+                                   result.tier)
+        logger.debug('Tested %d gene sets against %d ranked lists.',
+                     len(names), num_rankings)
+
+
+def _run_chunk(chunk, rankings, kwargs):
+    """Worker function: Test a chunk of gene sets against all ranked lists.
+    """
+    return list(iter_xlmhg_results(chunk, rankings, chunk_size=len(chunk),
+                                   **kwargs))
+
+
+def write_results(results, path_or_file):
+    """Write results to a tab-separated text file, as they are generated.
+
+    Parameters
+    ----------
+    results: iterable of `StreamResult`
+        The results (e.g., the generator returned by `iter_xlmhg_results`).
+    path_or_file: str or file object
+        The path of the output file, or an open (text) file. Paths ending in
+        ".gz" are compressed on the fly.
+
+    Returns
+    -------
+    int
+        The number of results written.
+    """
+    f, close = _open_text(path_or_file, 'w')
+    num_results = 0
+    try:
+        f.write(_RESULT_HEADER + '\n')
+        for r in results:
+            f.write('%s\t%s\t%d\t%d\t%d\t%d\t%r\t%d\t%r\t%s\n'
+                    % (r.ranking, r.gene_set, r.N, r.K, r.X, r.L,
+                       float(r.stat), r.cutoff, float(r.pval), r.tier))
+            num_results += 1
+    finally:
+        if close:
+            f.close()
+    return num_results
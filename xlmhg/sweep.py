@@ -0,0 +1,173 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Python API for performing XL-mHG tests for many values of X and L."""
+
+from collections import namedtuple
+import logging
+
+import numpy as np
+
+from . import extension
+from .bounds import get_xlmhg_O1_bounds
+from .test import _get_table
+
+logger = logging.getLogger(__name__)
+
+SweepResult = namedtuple('SweepResult', ['X', 'L', 'stat', 'cutoff', 'pval'])
+SweepResult.__doc__ = """The results of an XL-mHG parameter sweep.
+
+``X`` and ``L`` are the parameter values (as 1-dim arrays). ``stat``,
+``cutoff`` and ``pval`` are 2-dim arrays, with the element ``[i, j]``
+corresponding to the i-th value of X and the j-th value of L. ``pval`` is
+None if p-values were not requested.
+"""
+
+
+def get_xlmhg_sweep(N, indices, X_values, L_values, pval=True,
+                    table=None, tol=1e-12):
+    """Perform XL-mHG tests for all combinations of X and L.
+
+    The test statistics for all combinations are obtained from a single scan
+    of the list: The statistic for a given value of L is a running minimum
+    over the hypergeometric p-values at the cutoffs above L, and X only
+    masks the cutoffs with fewer than X 1's above them.
+
+    The p-values are calculated using PVAL2. For each value of X, all values
+    of L that result in the same test statistic share a single pass over the
+    dynamic programming table, since the p-value for a smaller L is an
+    intermediate result of the calculation for a larger L.
+
+    Parameters
+    ----------
+    N, int
+        The length of the list.
+    indices: 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
+        Sorted list of indices corresponding to the "1"s in the ranked list.
+    X_values: list or 1-dim `numpy.ndarray` of int
+        The values of the ``X`` parameter.
+    L_values: list or 1-dim `numpy.ndarray` of int
+        The values of the ``L`` parameter.
+    pval: bool, optional
+        Whether to calculate exact p-values. [True]
+    table: `numpy.ndarray` with ``ndim=2`` and ``dtype=numpy.longdouble``, optional
+        The dynamic programming table. Size has to be at least (K+1) x 1.
+        [None]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `SweepResult`
+        The test statistics, cutoffs and p-values for all combinations of X
+        and L.
+    """
+    # type checks
+    assert isinstance(N, (int, np.integer))
+    assert isinstance(indices, np.ndarray) and indices.ndim == 1 and\
+        np.issubdtype(indices.dtype, np.uint16)
+    assert isinstance(pval, (bool, np.bool_))
+    if table is not None:
+        assert isinstance(table, np.ndarray) and table.ndim == 2 and \
+            np.issubdtype(table.dtype, np.longdouble)
+    assert isinstance(tol, (float, np.floating))
+
+    X_values = np.atleast_1d(np.asarray(X_values))
+    L_values = np.atleast_1d(np.asarray(L_values))
+    for name, arr in [('X_values', X_values), ('L_values', L_values)]:
+        if not (arr.ndim == 1 and
+                (arr.size == 0 or np.issubdtype(arr.dtype, np.integer))):
+            raise ValueError('Invalid value for %s; should be a 1-dim array '
+                             'of integers.' % name)
+
+    ### check whether parameter values are in range
+    if not indices.flags.c_contiguous:
+        raise ValueError('Array is not C-contiguous! Try '
+                         '"np.ascontiguousarray()".')
+    if N > 65536:
+        raise ValueError(
+            'Length of list cannot exceed 65536.'
+        )
+    if np.any((X_values < 0) | (X_values > N)):
+        raise ValueError('Invalid values for X; should be >= 0 and <= %d.'
+                         % N)
+    if np.any((L_values < 0) | (L_values > N)):
+        raise ValueError('Invalid values for L; should be >= 0 and <= %d.'
+                         % N)
+    if not (0.0 <= tol < 1.0):
+        raise ValueError('Invalid value tol=%.1e; should be in [0,1).' % tol)
+
+    K = indices.size
+    W = N - K
+    mhg_cython = extension.mhg_cython
+
+    X_values = np.ascontiguousarray(X_values, dtype=np.intc)
+    L_values = np.ascontiguousarray(L_values, dtype=np.intc)
+    # the number of 1's above each value of L
+    L_counts = np.ascontiguousarray(
+        np.searchsorted(indices, L_values, side='left'), dtype=np.intc)
+
+    ### Step 1: Calculate all test statistics in a single scan.
+    stat = np.empty((X_values.size, L_values.size), dtype=np.float64)
+    cutoff = np.empty((X_values.size, L_values.size), dtype=np.intc)
+    mhg_cython.get_xlmhg_stat_sweep(indices, N, K, X_values, L_counts,
+                                    stat, cutoff, tol)
+
+    if not pval:
+        return SweepResult(X_values, L_values, stat, cutoff, None)
+
+    ### Step 2: Calculate the p-values.
+    table = _get_table(table, K, W, False)
+
+    O1_bounds = get_xlmhg_O1_bounds(
+        stat, K, X_values[:, np.newaxis], L_values[np.newaxis, :])
+
+    def _is_invalid(p, b):
+        # see `test._is_valid_pval`
+        return np.isnan(p) | (p <= 0) | \
+            ((p > b) & (np.abs(p - b) > tol * np.maximum(p, b)))
+
+    pvals = np.empty(stat.shape, dtype=np.float64)
+    L_order = np.argsort(L_values, kind='mergesort')
+    sorted_L = np.ascontiguousarray(L_values[L_order])
+    for i, X in enumerate(X_values):
+        sorted_stat = stat[i, L_order]
+        sorted_O1_bounds = O1_bounds[i, L_order]
+        # values of L with the same test statistic share one DP
+        # (since stat is a running minimum, they form contiguous groups)
+        start = 0
+        while start < sorted_L.size:
+            end = start + 1
+            while end < sorted_L.size and \
+                    sorted_stat[end] == sorted_stat[start]:
+                end += 1
+            # double precision first, long double precision for the
+            # p-values that could not be calculated (like
+            # `get_xlmhg_test_result` does)
+            group_pvals = np.empty(end - start, dtype=np.longdouble)
+            mhg_cython.get_xlmhg_pval2_multi_double(
+                N, K, int(X), sorted_L[start:end], sorted_stat[start],
+                group_pvals, tol)
+            redo = _is_invalid(group_pvals, sorted_O1_bounds[start:end])
+            if 0.0 < sorted_stat[start] < 1.0 and np.any(redo):
+                long_pvals = np.empty(end - start, dtype=np.longdouble)
+                mhg_cython.get_xlmhg_pval2_multi(
+                    N, K, int(X), sorted_L[start:end], sorted_stat[start],
+                    table, long_pvals, tol)
+                group_pvals[redo] = long_pvals[redo]
+            pvals[i, L_order[start:end]] = group_pvals
+            start = end
+
+    # replace p-values that could not be calculated with the O(1)-bound,
+    # like `get_xlmhg_test_result` does
+    invalid = (stat > 0.0) & (stat < 1.0) & _is_invalid(pvals, O1_bounds)
+    if np.any(invalid):
+        logger.warning('Insufficient floating point precision for '
+                       'calculating %d exact XL-mHG p-value(s). Using upper '
+                       'bound(s) instead.', int(np.sum(invalid)))
+        pvals[invalid] = O1_bounds[invalid]
+    # the p-value can not exceed its O(1)-bound (small rounding errors)
+    np.minimum(pvals, O1_bounds, out=pvals)
+
+    return SweepResult(X_values, L_values, stat, cutoff, pvals)
@@ -4,24 +4,18 @@
 
 """Python API for performing XL-mHG tests."""
 
-import sys
+import time
 from math import isnan
 import logging
 
 import numpy as np
 
 from . import mhg
-try:
-    # This is a duct-tape fix for the Google App Engine, on which importing
-    # the C extension fails.
-    from . import mhg_cython
-except ImportError:
-    print('Warning (xlmhg): Failed to import the "mhg_cython" C extension.'
-          'Falling back to the pure Python implementation, which is very '
-          'slow.', file=sys.stderr)
-    from . import mhg as mhg_cython
-
-from .result import mHGResult
+from . import extension
+
+from .result import mHGResult, mHGPairedResult
+from . import metrics
+from . import pvalstore
 
 logger = logging.getLogger(__name__)
 
@@ -45,73 +39,26 @@ def get_xlmhg_O1_bound(stat, K, X, L):
     return upper_bound
 
 
-def get_xlmhg_test_result(N, indices, X=None, L=None,
-                          exact_pval='always', # if_necessary, if_significant
-                          pval_thresh=None, escore_pval_thresh=None,
-                          table=None, use_alg1=False, tol=1e-12):
-    """Perform an XL-mHG test.
-
-    This function accepts a list in the form of a numpy ``indices`` array
-    containing the indices of the non-zero elements (sorted), along with the
-    length ``N`` of the list. It returns an `mHGResult` object.
-
-    Parameters
-    ----------
-    N, int
-        The length of the list.
-    indices: 1-dim `numpy.ndarray` with ``dtype`` = numpy.uint16
-        Sorted list of indices corresponding to the "1"s in the ranked list.
-    X: int, optional
-        The ``X`` parameter. Should be between 0 and K (inclusive), where K
-        is the length of ``indices``. [0]
-    L: int, optional
-        The ``L`` parameter. Should be between 0 and ``N`` (inclusive). If
-        `None`, this parameter will be set to ``N`` [None]
-    exact_pval: str, enumerated
-        Valid values are: 'always', 'if_significant', and 'if_necessary'.
-        Determines in which cases exact p-values should be calculated. This
-        option helps users avoid the time-consuming calculation of an exact
-        p-value in cases where they do not require it, which can lead to
-        significant performance gains. ['always']
+def _finish_result(result, t0):
+    """Record the wall time of a test and report it to the metrics registry.
+    """
+    result.time = time.perf_counter() - t0
+    if metrics.registry.enabled:
+        metrics.registry.record_test(result.tier, result.dp_cells,
+                                     result.time)
+    return result
 
-        Specifically, this setting (in conjunction with ``pval_thresh``)
-        determines in which cases the PVAL-THRESH algorithm is invoked to
-        efficiently determine whether the test is significant. This algorithm
-        first tries to make this determination by calculating O(1)- and O(N)-
-        bounds of the XL-mHG p-value. Only if this fails to give a conclusive
-        answer, an O(N^2)-algorithm is used to calculate the exact p-value.
 
-        Note that whenever 'if_necessary' or 'if_significant' is
-        specified, a significance level (p-value threshold; argument
-        ``pval_thresh``) must be specified as well.
-    pval_thresh: float, optional
-        The significance threshold, i.e., the p-value below which the test
-        should be considered statistically significant. Note that this
-        argument must be given whenever the ``escore_pval_thresh`` argument is
-        given. [None]
-    escore_pval_thresh: float, optional
-        The significance threshold to be used in the calculation of an E-score.
-        The E-score is a measure of the strength of enrichment that is similar
-        to "fold enrichment". [None]
-    table: `numpy.ndarray` with ``ndim=2`` and ``dtype=numpy.longdouble``, optional
-        The dynamic programming table. Size has to be at least (K+1) x (W+1).
-        Providing this array avoids memory reallocation when conducting
-        multiple tests. [None]
-    use_alg1: bool, optional
-        Whether to use PVAL1 (instead of PVAL2) for calculating the
-        p-value. [False]
-    tol: float, optional
-        The tolerance used for comparing floats. [1e-12]
+def _check_test_args(N, indices, X, L, exact_pval, pval_thresh,
+                     escore_pval_thresh, table, use_alg1, tol):
+    """Check the arguments of `get_xlmhg_test_result`.
 
-    Returns
-    -------
-    `mHGResult`
-        The test result.
+    Returns the values of ``X`` and ``L`` (after assigning default values).
     """
     # type checks
     assert isinstance(N, (int, np.integer))
     assert isinstance(indices, np.ndarray) and indices.ndim == 1 and\
-        np.issubdtype(indices.dtype, np.uint16)
+        np.issubdtype(indices.dtype, np.integer)
     if X is not None:
         assert isinstance(X, (int, np.integer))
     if L is not None:
@@ -128,16 +75,12 @@ def get_xlmhg_test_result(N, indices, X=None, L=None,
     assert isinstance(tol, (float, np.float))
 
     # assign default values, if None
-    K = indices.size
     if X is None:
         X = 0
     if L is None:
         L = N
 
     ### check whether parameter values are in range
-    if not indices.flags.c_contiguous:
-        raise ValueError('Array is not C-contiguous! Try '
-                         '"np.ascontiguousarray()".')
     if N > 65536:
         raise ValueError(
             'Length of list cannot exceed 65536.'
@@ -164,21 +107,127 @@ def get_xlmhg_test_result(N, indices, X=None, L=None,
         raise ValueError('Invalid value tol=%.1e; should be in [0,1).' % tol)
 
     ### check if combination of argument values is valid
-    if exact_pval not in ['always', 'if_significant', 'if_necessary']:
-        raise ValueError('Invalid value exact_pval="%s".'
+    if exact_pval not in ['always', 'if_significant', 'if_necessary',
+                          'approx']:
+        raise ValueError('Invalid value exact_pval="%s". '
                          'Must be "always", "if_necessary", '
-                         'or "if_significant".')
+                         '"if_significant", or "approx".' % exact_pval)
 
     if exact_pval in ['if_necessary', 'if_significant'] and \
                     pval_thresh is None:
         raise ValueError('Missing argument: exact_pval=%s requires '
-                         'a significance level to be specified (pval_thresh).')
+                         'a significance level to be specified (pval_thresh).'
+                         % exact_pval)
 
     if escore_pval_thresh is not None and pval_thresh is None:
         raise ValueError('Missing argument: Setting escore_pval_thresh '
                          'requires a significance level to be specified'
                          '(pval_thresh).')
 
+    return X, L
+
+
+def _get_table(table, K, W, use_alg1=True):
+    """Check the dynamic programming table, or create it if necessary."""
+    # If an array for the dynamic programming table is supplied, make sure it's
+    # large enough. Otherwise, create an empty array (PVAL2 only uses the
+    # first column).
+    num_cols = W+1 if use_alg1 else 1
+    if table is None:
+        table = np.empty((K+1, num_cols), dtype = np.longdouble)
+    elif table.shape[0] < K+1 or table.shape[1] < num_cols:
+        raise ValueError('Supplied array for dynamic programming table not'
+                         'large enough. It is: %d x %d, but must be at least '
+                         '%d x %d ((K+1) x (W+1) for PVAL1, (K+1) x 1 for '
+                         'PVAL2).'
+                         % (table.shape[0], table.shape[1], K+1, num_cols))
+    return table
+
+
+def get_xlmhg_test_result(N, indices, X=None, L=None,
+                          exact_pval='always', # if_necessary, if_significant,
+                                               # approx
+                          pval_thresh=None, escore_pval_thresh=None,
+                          table=None, use_alg1=False, tol=1e-12):
+    """Perform an XL-mHG test.
+
+    This function accepts a list in the form of a numpy ``indices`` array
+    containing the indices of the non-zero elements (sorted), along with the
+    length ``N`` of the list. It returns an `mHGResult` object.
+
+    Parameters
+    ----------
+    N, int
+        The length of the list.
+    indices: 1-dim `numpy.ndarray` with an integer ``dtype``
+        Sorted list of indices corresponding to the "1"s in the ranked list.
+        The array is read in place; it is only converted to a C-contiguous
+        array with ``dtype`` = numpy.uint16 (if necessary) for storing it in
+        the result.
+    X: int, optional
+        The ``X`` parameter. Should be between 0 and K (inclusive), where K
+        is the length of ``indices``. [0]
+    L: int, optional
+        The ``L`` parameter. Should be between 0 and ``N`` (inclusive). If
+        `None`, this parameter will be set to ``N`` [None]
+    exact_pval: str, enumerated
+        Valid values are: 'always', 'if_significant', 'if_necessary', and
+        'approx'. Determines in which cases exact p-values should be calculated. This
+        option helps users avoid the time-consuming calculation of an exact
+        p-value in cases where they do not require it, which can lead to
+        significant performance gains. ['always']
+
+        Specifically, this setting (in conjunction with ``pval_thresh``)
+        determines in which cases the PVAL-THRESH algorithm is invoked to
+        efficiently determine whether the test is significant. This algorithm
+        first tries to make this determination by calculating O(1)- and O(N)-
+        bounds of the XL-mHG p-value. Only if this fails to give a conclusive
+        answer, an O(N^2)-algorithm is used to calculate the exact p-value.
+
+        Note that whenever 'if_necessary' or 'if_significant' is
+        specified, a significance level (p-value threshold; argument
+        ``pval_thresh``) must be specified as well.
+
+        If 'approx' is specified, the p-value is approximated in O(L) (using
+        a boundary-crossing approximation), without allocating a dynamic
+        programming table. The approximation is clipped to the interval
+        between the test statistic and the O(1)- and O(N)-bounds, and the
+        maximum error implied by this interval is reported as
+        :attr:`~mHGResult.pval_error`. To obtain the exact p-value instead,
+        specify 'always'.
+    pval_thresh: float, optional
+        The significance threshold, i.e., the p-value below which the test
+        should be considered statistically significant. Note that this
+        argument must be given whenever the ``escore_pval_thresh`` argument is
+        given. [None]
+    escore_pval_thresh: float, optional
+        The significance threshold to be used in the calculation of an E-score.
+        The E-score is a measure of the strength of enrichment that is similar
+        to "fold enrichment". [None]
+    table: `numpy.ndarray` with ``ndim=2`` and ``dtype=numpy.longdouble``, optional
+        The dynamic programming table. Size has to be at least (K+1) x (W+1)
+        if ``use_alg1`` is True, and (K+1) x 1 otherwise. Providing this array avoids memory reallocation when conducting
+        multiple tests. [None]
+    use_alg1: bool, optional
+        Whether to use PVAL1 (instead of PVAL2) for calculating the
+        p-value. [False]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `mHGResult`
+        The test result. Its :attr:`~mHGResult.tier`,
+        :attr:`~mHGResult.dp_cells`, and :attr:`~mHGResult.time` attributes
+        describe how the p-value was determined.
+    """
+    t0 = time.perf_counter()
+    mhg_cython = extension.mhg_cython
+
+    X, L = _check_test_args(N, indices, X, L, exact_pval, pval_thresh,
+                            escore_pval_thresh, table, use_alg1, tol)
+    K = indices.size
+
     ### check if s=1.0 by definition
     min_KL = min(K, L)
     if X > min_KL:
@@ -187,93 +236,197 @@ def get_xlmhg_test_result(N, indices, X=None, L=None,
         stat = 1.0
         cutoff = 0
         pval = 1.0
-        result = mHGResult(N, indices, X, L, stat, cutoff, pval,
-                           pval_thresh=pval_thresh,
-                           escore_pval_thresh=escore_pval_thresh)
-        return result
-
-    # If an array for the dynamic programming table is supplied, make sure it's
-    # large enough. Otherwise, create an empty array.
-    W = N - K
-    if table is None:
-        table = np.empty((K+1, W+1), dtype = np.longdouble)
-    elif table.shape[0] < K+1 or table.shape[1] < W+1:
-        raise ValueError('Supplied array for dynamic programming table not'
-                         'large enough. It is: %d x %d, but must be at least '
-                         '%d x %d ((K+1) x (W+1)).'
-                         % (table.shape[0], table.shape[1], K+1, W+1))
-
-    ### Step 1: Calculate XL-mHG test statistic.
-    stat, cutoff = mhg_cython.get_xlmhg_stat(indices, N, K, X, L, tol)
-    assert 0.0 <= stat <= 1.0
-
-    # check for special cases
-    pval = None
+        result = mHGResult(N, _get_result_indices(indices), X, L, stat,
+                           cutoff, pval, pval_thresh=pval_thresh,
+                           escore_pval_thresh=escore_pval_thresh,
+                           tier='trivial', dp_cells=0,
+                           pval_error=(0.0 if exact_pval == 'approx'
+                                       else None))
+        return _finish_result(result, t0)
+
+    if exact_pval != 'approx':
+        table = _get_table(table, K, N - K, use_alg1)
+
+    ### Steps 1 and 2: Calculate XL-mHG test statistic, and determine
+    ### whether we need to calculate the exact p-value.
+    # If a significance level (p-value threshold) is specified, and the
+    # `exact_pval` argument is not set to "always", then our first job is to
+    # determine whether the XL-mHG p-value is significant our not (using the
+    # PVAL-THRESH algorithm). Otherwise, we can skip this step.
+    # All of this is done in a single call to the C extension, which returns
+    # the test statistic and cutoff, the O(1)-bound, the O(N)-bound (NaN if
+    # it was not calculated), and whether the test is significant (None if
+    # this could not be determined from the bounds).
+    if pval_thresh is not None and exact_pval not in ['always', 'approx']:
+        stat_bounds = mhg_cython.get_xlmhg_stat_bounds(
+            indices, N, K, X, L, float(pval_thresh), tol)
+    else:
+        stat_bounds = mhg_cython.get_xlmhg_stat_bounds(
+            indices, N, K, X, L, None, tol)
+
+    # Step 3 (calculating the exact p-value, if required)
+    return _get_test_result(N, _get_result_indices(indices), X, L,
+                            stat_bounds, exact_pval, pval_thresh,
+                            escore_pval_thresh, table, use_alg1, tol, t0)
+
+
+def _get_result_indices(indices):
+    """Convert an ``indices`` array to the format stored in `mHGResult`
+    (without copying it, if possible)."""
+    return np.ascontiguousarray(indices, dtype=np.uint16)
+
+
+def _get_trivial_pval(stat):
+    """Return the p-value for the special cases stat = 1 and stat = 0 (or
+    None, if the p-value has to be determined)."""
     if stat == 1.0:
         # stat = 1.0 => pval = 1.0
-        pval = 1.0
+        return 1.0
     elif stat == 0.0:
         logger.warning('Insufficient floating point precision for calculating '
                        'or reporting the exact XL-mHG test statistic; the '
                        'true value is too small. Using "0" instead.'
                        '(The XL-mHG p-value will also be reported as "0".)')
-        pval = 0.0
+        return 0.0
+    return None
+
+
+def _is_valid_pval(pval, O1_bound, tol):
+    """Check whether a p-value calculated using PVAL1 or PVAL2 is valid
+    (i.e., whether the floating point precision was sufficient)."""
+    return not (isnan(pval) or pval <= 0 or
+                (pval > O1_bound and not mhg.is_equal(pval, O1_bound, tol)))
 
+
+def _calculate_exact_pval(N, K, X, L, stat, O1_bound, table, use_alg1, tol):
+    """Calculate the exact p-value of a test (Step 3).
+
+    If the persistent p-value store is enabled (see `pvalstore`), the
+    p-value is looked up in the store first, and added to it after it has
+    been calculated. PVAL2 is first performed in double precision, and
+    repeated in long double precision if the result is not valid. If the
+    p-value cannot be calculated due to insufficient floating point
+    precision, the O(1)-bound is reported instead.
+
+    Returns
+    -------
+    pval: float
+        The p-value.
+    tier: str
+        "pval1" or "pval2" (the algorithm used), or "O1_fallback".
+    dp_cells: int
+        The number of dynamic programming table cells visited.
+    """
+    mhg_cython = extension.mhg_cython
+    store = pvalstore.store
+    tier = 'pval1' if use_alg1 else 'pval2'
+    dp_cells = 0
+
+    pval = None
+    if store is not None:
+        # the p-value may have been calculated in an earlier run
+        pval = store.get(N, K, X, L, stat, tol, tier)
+    if pval is None:
+        if not use_alg1:
+            # use PVAL2 algorithm (in double precision, if possible)
+            pval, dp_cells = mhg_cython.get_xlmhg_pval2_double(
+                N, K, X, L, stat, tol, return_cells=True)
+            if not _is_valid_pval(pval, O1_bound, tol):
+                if metrics.registry.enabled:
+                    metrics.registry.increment('pval2.long_double')
+                pval, cells = mhg_cython.get_xlmhg_pval2(
+                    N, K, X, L, stat, table, tol, return_cells=True)
+                dp_cells += cells
+        else:
+            # use PVAL1 algorithm
+            pval, dp_cells = mhg_cython.get_xlmhg_pval1(
+                N, K, X, L, stat, table, tol, return_cells=True)
+        pval = float(pval)
+
+        if not _is_valid_pval(pval, O1_bound, tol):
+            # insufficient floating point precision for calculating p-value,
+            # report O(1)-bound instead
+            logger.warning('Insufficient floating point precision for '
+                           'calculating the exact XL-mHG p-value. Using '
+                           'upper bound instead.')
+            return O1_bound, 'O1_fallback', dp_cells
+        # the p-value can not exceed its O(1)-bound (small rounding errors)
+        pval = min(pval, O1_bound)
+
+        if store is not None:
+            store.put(N, K, X, L, stat, tol, tier, pval)
+    return pval, tier, dp_cells
+
+
+def _get_test_result(N, indices, X, L, stat_bounds, exact_pval,
+                     pval_thresh, escore_pval_thresh, table, use_alg1, tol,
+                     t0, pval_cache=None):
+    """Determine the p-value and generate the result object.
+
+    This function performs the remaining steps of `get_xlmhg_test_result`,
+    once the test statistic and the bounds have been calculated
+    (``stat_bounds`` is the tuple returned by
+    `mhg_cython.get_xlmhg_stat_bounds`). If a dictionary ``pval_cache`` is
+    given, exact p-values are looked up in (and added to) it, using the test
+    statistic as the key. This only works for tests that share the same
+    N, K, X, and L.
+    """
+    mhg_cython = extension.mhg_cython
+    K = indices.size
+    stat, cutoff, O1_upper_bound, ON_upper_bound, pval_is_significant = \
+        stat_bounds
+    assert 0.0 <= stat <= 1.0
+
+    # check for special cases
+    pval = _get_trivial_pval(stat)
     if pval is not None:
         # stop here
         result = mHGResult(N, indices, X, L, stat, cutoff, pval,
                            pval_thresh=pval_thresh,
-                           escore_pval_thresh=escore_pval_thresh)
-        return result
+                           escore_pval_thresh=escore_pval_thresh,
+                           tier='trivial', dp_cells=0,
+                           pval_error=(0.0 if exact_pval == 'approx'
+                                       else None))
+        return _finish_result(result, t0)
+
+    if exact_pval == 'approx':
+        # The p-value lies between the test statistic and the upper bounds,
+        # so we clip the approximation to this interval.
+        upper_bound = min(O1_upper_bound, float(
+            mhg_cython.get_xlmhg_ON_bound(N, K, X, L, stat, tol)))
+        upper_bound = max(upper_bound, stat)
+        pval = float(mhg_cython.get_xlmhg_approx_pval(N, K, X, L, stat, tol))
+        pval = min(max(pval, stat), upper_bound)
+        result = mHGResult(N, indices, X, L, stat, cutoff, pval,
+                           pval_thresh=pval_thresh,
+                           escore_pval_thresh=escore_pval_thresh,
+                           tier='approx', dp_cells=0,
+                           pval_error=max(pval - stat, upper_bound - pval))
+        return _finish_result(result, t0)
+
+    tier = None
+    dp_cells = 0
+    if pval_is_significant is False:
+        # The test statistic is larger than the significance threshold.
+        # Since the test statistic serves a lower bound for the p-value,
+        # this means that the test cannot be significant.
+        # => Report upper bound instead of true p-value.
+        pval = O1_upper_bound
+        tier = 'stat'
 
-    ### Step 2: Determine whether we need to calculate the exact p-value
-    # If a significance level (p-value threshold) is specified, and the
-    # `exact_pval` argument is not set to "always", then our first job is to
-    # determine whether the XL-mHG p-value is significant our not. Otherwise,
-    # we can skip this step.
-    pval_is_significant = None
-    # calculate the O(1)-bound of the XL-mHG p-value
-    # O1_upper_bound = min((min_KL - X + 1) * stat, 1.0)
-    O1_upper_bound = get_xlmhg_O1_bound(stat, K, X, L)
-    if pval_thresh is not None and exact_pval != 'always':
-
-        # use PVAL-THRESH algorithm to determine if p-value is significant
-        if stat > pval_thresh and not mhg.is_equal(stat, pval_thresh, tol):
-            # The test statistic is larger than the significance threshold.
-            # Since the test statistic serves a lower bound for the p-value,
-            # this means that the test cannot be significant.
-            # => Report upper bound instead of true p-value.
-            pval_is_significant = False
-            pval = O1_upper_bound
-
-        elif O1_upper_bound <= pval_thresh or \
-                mhg.is_equal(O1_upper_bound, pval_thresh, tol):
-            # The upper bound is "<=" the significance threshold.
-            # This means that the test *is* significant.
-            # => Depending on the value of `exact_pval`, we report either
-            #    the upper bound or the exact p-value (see Step 3).
-            pval = O1_upper_bound
-            pval_is_significant = True
+    elif pval_is_significant and isnan(ON_upper_bound):
+        # The O(1)-bound is "<=" the significance threshold.
+        # This means that the test *is* significant.
+        # => Depending on the value of `exact_pval`, we report either
+        #    the upper bound or the exact p-value (see Step 3).
+        pval = O1_upper_bound
+        tier = 'O1_bound'
 
-        else:
-            # O(1)-bound was inconclusive
-            # => calculate O(N)-bound
-            ON_upper_bound = mhg_cython.get_xlmhg_ON_bound(N, K, X, L, stat,
-                                                           tol)
-            if ON_upper_bound <= pval_thresh or \
-                mhg.is_equal(ON_upper_bound, pval_thresh, tol):
-                # The upper bound is "<=" the significance threshold.
-                # This means that the test *is* significant.
-                # => Depending on the value of `exact_pval`, we report either
-                #    the upper bound or the exact p-value (see Step 3).
-                pval = ON_upper_bound
-                pval_is_significant = True
-
-            else:
-                # The bound is still larger than the significance threshold.
-                # => We need to calculate the exact p-value in order to
-                #    determine whether the test is significant or not.
-                pass
+    elif pval_is_significant:
+        # The O(1)-bound was inconclusive, but the O(N)-bound is "<=" the
+        # significance threshold.
+        pval = ON_upper_bound
+        tier = 'ON_bound'
 
     ### Step 3: Calculate the exact p-value (if required).
     # There are three conditions (not mutually exclusive) which require that
@@ -287,28 +440,162 @@ def get_xlmhg_test_result(N, indices, X=None, L=None,
             pval_is_significant is None or \
             (exact_pval == 'if_significant' and pval_is_significant):
         # we need to calculate the exact p-value
-        if not use_alg1:
-            # use PVAL2 algorithm
-            pval = mhg_cython.get_xlmhg_pval2(N, K, X, L, stat, table, tol)
+        if pval_cache is not None and stat in pval_cache:
+            # the p-value was already calculated for another test
+            pval, tier = pval_cache[stat]
         else:
-            # use PVAL1 algorithm
-            pval = mhg_cython.get_xlmhg_pval1(N, K, X, L, stat, table, tol)
-
-
-    if isnan(pval) or pval <= 0 or \
-            (pval > O1_upper_bound and
-                 (not mhg.is_equal(pval, O1_upper_bound, tol))):
-        # insufficient floating point precision for calculating p-value,
-        # report O(1)-bound instead
-        logger.warning('Insufficient floating point precision for calculating '
-                       'the exact XL-mHG p-value. Using upper bound instead.')
-        pval = O1_upper_bound
+            pval, tier, dp_cells = _calculate_exact_pval(
+                N, K, X, L, stat, O1_upper_bound, table, use_alg1, tol)
+            if pval_cache is not None:
+                pval_cache[stat] = (pval, tier)
 
     # generate result object
     result = mHGResult(N, indices, X, L, stat, cutoff, pval,
                        pval_thresh=pval_thresh,
-                       escore_pval_thresh=escore_pval_thresh)
-    return result
+                       escore_pval_thresh=escore_pval_thresh,
+                       tier=tier, dp_cells=dp_cells)
+    return _finish_result(result, t0)
+
+
+def get_xlmhg_bidirectional_result(N, indices, X=None, L=None,
+                                   exact_pval='always', pval_thresh=None,
+                                   escore_pval_thresh=None, table=None,
+                                   use_alg1=False, tol=1e-12):
+    """Perform XL-mHG tests for enrichment at both ends of a list.
+
+    This function tests for enrichment at the top of the list (like
+    `get_xlmhg_test_result`), and for enrichment at the bottom of the list
+    (by testing the reversed list). The test statistics and cutoffs for both
+    ends are calculated in a single scan of the ``indices`` array. Since
+    both tests share the same N, K, X, and L, the exact p-value is only
+    calculated once if both ends have the same test statistic, and both
+    tests use the same dynamic programming table.
+
+    Parameters
+    ----------
+    See `get_xlmhg_test_result`.
+
+    Returns
+    -------
+    `mHGPairedResult`
+        The test results for the top and the bottom of the list. The
+        ``indices`` of the bottom result refer to the reversed list.
+    """
+    t0 = time.perf_counter()
+    mhg_cython = extension.mhg_cython
+
+    X, L = _check_test_args(N, indices, X, L, exact_pval, pval_thresh,
+                            escore_pval_thresh, table, use_alg1, tol)
+    indices = _get_result_indices(indices)
+    K = indices.size
+
+    # the indices of the 1's in the reversed list
+    rev_indices = np.uint16(N - 1) - indices[::-1]
+
+    if X > min(K, L):
+        # by definition, s=1.0 and p=1.0 (see `get_xlmhg_test_result`)
+        top, bottom = [
+            _finish_result(mHGResult(N, ind, X, L, 1.0, 0, 1.0,
+                                     pval_thresh=pval_thresh,
+                                     escore_pval_thresh=escore_pval_thresh,
+                                     tier='trivial', dp_cells=0), t0)
+            for ind in [indices, rev_indices]]
+        return mHGPairedResult(top, bottom)
+
+    if exact_pval != 'approx':
+        table = _get_table(table, K, N - K, use_alg1)
+
+    if pval_thresh is not None and exact_pval not in ['always', 'approx']:
+        top_bounds, bottom_bounds = \
+            mhg_cython.get_xlmhg_stat_bounds_both_ends(
+                indices, N, K, X, L, float(pval_thresh), tol)
+    else:
+        top_bounds, bottom_bounds = \
+            mhg_cython.get_xlmhg_stat_bounds_both_ends(
+                indices, N, K, X, L, None, tol)
+
+    pval_cache = {}
+    top = _get_test_result(
+        N, indices, X, L, top_bounds, exact_pval, pval_thresh,
+        escore_pval_thresh, table, use_alg1, tol, t0, pval_cache=pval_cache)
+    bottom = _get_test_result(
+        N, rev_indices, X, L, bottom_bounds, exact_pval, pval_thresh,
+        escore_pval_thresh, table, use_alg1, tol, t0, pval_cache=pval_cache)
+    return mHGPairedResult(top, bottom)
+
+
+def prepare_xlmhg_test(N, X=None, L=None, exact_pval='always',
+                       pval_thresh=None, use_alg1=False, tol=1e-12):
+    """Prepare XL-mHG tests with fixed parameters (low-overhead interface).
+
+    This function validates the test parameters once, and returns a
+    `PreparedTest` object that can be used to perform many tests on lists of
+    the same length. Calling the object (or its ``run()`` method) with an
+    ``indices`` array performs a test and returns a 3-tuple with the XL-mHG
+    test statistic, cutoff, and p-value. The p-values are identical to the
+    ones obtained with `get_xlmhg_test_result`, but the per-test overhead
+    (argument checks, allocation of the dynamic programming table, and
+    creation of an `mHGResult` object) is avoided.
+
+    Parameters
+    ----------
+    N, int
+        The length of the list.
+    X: int, optional
+        The ``X`` parameter. [0]
+    L: int, optional
+        The ``L`` parameter. [N]
+    exact_pval: str, enumerated
+        See `get_xlmhg_test_result`. ['always']
+    pval_thresh: float, optional
+        See `get_xlmhg_test_result`. [None]
+    use_alg1: bool, optional
+        Whether to use PVAL1 (instead of PVAL2) for calculating the
+        p-value. [False]
+    tol: float, optional
+        The tolerance used for comparing floats. [1e-12]
+
+    Returns
+    -------
+    `PreparedTest`
+        The prepared test. Its ``run()`` method accepts a 1-dim
+        `numpy.ndarray` with ``dtype`` = numpy.uint16 that contains the
+        (sorted) indices of the "1"s in the ranked list, and that must be
+        C-contiguous.
+
+    Examples
+    --------
+    >>> test = prepare_xlmhg_test(N, X=5, L=1000)
+    >>> stat, cutoff, pval = test(indices)
+    """
+    # the same checks as in `get_xlmhg_test_result`
+    X, L = _check_test_args(N, np.empty(0, dtype=np.uint16), X, L,
+                            exact_pval, pval_thresh, None, None, use_alg1,
+                            tol)
+    if exact_pval == 'approx':
+        raise ValueError('Invalid value exact_pval="approx". Prepared tests '
+                         'must use "always", "if_necessary", or '
+                         '"if_significant".')
+
+    if pval_thresh is not None:
+        pval_thresh = float(pval_thresh)
+
+    return extension.mhg_cython.PreparedTest(
+        int(N), int(X), int(L), exact_pval, pval_thresh, bool(use_alg1),
+        float(tol))
+
+
+def _get_dense_list(v):
+    """Return a 1-dim `numpy.ndarray` view of a ranked list (without copying
+    it), which can be passed to `mhg_cython.get_xlmhg_stat_dense`."""
+    if not isinstance(v, np.ndarray):
+        # any object that supports the buffer protocol
+        v = np.asarray(memoryview(v))
+    assert v.ndim == 1 and (np.issubdtype(v.dtype, np.integer) or
+                            np.issubdtype(v.dtype, np.bool_))
+    if np.issubdtype(v.dtype, np.bool_):
+        v = v.view(np.uint8)
+    return v
 
 
 def xlmhg_test(v, X=None, L=None, table=None):
@@ -317,9 +604,14 @@ def xlmhg_test(v, X=None, L=None, table=None):
     This function accepts a vector containing zeros and ones, and returns
     a 3-tuple with the XL-mHG test statistic, cutoff, and p-value.
 
+    The vector is scanned in place by the C extension, so it does not need to
+    be converted to an ``indices`` array first, and it can be a strided view
+    (e.g., a column of a matrix), or any object that supports the buffer
+    protocol (e.g., an `array.array` or a `memoryview`).
+
     Parameters
     ----------
-    v: 1-dim `numpy.ndarray` of integers
+    v: 1-dim `numpy.ndarray` of integers or booleans
         The ranked list. All non-zero elements are considered "1"s.
         (Let N denote the length of the list.)
     X: int, optional
@@ -327,8 +619,8 @@ def xlmhg_test(v, X=None, L=None, table=None):
     L: int, optional
         The ``L`` parameter. [N]
     table: np.ndarray with ``ndim=2`` and ``dtype=numpy.longdouble``, optional
-        The dynamic programming table. Size has to be at least (K+1) x (W+1),
-        with W = N-K. Providing this array avoids memory reallocation when
+        The dynamic programming table. Size has to be at least (K+1) x 1.
+        Providing this array avoids memory reallocation when
         conducting multiple tests. [None]
 
     Returns
@@ -341,15 +633,32 @@ def xlmhg_test(v, X=None, L=None, table=None):
     pval: float
         The XL-mHG p-value (either exact or an upper bound).
     """
-    assert isinstance(v, np.ndarray) and v.ndim == 1 \
-        and np.issubdtype(v.dtype, np.integer)
+    t0 = time.perf_counter()
+    mhg_cython = extension.mhg_cython
+    tol = 1e-12
+
+    v = _get_dense_list(v)
     if v.size > 65536:
         raise ValueError('List is too long. The maximum length supported is '
                          ' 65536.')
-    indices = np.uint16(np.nonzero(v)[0])
     N = v.size
-    result = get_xlmhg_test_result(N, indices, X, L, table=table)
-    return result.stat, result.cutoff, result.pval
-
-
-
+    X, L = _check_test_args(N, np.empty(0, dtype=np.uint16), X, L, 'always',
+                            None, None, table, False, tol)
+
+    K, stat, cutoff, O1_bound = mhg_cython.get_xlmhg_stat_dense(v, X, L, tol)
+
+    tier = 'trivial'
+    dp_cells = 0
+    if X > min(K, L):
+        # by definition (see `get_xlmhg_test_result`)
+        stat, cutoff, pval = 1.0, 0, 1.0
+    else:
+        pval = _get_trivial_pval(stat)
+        if pval is None:
+            table = _get_table(table, K, N - K, False)
+            pval, tier, dp_cells = _calculate_exact_pval(
+                N, K, X, L, stat, O1_bound, table, False, tol)
+
+    if metrics.registry.enabled:
+        metrics.registry.record_test(tier, dp_cells, time.perf_counter() - t0)
+    return stat, cutoff, pval
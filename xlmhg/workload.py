@@ -0,0 +1,160 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""Generator for synthetic XL-mHG workloads."""
+
+from collections import namedtuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SyntheticWorkload = namedtuple(
+    'SyntheticWorkload', ['N', 'indices', 'is_enriched'])
+SyntheticWorkload.__doc__ = """A synthetic collection of XL-mHG tests.
+
+All tests refer to the same ranked list of length ``N``. ``indices`` is a
+list of sorted `numpy.ndarray` objects with ``dtype=np.uint16``, one for each
+gene set, containing the positions of the set's members in the ranked list.
+``is_enriched`` is a boolean `numpy.ndarray` indicating which sets have
+planted enrichment at the top of the list.
+"""
+
+
+def get_gene_set_sizes(num_sets, min_size=5, max_size=500, median_size=40,
+                       sigma=1.0, seed=None):
+    """Draw gene set sizes from a GMT-like (log-normal) distribution.
+
+    Curated gene set collections (e.g., GO or MSigDB) contain many small sets
+    and a long tail of very large sets. This is approximated by a log-normal
+    distribution that is truncated to ``[min_size, max_size]``.
+
+    Parameters
+    ----------
+    num_sets: int
+        The number of gene sets.
+    min_size: int, optional
+        The minimum gene set size. [5]
+    max_size: int, optional
+        The maximum gene set size. [500]
+    median_size: float, optional
+        The median of the (untruncated) size distribution. [40]
+    sigma: float, optional
+        The standard deviation of the log-transformed sizes. [1.0]
+    seed: int, optional
+        The seed for the random number generator. [None]
+
+    Returns
+    -------
+    `numpy.ndarray` with ``dtype=np.int64``
+        The gene set sizes.
+    """
+    assert isinstance(num_sets, (int, np.integer))
+    assert isinstance(min_size, (int, np.integer))
+    assert isinstance(max_size, (int, np.integer))
+
+    if not num_sets >= 0:
+        raise ValueError('Invalid value num_sets=%d; should be >= 0.'
+                         % num_sets)
+    if not (1 <= min_size <= max_size):
+        raise ValueError('Invalid values min_size=%d, max_size=%d; should '
+                         'satisfy 1 <= min_size <= max_size.'
+                         % (min_size, max_size))
+
+    rng = np.random.RandomState(seed)
+    sizes = np.exp(rng.normal(np.log(median_size), sigma, size=num_sets))
+    sizes = np.clip(np.round(sizes), min_size, max_size).astype(np.int64)
+    return sizes
+
+
+def get_synthetic_workload(N=10000, num_sets=1000, frac_enriched=0.1,
+                           top_frac=0.05, enriched_frac=0.3,
+                           min_size=5, max_size=500, median_size=40,
+                           seed=0):
+    """Generate a collection of gene sets with planted enrichment.
+
+    The ranked list is represented implicitly by the positions 0 to ``N-1``.
+    Each gene set is represented by the sorted positions of its members, which
+    is the format expected by `get_xlmhg_test_result`. Most gene sets are
+    placed uniformly at random, but a fraction of them ("enriched sets") have
+    a share of their members placed among the top ranks of the list.
+
+    Parameters
+    ----------
+    N: int, optional
+        The length of the ranked list (at most 65536). [10000]
+    num_sets: int, optional
+        The number of gene sets. [1000]
+    frac_enriched: float, optional
+        The fraction of gene sets with planted enrichment. [0.1]
+    top_frac: float, optional
+        The fraction of the list (from the top) considered the "top ranks"
+        that planted enrichment is placed in. [0.05]
+    enriched_frac: float, optional
+        For enriched sets, the fraction of members placed among the top
+        ranks. [0.3]
+    min_size: int, optional
+        The minimum gene set size (limited to ``N``). [5]
+    max_size: int, optional
+        The maximum gene set size (limited to ``N``). [500]
+    median_size: float, optional
+        The median gene set size. [40]
+    seed: int, optional
+        The seed for the random number generator. [0]
+
+    Returns
+    -------
+    `SyntheticWorkload`
+        The synthetic workload.
+    """
+    assert isinstance(N, (int, np.integer))
+    assert isinstance(num_sets, (int, np.integer))
+    assert isinstance(frac_enriched, (float, int))
+    assert isinstance(top_frac, (float, int))
+    assert isinstance(enriched_frac, (float, int))
+
+    if not (1 <= N <= 65536):
+        raise ValueError('Invalid value N=%d; should be >= 1 and <= 65536.'
+                         % N)
+    if not (0.0 <= frac_enriched <= 1.0):
+        raise ValueError('Invalid value frac_enriched=%.2f; should be in '
+                         '[0,1].' % frac_enriched)
+    if not (0.0 < top_frac <= 1.0):
+        raise ValueError('Invalid value top_frac=%.2f; should be in (0,1].'
+                         % top_frac)
+    if not (0.0 <= enriched_frac <= 1.0):
+        raise ValueError('Invalid value enriched_frac=%.2f; should be in '
+                         '[0,1].' % enriched_frac)
+
+    rng = np.random.RandomState(seed)
+    # the gene sets cannot be larger than the list
+    sizes = get_gene_set_sizes(
+        num_sets, min_size=min(min_size, N), max_size=min(max_size, N),
+        median_size=median_size, seed=rng.randint(2**31))
+
+    num_top = max(int(round(top_frac * N)), 1)
+    is_enriched = rng.rand(num_sets) < frac_enriched
+
+    indices = []
+    for K, enriched in zip(sizes, is_enriched):
+        if enriched:
+            # place a share of the members among the top ranks,
+            # and the remaining members anywhere below
+            k_top = min(int(round(enriched_frac * K)), num_top)
+            k_bottom = min(K - k_top, N - num_top)
+            k_top = K - k_bottom
+            top = rng.choice(num_top, k_top, replace=False)
+            bottom = num_top + rng.choice(N - num_top, k_bottom,
+                                          replace=False)
+            ind = np.r_[top, bottom]
+        else:
+            ind = rng.choice(N, K, replace=False)
+        ind.sort()
+        indices.append(np.ascontiguousarray(ind, dtype=np.uint16))
+
+    logger.debug('Generated %d gene sets (%d enriched) for N=%d.',
+                 num_sets, int(np.sum(is_enriched)), N)
+
+    return SyntheticWorkload(N, indices, is_enriched)
@@ -0,0 +1,338 @@
+# Copyright (c) 2016-2019 Florian Wagner
+#
+# This file is part of XL-mHG.
+
+"""File-based work queues for running jobs on several nodes.
+
+A work queue is a directory (on a filesystem that is shared by all nodes)
+that contains the input of a job, split into shards of gene sets, and a
+manifest. Worker processes claim shards by atomically creating lock files,
+test the gene sets of each claimed shard against all ranked lists (see
+`iter_xlmhg_results`), and write one results file per shard. Once all shards
+are completed, the results files are merged. No coordinating service is
+required: all synchronization happens through the filesystem.
+
+The queue directory contains the following files::
+
+    manifest.json        the test parameters and the list of shards
+    rankings.txt         the ranked lists (see `read_ranked_lists`)
+    shard-000000.gmt     the gene sets of each shard (see `read_gmt`)
+    shard-000000.lock    exists if the shard was claimed by a worker
+    shard-000000.tsv     the results of the shard (see `write_results`)
+"""
+
+from collections import namedtuple
+import json
+import logging
+import os
+import shutil
+import socket
+import time
+
+from .checkpoint import get_file_checksum, _get_rankings_checksum, \
+    _write_atomic, _merge_result_files, _merge_atomic
+from .stream import read_gmt, iter_chunks, iter_xlmhg_results, \
+    write_results
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+RANKINGS_FILE = 'rankings.txt'
+
+QueueStatus = namedtuple('QueueStatus',
+                         ['num_shards', 'num_claimed', 'num_completed'])
+QueueStatus.__doc__ = """The status of a work queue.
+
+``num_claimed`` is the number of shards that were claimed by a worker
+(including the completed shards).
+"""
+
+
+def _get_shard_path(queue_dir, shard_index, ext):
+    return os.path.join(queue_dir, 'shard-%06d.%s' % (shard_index, ext))
+
+
+def _load_manifest(queue_dir):
+    with open(os.path.join(queue_dir, MANIFEST_FILE), encoding='UTF-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError('Unsupported work queue manifest version: %s'
+                         % str(manifest.get('version')))
+    return manifest
+
+
+def create_work_queue(gene_sets, rankings, queue_dir, X=None, L=None,
+                      exact_pval='always', pval_thresh=None, stats_only=False,
+                      chunk_size=1000, tol=1e-12):
+    """Create a work queue.
+
+    The queue is first created in a temporary directory, which is then
+    atomically renamed to ``queue_dir``. If ``queue_dir`` already exists
+    (e.g., because several workers tried to create the same queue), the
+    existing queue is used, provided that it was created from the same
+    input files and with the same parameters.
+
+    Parameters
+    ----------
+    gene_sets: str
+        The path of a GMT file (see `read_gmt`).
+    rankings: str or list
+        The path of a file with ranked lists (see `read_ranked_lists`), or a
+        list of (name, genes) tuples.
+    queue_dir: str
+        The queue directory.
+    X, L, exact_pval, pval_thresh, stats_only, tol: optional
+        See `iter_xlmhg_results`.
+    chunk_size: int, optional
+        The number of gene sets per shard. [1000]
+
+    Returns
+    -------
+    int
+        The number of shards.
+    """
+    assert isinstance(gene_sets, str)
+    assert isinstance(queue_dir, str)
+
+    inputs = {
+        'gene_sets': get_file_checksum(gene_sets),
+        'rankings': _get_rankings_checksum(rankings),
+    }
+    params = {
+        'X': None if X is None else int(X),
+        'L': None if L is None else int(L),
+        'exact_pval': exact_pval,
+        'pval_thresh': None if pval_thresh is None else float(pval_thresh),
+        'stats_only': bool(stats_only),
+        'chunk_size': int(chunk_size),
+        'tol': float(tol),
+    }
+
+    if os.path.isdir(queue_dir):
+        manifest = _load_manifest(queue_dir)
+        if manifest['inputs'] != inputs or manifest['params'] != params:
+            raise ValueError('The work queue in "%s" was created for a '
+                             'different job (the inputs or the parameters '
+                             'are different).' % queue_dir)
+        return len(manifest['shards'])
+
+    queue_dir = queue_dir.rstrip(os.sep)
+    tmp_dir = '%s.tmp-%s-%d' % (queue_dir, socket.gethostname(), os.getpid())
+    os.makedirs(tmp_dir)
+    try:
+        if isinstance(rankings, str):
+            shutil.copyfile(rankings, os.path.join(tmp_dir, RANKINGS_FILE))
+        else:
+            with open(os.path.join(tmp_dir, RANKINGS_FILE), 'w',
+                      encoding='UTF-8') as f:
+                for name, genes in rankings:
+                    f.write('\t'.join([str(name)] + [str(g) for g in genes])
+                            + '\n')
+
+        shards = []
+        for i, chunk in enumerate(iter_chunks(read_gmt(gene_sets),
+                                              chunk_size)):
+            path = _get_shard_path(tmp_dir, i, 'gmt')
+            with open(path, 'w', encoding='UTF-8') as f:
+                for name, description, genes in chunk:
+                    f.write('\t'.join([name, description] + genes) + '\n')
+            shards.append({'num_gene_sets': len(chunk),
+                           'checksum': get_file_checksum(path)})
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'inputs': inputs,
+            'params': params,
+            'shards': shards,
+        }
+        _write_atomic(os.path.join(tmp_dir, MANIFEST_FILE),
+                      lambda f: json.dump(manifest, f, indent=1,
+                                          sort_keys=True))
+        os.rename(tmp_dir, queue_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(queue_dir):
+            raise
+        # another process created the queue in the meantime
+        return create_work_queue(gene_sets, rankings, queue_dir, X=X, L=L,
+                                 exact_pval=exact_pval,
+                                 pval_thresh=pval_thresh,
+                                 stats_only=stats_only,
+                                 chunk_size=chunk_size, tol=tol)
+
+    logger.info('Created work queue with %d shard(s) in "%s".',
+                len(shards), queue_dir)
+    return len(shards)
+
+
+def _break_stale_lock(lock_path, worker_id, lock_timeout):
+    """Remove a lock file that is older than ``lock_timeout`` seconds.
+
+    Only one worker at a time can break a lock, by exclusively creating a
+    "breaker" file. That worker checks the age of the lock file again before
+    removing it, so that a new lock file created by another worker (that
+    broke the lock in the meantime) is never removed.
+
+    Returns the age of the removed lock file, or None if it was not removed.
+    """
+    break_path = lock_path + '.break'
+    try:
+        fd = os.open(break_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        # another worker is breaking the lock; the breaker file of a worker
+        # that died while breaking the lock is removed once it is stale
+        try:
+            if time.time() - os.path.getmtime(break_path) >= lock_timeout:
+                os.remove(break_path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('%s\t%f\n' % (worker_id, time.time()))
+        try:
+            age = time.time() - os.path.getmtime(lock_path)
+        except FileNotFoundError:
+            return None
+        if age < lock_timeout:
+            return None
+        os.rename(lock_path, '%s.stale-%s' % (lock_path, worker_id))
+        return age
+    finally:
+        os.remove(break_path)
+
+
+def _claim_shard(queue_dir, shard_index, worker_id, lock_timeout):
+    """Try to claim a shard by creating its lock file.
+
+    Returns True if the shard was claimed."""
+    lock_path = _get_shard_path(queue_dir, shard_index, 'lock')
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if lock_timeout is None:
+            return False
+        try:
+            age = time.time() - os.path.getmtime(lock_path)
+        except FileNotFoundError:
+            return False
+        if age < lock_timeout:
+            return False
+        # the worker holding the lock is presumed dead; the worker that
+        # breaks the stale lock tries again
+        age = _break_stale_lock(lock_path, worker_id, lock_timeout)
+        if age is None:
+            return False
+        logger.warning('Breaking stale lock of shard %d (%.0f s old).',
+                       shard_index, age)
+        return _claim_shard(queue_dir, shard_index, worker_id, None)
+
+    with os.fdopen(fd, 'w') as f:
+        f.write('%s\t%f\n' % (worker_id, time.time()))
+    return True
+
+
+def run_worker(queue_dir, worker_id=None, max_shards=None,
+               lock_timeout=None):
+    """Process shards of a work queue until no unclaimed shards are left.
+
+    Parameters
+    ----------
+    queue_dir: str
+        The queue directory (see `create_work_queue`).
+    worker_id: str, optional
+        The name of the worker, which is written to the lock files. If None,
+        the host name and process ID are used. [None]
+    max_shards: int, optional
+        The maximum number of shards to process. [None]
+    lock_timeout: float, optional
+        If specified, shards that were claimed more than ``lock_timeout``
+        seconds ago, but that have not been completed, are presumed to
+        belong to a worker that has died, and can be claimed again. This
+        should be much larger than the time it takes to process a shard.
+        [None]
+
+    Returns
+    -------
+    int
+        The number of shards processed by this worker.
+    """
+    if worker_id is None:
+        worker_id = '%s-%d' % (socket.gethostname(), os.getpid())
+    manifest = _load_manifest(queue_dir)
+    params = manifest['params']
+    kwargs = dict((k, v) for k, v in params.items() if k != 'chunk_size')
+    rankings_path = os.path.join(queue_dir, RANKINGS_FILE)
+
+    num_processed = 0
+    for i, shard in enumerate(manifest['shards']):
+        if max_shards is not None and num_processed >= max_shards:
+            break
+        if os.path.isfile(_get_shard_path(queue_dir, i, 'tsv')):
+            continue
+        if not _claim_shard(queue_dir, i, worker_id, lock_timeout):
+            continue
+
+        gmt_path = _get_shard_path(queue_dir, i, 'gmt')
+        if get_file_checksum(gmt_path) != shard['checksum']:
+            raise ValueError('The checksum of shard file "%s" does not match '
+                             'the manifest.' % gmt_path)
+        t0 = time.perf_counter()
+        results = list(iter_xlmhg_results(
+            gmt_path, rankings_path, chunk_size=max(shard['num_gene_sets'], 1),
+            **kwargs))
+        _write_atomic(_get_shard_path(queue_dir, i, 'tsv'),
+                      lambda f: write_results(results, f))
+        num_processed += 1
+        logger.info('Worker %s completed shard %d (%d tests in %.2f s).',
+                    worker_id, i, len(results), time.perf_counter() - t0)
+    return num_processed
+
+
+def get_work_queue_status(queue_dir):
+    """Determine how many shards of a work queue were claimed and completed.
+
+    Returns
+    -------
+    `QueueStatus`
+        The number of shards, claimed shards, and completed shards.
+    """
+    manifest = _load_manifest(queue_dir)
+    num_shards = len(manifest['shards'])
+    num_claimed = 0
+    num_completed = 0
+    for i in range(num_shards):
+        if os.path.isfile(_get_shard_path(queue_dir, i, 'tsv')):
+            num_completed += 1
+            num_claimed += 1
+        elif os.path.isfile(_get_shard_path(queue_dir, i, 'lock')):
+            num_claimed += 1
+    return QueueStatus(num_shards, num_claimed, num_completed)
+
+
+def merge_work_queue(queue_dir, output):
+    """Merge the results of all shards of a completed work queue.
+
+    Parameters
+    ----------
+    queue_dir: str
+        The queue directory.
+    output: str or file object
+        The path of the output file (which is written atomically), or an
+        open (text) file. Paths ending in ".gz" are compressed on the fly.
+
+    Returns
+    -------
+    int
+        The number of results written.
+    """
+    status = get_work_queue_status(queue_dir)
+    if status.num_completed < status.num_shards:
+        raise ValueError('The work queue is incomplete (%d of %d shards '
+                         'completed).'
+                         % (status.num_completed, status.num_shards))
+    paths = [_get_shard_path(queue_dir, i, 'tsv')
+             for i in range(status.num_shards)]
+    return _merge_atomic(lambda f: _merge_result_files(paths, f), output)